@@ -0,0 +1,76 @@
+import hashlib
+import math
+import os
+from payload_packing import demultiplex_counts
+
+
+# Адаптивное число запусков (shots) схемы.
+#
+# Постобработка (p_quntun.find_best_path_binary) берёт из гистограммы только самую
+# частую битовую строку. Для резко выраженного пика хватает малой выборки, поэтому
+# схема сначала запускается initial_shots раз, а добор идёт, только пока лидер
+# статистически не отделён от второго места:
+#   p1 - p2 - z * sqrt((p1 + p2 - (p1 - p2)^2) / N) > 0,
+# где p1, p2 - доли двух самых частых строк, N - число запусков (дисперсия разности
+# долей мультиномиального распределения). Каждая следующая партия увеличивает
+# выборку в growth раз, но не больше max_shots (по умолчанию - launch payload'а).
+# Партии суммируются в одну гистограмму в прежнем формате Result_*.json.
+
+ADAPTIVE_SHOTS = os.environ.get("QUANT_ADAPTIVE_SHOTS", "0") == "1"
+
+
+def merge_counts(counts, result_data):
+    """Добавляет гистограмму ответа API к counts (порядок строк - по первому появлению)"""
+    for item in result_data["data"]:
+        counts[item["bitstring"]] = counts.get(item["bitstring"], 0) + item["value"]
+    return counts
+
+
+def counts_to_result_data(counts):
+    return {"data": [{"bitstring": bitstring, "value": value} for bitstring, value in counts.items()]}
+
+
+class ShotPolicy:
+    """Правило остановки и размеры партий адаптивных запусков"""
+
+    def __init__(self, initial_shots=128, max_shots=None, growth=2.0, z=2.576):
+        self.initial_shots = initial_shots
+        self.max_shots = max_shots
+        self.growth = growth
+        self.z = z
+
+    def cap(self, launch):
+        return min(self.max_shots, launch) if self.max_shots else launch
+
+    def cache_key(self, content_hash):
+        """Ключ result_cache для адаптивного результата: не смешивается с полным запуском"""
+        if not content_hash:
+            return None
+        key = f"{content_hash}:{self.initial_shots}:{self.max_shots}:{self.growth}:{self.z}"
+        return hashlib.blake2b(key.encode('ascii'), digest_size=16).hexdigest()
+
+    def is_decided(self, counts):
+        """Отделена ли самая частая строка от второй с заданной доверительной вероятностью"""
+        total = sum(counts.values())
+        if total < self.initial_shots:
+            return False
+        top = sorted(counts.values(), reverse=True)[:2]
+        p1 = top[0] / total
+        p2 = top[1] / total if len(top) > 1 else 0.0
+        spread = math.sqrt(max(0.0, p1 + p2 - (p1 - p2) ** 2) / total)
+        return p1 - p2 - self.z * spread > 0
+
+    def is_decided_packed(self, counts, layout, n_qubits):
+        """То же для упакованной схемы: решение нужно по маргиналу каждой машины"""
+        marginals = demultiplex_counts(counts_to_result_data(counts)["data"], layout, n_qubits)
+        return all(self.is_decided(marginal) for marginal in marginals)
+
+    def first_batch(self, launch):
+        return min(self.initial_shots, self.cap(launch))
+
+    def next_batch(self, shots_done, launch, decided):
+        """Размер следующей партии; 0 - остановиться"""
+        remaining = self.cap(launch) - shots_done
+        if decided or remaining <= 0:
+            return 0
+        return min(remaining, max(1, math.ceil(shots_done * (self.growth - 1))))
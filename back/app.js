@@ -1,24 +1,87 @@
 const axios = require('axios');
+const crypto = require('crypto');
 const fs = require('fs');
 const path = require('path');
+const zlib = require('zlib');
 
+// Маркер формата shared из payload_io.py: params гейтов вынесены в общие шаблоны
+const SHARED_FORMAT_MARKER = 'shared-params/1';
 
-class FullyOptimizedQuantumCircuitProcessor {
-    constructor() {
-        this.inputDir = path.join(__dirname, 'input');
-        this.resultsBaseDir = path.join(__dirname, 'results');
-        this.isProcessing = false;
-        this.processedFiles = new Set();
-        this.loadProcessedFiles();
+
+// Хэш результата - по тексту сохранённого Result_*.json (как result_digest в submission_journal.py)
+function resultDigest(text) {
+    return crypto.createHash('sha256').update(text, 'utf8').digest('hex').slice(0, 32);
+}
+
+
+// Журнал отправленных payload'ов в формате submission_journal.py (замена processed_files.json):
+// только дозапись, по JSON-строке {"k", "c", "r"} на отправку, fsync пачками по syncEvery записей.
+// При старте проигрывается за один проход, оборванный после сбоя хвост отрезается;
+// когда повторных записей становится много, переписывается по строке на ключ.
+// Payload считается отправленным, как и в is_done submission_journal.py, только если
+// contentHash не изменился и файл результата на месте.
+class SubmissionJournal {
+    constructor(resultsDir, syncEvery = 64, compactRatio = 2, minCompactLines = 1024) {
+        this.path = path.join(resultsDir, 'submission_journal.jsonl');
+        this.legacyPath = path.join(resultsDir, 'processed_files.json');
+        this.syncEvery = syncEvery;
+        this.compactRatio = compactRatio;
+        this.minCompactLines = minCompactLines;
+        this.entries = new Map();
+        this.lines = 0;
+        this.pending = 0;
+
+        fs.mkdirSync(resultsDir, { recursive: true });
+        if (fs.existsSync(this.path)) {
+            this.replay();
+        } else {
+            this.migrateLegacy();
+        }
+        if (this.needsCompaction()) {
+            this.writeCompacted();
+        }
+        this.fd = fs.openSync(this.path, 'a');
     }
 
 
-    loadProcessedFiles() {
+    replay() {
+        const raw = fs.readFileSync(this.path);
+        let validSize = 0;
+        while (validSize < raw.length) {
+            const end = raw.indexOf(0x0a, validSize);
+            if (end === -1) {
+                break;
+            }
+            let entry;
+            try {
+                entry = JSON.parse(raw.toString('utf8', validSize, end));
+            } catch (error) {
+                break;
+            }
+            if (!entry || typeof entry.k !== 'string') {
+                break;
+            }
+            this.entries.set(entry.k, [entry.c || null, entry.r || null]);
+            this.lines++;
+            validSize = end + 1;
+        }
+
+        if (validSize < raw.length) {
+            console.log(`⚠️  Журнал ${this.path}: отброшен оборванный хвост после ${this.lines} записей`);
+            fs.truncateSync(this.path, validSize);
+        }
+    }
+
+
+    migrateLegacy() {
         try {
-            const processedPath = path.join(this.resultsBaseDir, 'processed_files.json');
-            if (fs.existsSync(processedPath)) {
-                const data = JSON.parse(fs.readFileSync(processedPath, 'utf8'));
-                this.processedFiles = new Set(data.files || []);
+            if (fs.existsSync(this.legacyPath)) {
+                const data = JSON.parse(fs.readFileSync(this.legacyPath, 'utf8'));
+                for (const key of data.files || []) {
+                    this.entries.set(key, [null, null]);
+                }
+                this.writeCompacted();
+                console.log(`✅ Журнал отправок создан из processed_files.json: ${this.entries.size} записей`);
             }
         } catch (error) {
             console.log('Не удалось загрузить историю обработанных файлов, начинаем заново');
@@ -26,39 +89,130 @@ class FullyOptimizedQuantumCircuitProcessor {
     }
 
 
+    get size() {
+        return this.entries.size;
+    }
+
+
+    has(key) {
+        return this.entries.has(key);
+    }
+
+
+    isDone(key, contentHash, resultPath) {
+        const entry = this.entries.get(key);
+        if (!entry) {
+            return false;
+        }
+        if (resultPath && !fs.existsSync(resultPath)) {
+            return false;
+        }
+        return !contentHash || !entry[0] || entry[0] === contentHash;
+    }
+
+
+    record(key, contentHash, resultHash) {
+        this.entries.set(key, [contentHash || null, resultHash || null]);
+        fs.writeSync(this.fd, JSON.stringify({ k: key, c: contentHash || null, r: resultHash || null }) + '\n');
+        this.lines++;
+        this.pending++;
+        if (this.pending >= this.syncEvery) {
+            this.sync();
+            if (this.needsCompaction()) {
+                this.compact();
+            }
+        }
+    }
+
+
+    sync() {
+        if (this.pending) {
+            fs.fsyncSync(this.fd);
+            this.pending = 0;
+        }
+    }
+
+
+    needsCompaction() {
+        return this.lines >= this.minCompactLines && this.lines > this.compactRatio * this.entries.size;
+    }
+
+
+    writeCompacted() {
+        const tmpPath = `${this.path}.tmp`;
+        const lines = [];
+        for (const [key, [contentHash, resultHash]] of this.entries) {
+            lines.push(JSON.stringify({ k: key, c: contentHash, r: resultHash }) + '\n');
+        }
+        const fd = fs.openSync(tmpPath, 'w');
+        fs.writeSync(fd, lines.join(''));
+        fs.fsyncSync(fd);
+        fs.closeSync(fd);
+        fs.renameSync(tmpPath, this.path);
+        this.lines = this.entries.size;
+    }
+
+
+    compact() {
+        this.sync();
+        fs.closeSync(this.fd);
+        this.writeCompacted();
+        this.fd = fs.openSync(this.path, 'a');
+    }
+}
+
+
+class FullyOptimizedQuantumCircuitProcessor {
+    constructor() {
+        // Папки можно переопределить через окружение (например, input_packed / results_packed
+        // для упакованных схем из payload_packing.py)
+        this.inputDir = path.resolve(__dirname, process.env.QUANT_INPUT_DIR || 'input');
+        this.resultsBaseDir = path.resolve(__dirname, process.env.QUANT_RESULTS_DIR || 'results');
+        // Кэш результатов по contentHash payload'а (тот же формат, что result_cache.py)
+        this.resultCacheDir = path.join(__dirname, 'result_cache');
+        this.isProcessing = false;
+        // История отправленных файлов (при первом запуске переносится из processed_files.json)
+        this.journal = new SubmissionJournal(this.resultsBaseDir);
+        // contentHash payload'ов по пути файла, пока не изменились его mtime и размер
+        this.contentHashes = new Map();
+        // Число одновременных запросов к API: воркеры разбирают общую очередь машин
+        this.workerCount = parseInt(process.env.QUANT_SUBMIT_WORKERS) || 2;
+    }
+
+
     saveProcessedFiles() {
         try {
-            const processedPath = path.join(this.resultsBaseDir, 'processed_files.json');
-            const data = {
-                files: Array.from(this.processedFiles),
-                timestamp: new Date().toISOString()
-            };
-            fs.writeFileSync(processedPath, JSON.stringify(data, null, 2));
+            this.journal.sync();
         } catch (error) {
             console.error('Ошибка сохранения истории файлов:', error.message);
         }
     }
 
 
-    // Функция для создания пар из массива графов
-    createPairs(graphFolders) {
-        const pairs = [];
-        for (let i = 0; i < graphFolders.length; i += 2) {
-            if (i + 1 < graphFolders.length) {
-                pairs.push([graphFolders[i], graphFolders[i + 1]]);
-            } else {
-                pairs.push([graphFolders[i]]); // Последний элемент если нечетное количество
-            }
+    // Папки graph_N во входной папке по возрастанию номера
+    listGraphFolders() {
+        if (!fs.existsSync(this.inputDir)) {
+            return [];
         }
-        return pairs;
+
+        return fs.readdirSync(this.inputDir)
+            .filter(item => {
+                const itemPath = path.join(this.inputDir, item);
+                return fs.statSync(itemPath).isDirectory() && item.startsWith('graph_');
+            })
+            .sort((a, b) => {
+                const numA = parseInt(a.replace('graph_', ''));
+                const numB = parseInt(b.replace('graph_', ''));
+                return numA - numB;
+            });
     }
 
 
     async startMonitoring() {
-        console.log('🚀 Запуск полностью оптимизированного мониторинга с попарной обработкой ВСЕХ графов...');
+        console.log('🚀 Запуск мониторинга с общей очередью машин всех графов...');
         console.log('📁 Мониторинг папки:', this.inputDir);
         console.log('💾 Результаты в:', this.resultsBaseDir);
-        console.log('⚡ Стратегия: ВСЕ графы обрабатываются попарно параллельно');
+        console.log(`⚡ Стратегия: ${this.workerCount} воркеров разбирают общую очередь машин (графы от дорогих к дешёвым)`);
         
         // Создание папок при первом запуске
         if (!fs.existsSync(this.inputDir)) {
@@ -73,10 +227,10 @@ class FullyOptimizedQuantumCircuitProcessor {
 
         this.isProcessing = true;
         
-        // Основной цикл мониторинга с полной попарной обработкой
+        // Основной цикл мониторинга: очередь необработанных машин всех графов
         while (this.isProcessing) {
             try {
-                await this.processAllGraphsInPairs();
+                await this.processAllGraphs();
                 await this.delay(5000); // Проверка каждые 5 секунд
             } catch (error) {
                 console.error('❌ Ошибка в основном цикле:', error.message);
@@ -93,23 +247,13 @@ class FullyOptimizedQuantumCircuitProcessor {
     }
 
 
-    async processAllGraphsInPairs() {
+    async processAllGraphs() {
         try {
             if (!fs.existsSync(this.inputDir)) {
                 return;
             }
 
-            // Получаем все доступные графы и сортируем их
-            const availableGraphs = fs.readdirSync(this.inputDir)
-                .filter(item => {
-                    const itemPath = path.join(this.inputDir, item);
-                    return fs.statSync(itemPath).isDirectory() && item.startsWith('graph_');
-                })
-                .sort((a, b) => {
-                    const numA = parseInt(a.replace('graph_', ''));
-                    const numB = parseInt(b.replace('graph_', ''));
-                    return numA - numB;
-                });
+            const availableGraphs = this.listGraphFolders();
 
             if (availableGraphs.length === 0) {
                 console.log('📭 В папке input нет папок graph_N');
@@ -117,108 +261,97 @@ class FullyOptimizedQuantumCircuitProcessor {
             }
 
             console.log(`📊 Найдено графов для обработки: ${availableGraphs.length}`);
-            console.log(`📈 Графы: ${availableGraphs.join(', ')}`);
-
-            // Создаем пары из всех доступных графов
-            const graphPairs = this.createPairs(availableGraphs);
-            console.log(`🔗 Создано пар для параллельной обработки: ${graphPairs.length}`);
-            
-            // Выводим информацию о парах
-            graphPairs.forEach((pair, index) => {
-                if (pair.length === 2) {
-                    console.log(`   Пара ${index + 1}: ${pair[0]} + ${pair[1]} (параллельно)`);
-                } else {
-                    console.log(`   Пара ${index + 1}: ${pair[0]} (одиночно)`);
-                }
-            });
-
-            let totalProcessed = 0;
-
-            // Обрабатываем каждую пару графов
-            for (let pairIndex = 0; pairIndex < graphPairs.length; pairIndex++) {
-                const currentPair = graphPairs[pairIndex];
-                console.log(`\n🔄 Обработка пары ${pairIndex + 1}/${graphPairs.length}: [${currentPair.join(', ')}]`);
-
-                const parallelTasks = currentPair.map(graphName => 
-                    this.processGraphFolder(graphName)
-                );
-
-                // Ждем завершения обработки текущей пары
-                const pairResults = await Promise.all(parallelTasks);
-                const pairProcessed = pairResults.reduce((sum, count) => sum + count, 0);
-                totalProcessed += pairProcessed;
-
-                if (pairProcessed > 0) {
-                    console.log(`✅ Пара ${pairIndex + 1} завершена: обработано ${pairProcessed} файлов`);
-                    this.saveProcessedFiles();
-                } else {
-                    console.log(`⏭️  Пара ${pairIndex + 1} пропущена: нет новых файлов для обработки`);
-                }
 
-                // Небольшая задержка между парами для стабильности сервера
-                if (pairIndex < graphPairs.length - 1) {
-                    await this.delay(2000);
-                }
+            const queue = this.buildWorkQueue(availableGraphs);
+            if (queue.items.length === 0) {
+                return;
             }
 
+            // Воркеры берут следующую машину из общей очереди, как только освободятся:
+            // слот не простаивает, пока у соседнего графа остаются машины
+            console.log(`🔗 В очереди ${queue.items.length} файлов, воркеров: ${this.workerCount}`);
+            const workerResults = await Promise.all(
+                Array.from({ length: this.workerCount }, () => this.runQueueWorker(queue))
+            );
+            const totalProcessed = workerResults.reduce((sum, count) => sum + count, 0);
+            this.saveProcessedFiles();
+
             if (totalProcessed > 0) {
                 console.log(`\n🎯 ИТОГО обработано файлов в этой итерации: ${totalProcessed}`);
-                console.log(`⚡ Использовано пар для ускорения: ${graphPairs.length}`);
             }
 
         } catch (error) {
-            console.error('❌ Ошибка при попарной обработке графов:', error.message);
+            console.error('❌ Ошибка при обработке графов:', error.message);
         }
     }
 
 
-    async processGraphFolder(graphFolder) {
-        const graphPath = path.join(this.inputDir, graphFolder);
-        let processedCount = 0;
+    // Очередь необработанных файлов: графы от самого дорогого к самому дешёвому (LPT, как scheduler.py).
+    // Стоимость графа - файлы x (накладные расходы запроса + число кубитов схемы)
+    buildWorkQueue(graphFolders) {
+        const groups = [];
 
-        try {
-            // Создание папки для результатов этого графа
-            const graphResultsDir = path.join(this.resultsBaseDir, graphFolder);
-            if (!fs.existsSync(graphResultsDir)) {
-                fs.mkdirSync(graphResultsDir, { recursive: true });
+        for (const graphFolder of graphFolders) {
+            const graphPath = path.join(this.inputDir, graphFolder);
+            try {
+                const files = fs.readdirSync(graphPath)
+                    .filter(file => file.endsWith('.json') || file.endsWith('.json.gz'))
+                    .sort()
+                    .filter(file => this.isPending(graphFolder, file));
+                if (files.length === 0) {
+                    continue;
+                }
+
+                let qubits = 0;
+                try {
+                    qubits = this.loadPayload(path.join(graphPath, files[0])).payload.actualHistoryMap.length;
+                } catch (error) {
+                    // Ширина схемы неизвестна - граф оценивается только по числу файлов
+                }
+                groups.push({ graphFolder, files, cost: files.length * (8 + qubits) });
+            } catch (error) {
+                console.error(`❌ [${graphFolder}] Ошибка чтения папки графа:`, error.message);
             }
+        }
 
-            // Чтение всех JSON файлов в папке графа
-            const jsonFiles = fs.readdirSync(graphPath)
-                .filter(file => file.endsWith('.json'))
-                .sort();
+        groups.sort((a, b) => b.cost - a.cost ||
+            parseInt(a.graphFolder.replace('graph_', '')) - parseInt(b.graphFolder.replace('graph_', '')));
 
-            if (jsonFiles.length === 0) {
-                console.log(`📭 [${graphFolder}] Нет JSON файлов`);
-                return 0;
+        groups.forEach(group => {
+            console.log(`   ${group.graphFolder}: ${group.files.length} файлов (стоимость ${group.cost})`);
+        });
+
+        const items = [];
+        for (const group of groups) {
+            for (const jsonFile of group.files) {
+                items.push({ graphFolder: group.graphFolder, jsonFile });
             }
+        }
+        return { items, next: 0 };
+    }
 
-            console.log(`📊 [${graphFolder}] Найдено ${jsonFiles.length} файлов`);
 
-            for (const jsonFile of jsonFiles) {
-                const fileKey = `${graphFolder}/${jsonFile}`;
-                
-                // Пропускаем уже обработанные файлы
-                if (this.processedFiles.has(fileKey)) {
-                    continue;
-                }
+    async runQueueWorker(queue) {
+        let processedCount = 0;
+
+        while (queue.next < queue.items.length) {
+            const { graphFolder, jsonFile } = queue.items[queue.next++];
+            try {
+                // Создание папки для результатов этого графа
+                const graphResultsDir = path.join(this.resultsBaseDir, graphFolder);
+                fs.mkdirSync(graphResultsDir, { recursive: true });
 
                 const success = await this.processFile(graphFolder, jsonFile, graphResultsDir);
                 if (success) {
-                    this.processedFiles.add(fileKey);
                     processedCount++;
-                    
-                    // Задержка между запросами чтобы не перегружать сервер
-                    await this.delay(1000);
+                    // Задержка между запросами чтобы не перегружать сервер (результат из кэша - без запроса)
+                    if (success !== 'cached') {
+                        await this.delay(1000);
+                    }
                 }
+            } catch (error) {
+                console.error(`❌ [${graphFolder}] Ошибка при обработке ${jsonFile}:`, error.message);
             }
-
-            if (processedCount > 0) {
-                console.log(`✅ [${graphFolder}] Завершено: обработано ${processedCount} файлов`);
-            }
-
-        } catch (error) {
-            console.error(`❌ [${graphFolder}] Ошибка при обработке графа:`, error.message);
         }
 
         return processedCount;
@@ -231,7 +364,21 @@ class FullyOptimizedQuantumCircuitProcessor {
         try {
             console.log(`🔍 [${graphFolder}] Обработка: ${jsonFile}`);
             
-            const circuitData = JSON.parse(fs.readFileSync(configPath, 'utf8'));
+            const { payload: circuitData, contentHash } = this.loadPayload(configPath);
+
+            // Создание имени файла результата в формате "Result_graph_*_car_*.json"
+            const outputFilename = this.generateResultFilename(graphFolder, jsonFile);
+            const outputPath = path.join(graphResultsDir, outputFilename);
+
+            // Такая же схема уже запускалась - берём гистограмму из кэша без обращения к API
+            const cachedResult = this.readCachedResult(contentHash);
+            if (cachedResult) {
+                const resultText = JSON.stringify(cachedResult, null, 2);
+                fs.writeFileSync(outputPath, resultText);
+                this.journal.record(`${graphFolder}/${jsonFile}`, contentHash, resultDigest(resultText));
+                console.log(`♻️  [${graphFolder}] Из кэша: ${outputFilename}`);
+                return 'cached';
+            }
 
             // Настройки API
             const apiUrl = 'https://mireatom.mirea.ru/kraniki/circuit/api';
@@ -248,10 +395,6 @@ class FullyOptimizedQuantumCircuitProcessor {
                 timeout: 15000
             });
 
-            // Создание имени файла результата в формате "Result_graph_*_car_*.json"
-            const outputFilename = this.generateResultFilename(graphFolder, jsonFile);
-            const outputPath = path.join(graphResultsDir, outputFilename);
-
             // Обработка ответа
             let resultData;
             if (response.data.data && Array.isArray(response.data.data)) {
@@ -268,7 +411,10 @@ class FullyOptimizedQuantumCircuitProcessor {
             }
 
             // Сохранение файла
-            fs.writeFileSync(outputPath, JSON.stringify(resultData, null, 2));
+            const resultText = JSON.stringify(resultData, null, 2);
+            fs.writeFileSync(outputPath, resultText);
+            this.writeCachedResult(contentHash, resultData);
+            this.journal.record(`${graphFolder}/${jsonFile}`, contentHash, resultDigest(resultText));
             console.log(`✅ [${graphFolder}] Успех: ${outputFilename}`);
 
             return true;
@@ -288,27 +434,173 @@ class FullyOptimizedQuantumCircuitProcessor {
     }
 
 
+    // Нужно ли отправлять payload. Файлы, которых нет в журнале, отправляются без чтения;
+    // для остальных contentHash берётся из кэша по mtime, и только потом проверяется результат
+    isPending(graphFolder, file) {
+        const key = `${graphFolder}/${file}`;
+        if (!this.journal.has(key)) {
+            return true;
+        }
+        return !this.journal.isDone(
+            key,
+            this.cachedContentHash(path.join(this.inputDir, graphFolder, file)),
+            path.join(this.resultsBaseDir, graphFolder, this.generateResultFilename(graphFolder, file))
+        );
+    }
+
+
+    // readContentHash с кэшем: файл перечитывается, только если изменились его mtime или размер
+    cachedContentHash(configPath) {
+        let stat;
+        try {
+            stat = fs.statSync(configPath);
+        } catch (error) {
+            this.contentHashes.delete(configPath);
+            return null;
+        }
+        const cached = this.contentHashes.get(configPath);
+        if (cached && cached.mtimeMs === stat.mtimeMs && cached.size === stat.size) {
+            return cached.hash;
+        }
+        const hash = this.readContentHash(configPath);
+        this.contentHashes.set(configPath, { mtimeMs: stat.mtimeMs, size: stat.size, hash });
+        return hash;
+    }
+
+
+    // contentHash по началу файла, без разбора всего payload (как read_content_hash в payload_io.py)
+    readContentHash(configPath, headSize = 256) {
+        try {
+            const fd = fs.openSync(configPath, 'r');
+            let head = Buffer.alloc(4096);
+            try {
+                head = head.subarray(0, fs.readSync(fd, head, 0, head.length, 0));
+            } finally {
+                fs.closeSync(fd);
+            }
+            if (head.length >= 2 && head[0] === 0x1f && head[1] === 0x8b) {
+                // Распаковывается только прочитанное начало потока
+                head = zlib.gunzipSync(head, { finishFlush: zlib.constants.Z_SYNC_FLUSH });
+            }
+            const match = head.toString('utf8', 0, Math.min(head.length, headSize))
+                .match(/"contentHash"\s*:\s*"([0-9a-f]+)"/);
+            return match ? match[1] : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+
+    // Чтение payload в любом формате payload_io.py: pretty/compact/shared, с gzip или без.
+    // contentHash отделяется от payload и в API не отправляется
+    loadPayload(configPath) {
+        let raw = fs.readFileSync(configPath);
+        if (raw.length >= 2 && raw[0] === 0x1f && raw[1] === 0x8b) {
+            raw = zlib.gunzipSync(raw);
+        }
+        const data = JSON.parse(raw.toString('utf8'));
+        const contentHash = data.contentHash || null;
+        const payload = this.expandSharedPayload(data);
+        delete payload.contentHash;
+        return { payload, contentHash };
+    }
+
+
+    resultCachePath(contentHash) {
+        return path.join(this.resultCacheDir, contentHash.slice(0, 2), `${contentHash}.json`);
+    }
+
+
+    readCachedResult(contentHash) {
+        if (!contentHash) {
+            return null;
+        }
+        try {
+            const cachePath = this.resultCachePath(contentHash);
+            if (fs.existsSync(cachePath)) {
+                return JSON.parse(fs.readFileSync(cachePath, 'utf8'));
+            }
+        } catch (error) {
+            console.log(`Не удалось прочитать кэш результата ${contentHash}: ${error.message}`);
+        }
+        return null;
+    }
+
+
+    writeCachedResult(contentHash, resultData) {
+        if (!contentHash) {
+            return;
+        }
+        try {
+            const cachePath = this.resultCachePath(contentHash);
+            fs.mkdirSync(path.dirname(cachePath), { recursive: true });
+            const tmpPath = `${cachePath}.${process.pid}.tmp`;
+            fs.writeFileSync(tmpPath, JSON.stringify(resultData));
+            fs.renameSync(tmpPath, cachePath);
+        } catch (error) {
+            console.error(`Ошибка сохранения кэша результата ${contentHash}:`, error.message);
+        }
+    }
+
+
+    // Восстановление исходного payload из формата shared (как expand_payload в payload_io.py)
+    expandSharedPayload(data) {
+        if (data.format !== SHARED_FORMAT_MARKER) {
+            return data;
+        }
+
+        const templates = data.paramTemplates || {};
+        const elementsObject = {};
+        for (const [gateId, element] of Object.entries(data.elementsObject)) {
+            const params = element.params;
+            if (params && !Array.isArray(params) && params.template !== undefined) {
+                const expanded = JSON.parse(JSON.stringify(templates[params.template]));
+                let angleIndex = 0;
+                for (const param of expanded) {
+                    for (const value of param.value || []) {
+                        for (const typeItem of value.types || []) {
+                            if (typeItem.key === 'input-number' && typeItem.input === 'input' &&
+                                angleIndex < params.angles.length) {
+                                typeItem.data = params.angles[angleIndex++];
+                            }
+                        }
+                    }
+                }
+                elementsObject[gateId] = { ...element, params: expanded };
+            } else {
+                elementsObject[gateId] = element;
+            }
+        }
+
+        return {
+            elementsObject,
+            actualHistoryMap: data.actualHistoryMap,
+            launch: data.launch
+        };
+    }
+
+
     generateResultFilename(graphFolder, originalFilename) {
         // Извлекаем номер графа из названия папки
         const graphMatch = graphFolder.match(/graph_(\d+)/);
         
         if (!graphMatch) {
             // Если имя папки не соответствует формату, используем fallback
-            const fileNameWithoutExt = originalFilename.replace('.json', '');
+            const fileNameWithoutExt = originalFilename.replace(/\.json(\.gz)?$/, '');
             return `Result_${fileNameWithoutExt}.json`;
         }
 
         const graphNum = graphMatch[1];
         
         // Извлекаем номер car из имени файла
-        const carMatch = originalFilename.match(/_car_(\d+)\.json$/);
+        const carMatch = originalFilename.match(/_car_(\d+)\.json(\.gz)?$/);
         
         if (carMatch) {
             const carNum = carMatch[1];
             return `Result_graph_${graphNum}_car_${carNum}.json`;
         } else {
             // Если в имени файла нет номера car, используем только номер графа
-            const fileNameWithoutExt = originalFilename.replace('.json', '');
+            const fileNameWithoutExt = originalFilename.replace(/\.json(\.gz)?$/, '');
             return `Result_graph_${graphNum}_${fileNameWithoutExt}.json`;
         }
     }
@@ -320,82 +612,41 @@ class FullyOptimizedQuantumCircuitProcessor {
 
 
     getStatus() {
-        const graphFolders = fs.existsSync(this.inputDir) ? 
-            fs.readdirSync(this.inputDir).filter(item => {
-                const itemPath = path.join(this.inputDir, item);
-                return fs.statSync(itemPath).isDirectory() && item.startsWith('graph_');
-            }).length : 0;
-
-        const pairs = this.createPairs(
-            Array.from({length: graphFolders}, (_, i) => `graph_${i}`)
-        );
-
         return {
             isMonitoring: this.isProcessing,
-            processedFilesCount: this.processedFiles.size,
-            graphFoldersCount: graphFolders,
-            estimatedPairs: pairs.length,
+            processedFilesCount: this.journal.size,
+            graphFoldersCount: this.listGraphFolders().length,
+            workerCount: this.workerCount,
             inputDir: this.inputDir,
             resultsDir: this.resultsBaseDir,
-            optimizationType: 'Полная попарная параллельность ВСЕХ графов'
+            optimizationType: 'Общая очередь машин всех графов (LPT по графам)'
         };
     }
 
 
-    // Метод для ручной обработки всех файлов (однократно) с полной попарностью
+    // Метод для ручной обработки всех файлов (однократно)
     async processOnce() {
         console.log('🔧 Запуск полностью оптимизированной однократной обработки...');
-        await this.processAllGraphsInPairs();
+        await this.processAllGraphs();
         this.saveProcessedFiles();
         console.log('✅ Полностью оптимизированная однократная обработка завершена');
     }
 
 
-    // Дополнительный метод для получения информации о текущих парах
-    getCurrentPairs() {
-        if (!fs.existsSync(this.inputDir)) {
-            return [];
-        }
-
-        const availableGraphs = fs.readdirSync(this.inputDir)
-            .filter(item => {
-                const itemPath = path.join(this.inputDir, item);
-                return fs.statSync(itemPath).isDirectory() && item.startsWith('graph_');
-            })
-            .sort((a, b) => {
-                const numA = parseInt(a.replace('graph_', ''));
-                const numB = parseInt(b.replace('graph_', ''));
-                return numA - numB;
-            });
-
-        return this.createPairs(availableGraphs);
-    }
-
-
-    // Метод для демонстрации стратегии обработки
+    // Метод для демонстрации стратегии обработки: порядок графов в очереди
     showProcessingStrategy() {
-        const pairs = this.getCurrentPairs();
-        
         console.log('\n🎯 СТРАТЕГИЯ ОБРАБОТКИ:');
         console.log('=' .repeat(50));
-        
-        if (pairs.length === 0) {
+
+        const graphFolders = this.listGraphFolders();
+        if (graphFolders.length === 0) {
             console.log('❌ Нет графов для обработки');
             return;
         }
 
-        pairs.forEach((pair, index) => {
-            const pairNumber = index + 1;
-            if (pair.length === 2) {
-                console.log(`📌 Этап ${pairNumber}: ${pair[0]} ⟷ ${pair[1]} (параллельно)`);
-            } else {
-                console.log(`📌 Этап ${pairNumber}: ${pair[0]} (одиночно)`);
-            }
-        });
-        
+        const queue = this.buildWorkQueue(graphFolders);
         console.log('=' .repeat(50));
-        console.log(`⚡ Всего этапов обработки: ${pairs.length}`);
-        console.log(`🚀 Ускорение: до ${Math.ceil(pairs.reduce((acc, pair) => acc + pair.length, 0) / pairs.length)}x`);
+        console.log(`⚡ Машин в очереди: ${queue.items.length}, воркеров: ${this.workerCount}`);
         console.log('');
     }
 }
@@ -427,7 +678,7 @@ module.exports = processor;
 // Автозапуск при прямом запуске файла
 if (require.main === module) {
     console.log('🎯 Запуск Fully Optimized Quantum Circuit Processor');
-    console.log('⚡ МАКСИМАЛЬНАЯ ОПТИМИЗАЦИЯ: Все графы обрабатываются попарно');
+    console.log('⚡ Все машины всех графов - в одной очереди, графы от самых дорогих к дешёвым');
     console.log('💡 Для остановки нажмите Ctrl+C');
     console.log('');
     
@@ -436,20 +687,16 @@ if (require.main === module) {
     
     console.log('📁 Структура папок:');
     console.log('   input/');
-    console.log('   ├── graph_0/ ← Пара 1 (параллельно)');
-    console.log('   ├── graph_1/ ← Пара 1 (параллельно)');
-    console.log('   ├── graph_2/ ← Пара 2 (параллельно)');
-    console.log('   ├── graph_3/ ← Пара 2 (параллельно)');
-    console.log('   ├── graph_4/ ← Пара 3 (параллельно)');
-    console.log('   └── graph_5/ ← Пара 3 (параллельно)');
+    console.log('   ├── graph_0/ ← машины попадают в общую очередь');
+    console.log('   ├── graph_1/');
+    console.log('   └── graph_N/');
     console.log('');
-    console.log('🚀 Преимущества полной оптимизации:');
-    console.log('   • МАКСИМАЛЬНАЯ параллельность - все графы в парах');
-    console.log('   • Автоматическое создание пар из любого количества графов');
-    console.log('   • Ускорение обработки до 2x для каждой пары');
-    console.log('   • Обработка нечетного количества графов');
-    console.log('   • Детальное логирование прогресса по парам');
-    console.log('   • Контролируемая нагрузка на сервер');
+    console.log('🚀 Преимущества общей очереди:');
+    console.log('   • Воркер берёт следующую машину, как только освободится');
+    console.log('   • Нет простоя, пока у соседнего графа остаются машины');
+    console.log('   • Дорогие графы стартуют первыми (LPT)');
+    console.log('   • Отправленные машины пропускаются по журналу отправок');
+    console.log(`   • Число одновременных запросов - QUANT_SUBMIT_WORKERS (сейчас ${processor.workerCount})`);
     console.log('');
     
     processor.startMonitoring().catch(error => {
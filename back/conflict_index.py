@@ -0,0 +1,71 @@
+import heapq
+from collections import defaultdict
+
+
+# Инкрементальный индекс конфликтов путей для conflict_repair.
+#
+# Два пути конфликтуют, если у них есть общее ребро с пропускной способностью <= 1.
+# Вместо попарного пересечения множеств рёбер всех путей (O(P^2 * L)) индекс хранит
+# ребро -> множество путей, проходящих по нему, и для каждого пути - число
+# конфликтующих с ним путей. Пары конфликтов лежат в куче в порядке (i, j);
+# пары, в которых путь уже заменён, выбрасываются лениво при извлечении.
+#
+# Как и в прежнем графе конфликтов, конфликты считаются по исходным путям:
+# путь, заменённый при ремонте, выходит из всех своих конфликтов, а новый путь
+# в индекс не добавляется. Замена пути стоит O(длина пути * кратность рёбер).
+
+
+class ConflictIndex:
+    """Конфликты исходных путей: ребро -> пути, путь -> число конфликтов, куча пар"""
+
+    def __init__(self, paths, conflict_edges):
+        """conflict_edges(path) - множество конфликтных рёбер пути (ёмкость <= 1)"""
+        self.original = [tuple(path) for path in paths]
+        self.replaced = [False] * len(paths)
+        self.path_edges = [conflict_edges(path) for path in paths]
+        self.edge_paths = defaultdict(set)
+        for idx, edges in enumerate(self.path_edges):
+            for edge in edges:
+                self.edge_paths[edge].add(idx)
+
+        self.degree = [0] * len(paths)
+        self._heap = []
+        for idx in range(len(paths)):
+            partners = self._partners(idx)
+            self.degree[idx] = len(partners)
+            self._heap.extend((idx, other) for other in partners if idx < other)
+        heapq.heapify(self._heap)
+
+    def _partners(self, idx):
+        partners = set()
+        for edge in self.path_edges[idx]:
+            partners.update(self.edge_paths[edge])
+        partners.discard(idx)
+        return partners
+
+    def is_original(self, idx, path):
+        return not self.replaced[idx] and tuple(path) == self.original[idx]
+
+    def conflicts(self, idx, path):
+        """Число путей, конфликтующих с path в роли пути idx (0, если это не исходный путь idx)"""
+        return self.degree[idx] if self.is_original(idx, path) else 0
+
+    def first_pair(self):
+        """Наименьшая пара (i, j), i < j, конфликтующих исходных путей; None - конфликтов нет"""
+        while self._heap:
+            i, j = self._heap[0]
+            if not self.replaced[i] and not self.replaced[j]:
+                return i, j
+            heapq.heappop(self._heap)
+        return None
+
+    def replace(self, idx, new_path):
+        """Путь idx заменён на new_path: он выходит из всех своих конфликтов"""
+        if self.replaced[idx] or tuple(new_path) == self.original[idx]:
+            return
+        for other in self._partners(idx):
+            self.degree[other] -= 1
+        for edge in self.path_edges[idx]:
+            self.edge_paths[edge].discard(idx)
+        self.replaced[idx] = True
+        self.degree[idx] = 0
@@ -3,6 +3,8 @@ import pandas as pd
 import glob
 import os
 
+POST_PROCESSED_DIR = 'post_processed_results'
+
 def load_graph_indices():
     """Загружает соответствия номеров из graph_indices.txt"""
     indices = {}
@@ -29,8 +31,9 @@ def process_all_graph_files():
         print("Не удалось загрузить graph_indices.txt, завершение работы.")
         return
     
-    # Находим все файлы, соответствующие шаблону
-    file_pattern = 'post_processed_routes_graph_*.json'
+    # Находим все файлы, соответствующие шаблону: результаты неизменившихся графов
+    # берутся из прошлых запусков, изменившихся - из свежей постобработки
+    file_pattern = os.path.join(POST_PROCESSED_DIR, 'post_processed_routes_graph_*.json')
     json_files = glob.glob(file_pattern)
     
     if not json_files:
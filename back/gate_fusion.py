@@ -0,0 +1,104 @@
+import numpy as np
+
+
+# Слияние подряд идущих однокубитных гейтов в один U3.
+#
+# Матрицы гейтов считаются пакетно для всех кубитов сразу: массивы (кубиты, 2, 2).
+# Произведение 2x2 расписано поэлементно, поэтому результат не зависит от размера
+# пакета - один кубит через qiskit и все кубиты разом через шаблон дают одни и те же углы.
+# Эквивалентность проверяется fidelity |Tr(V^+ U)| / 2 между произведением
+# исходных гейтов U и восстановленным U3 V (1.0 - совпадение с точностью до фазы).
+
+_EPS = 1e-12
+
+
+def rotation_matrices(gate_name, angles):
+    """Матрицы RX / RY / RZ / U1 для массива углов: (n, 2, 2) complex"""
+    angles = np.asarray(angles, dtype=np.float64)
+    matrices = np.zeros(angles.shape + (2, 2), dtype=np.complex128)
+    c = np.cos(angles / 2)
+    s = np.sin(angles / 2)
+
+    if gate_name == 'RX':
+        matrices[..., 0, 0] = c
+        matrices[..., 0, 1] = -1j * s
+        matrices[..., 1, 0] = -1j * s
+        matrices[..., 1, 1] = c
+    elif gate_name == 'RY':
+        matrices[..., 0, 0] = c
+        matrices[..., 0, 1] = -s
+        matrices[..., 1, 0] = s
+        matrices[..., 1, 1] = c
+    elif gate_name == 'RZ':
+        matrices[..., 0, 0] = np.exp(-0.5j * angles)
+        matrices[..., 1, 1] = np.exp(0.5j * angles)
+    elif gate_name == 'U1':
+        matrices[..., 0, 0] = 1
+        matrices[..., 1, 1] = np.exp(1j * angles)
+    else:
+        raise ValueError(f"Нет матрицы для гейта {gate_name}")
+    return matrices
+
+
+def u3_matrices(theta, phi, lam):
+    """Матрицы U3(theta, phi, lambda): (n, 2, 2) complex"""
+    theta, phi, lam = (np.asarray(x, dtype=np.float64) for x in (theta, phi, lam))
+    matrices = np.empty(theta.shape + (2, 2), dtype=np.complex128)
+    c = np.cos(theta / 2)
+    s = np.sin(theta / 2)
+    matrices[..., 0, 0] = c
+    matrices[..., 0, 1] = -np.exp(1j * lam) * s
+    matrices[..., 1, 0] = np.exp(1j * phi) * s
+    matrices[..., 1, 1] = np.exp(1j * (phi + lam)) * c
+    return matrices
+
+
+def compose(later, earlier):
+    """Произведение later @ earlier для пакетов матриц 2x2 (гейт earlier применяется первым)"""
+    result = np.empty(np.broadcast_shapes(later.shape, earlier.shape), dtype=np.complex128)
+    for i in range(2):
+        for j in range(2):
+            result[..., i, j] = later[..., i, 0] * earlier[..., 0, j] + later[..., i, 1] * earlier[..., 1, j]
+    return result
+
+
+def _wrap(angles):
+    return np.mod(angles + np.pi, 2 * np.pi) - np.pi
+
+
+def u3_angles(matrices):
+    """Углы (theta, phi, lambda) U3, равного матрицам с точностью до глобальной фазы"""
+    a00 = matrices[..., 0, 0]
+    a01 = matrices[..., 0, 1]
+    a10 = matrices[..., 1, 0]
+    a11 = matrices[..., 1, 1]
+
+    theta = 2 * np.arctan2(np.abs(a10), np.abs(a00))
+    # Глобальная фаза по ненулевому элементу первого столбца
+    phase = np.where(np.abs(a00) > _EPS, np.angle(a00), np.angle(a10))
+    phi = np.where(np.abs(a10) > _EPS, np.angle(a10) - phase, 0.0)
+    lam = np.where(np.abs(a01) > _EPS, np.angle(-a01) - phase, np.angle(a11) - phase - phi)
+    return theta, _wrap(phi), _wrap(lam)
+
+
+def fidelity(matrices, theta, phi, lam):
+    """|Tr(V^+ U)| / 2 для каждого кубита, V = U3(theta, phi, lambda)"""
+    v = u3_matrices(theta, phi, lam)
+    trace = np.sum(np.conj(v) * matrices, axis=(-2, -1))
+    return np.abs(trace) / 2
+
+
+def fuse_rotations(gates, n_qubits):
+    """
+    Сливает последовательность однокубитных поворотов на каждом кубите в U3.
+    gates - список (гейт, углы по кубитам) в порядке применения.
+    Возвращает (theta, phi, lambda, fidelity) - массивы длины n_qubits.
+    """
+    fused = np.zeros((n_qubits, 2, 2), dtype=np.complex128)
+    fused[:, 0, 0] = 1
+    fused[:, 1, 1] = 1
+    for gate_name, angles in gates:
+        fused = compose(rotation_matrices(gate_name, angles), fused)
+
+    theta, phi, lam = u3_angles(fused)
+    return theta, phi, lam, fidelity(fused, theta, phi, lam)
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class TrafficGraph:
+    """
+    Общее CSR-представление графа дорог, строится один раз на граф.
+
+    В CSR попадают все конечные внедиагональные элементы матрицы смежности
+    (соседи в каждой строке упорядочены по возрастанию номера вершины),
+    диагональ хранится отдельно. Каждой ячейке CSR сопоставлен номер
+    неориентированного ребра {u, v}, чтобы трафик можно было вести по рёбрам.
+    """
+
+    def __init__(self, n_nodes, indptr, indices, weights, diagonal):
+        self.n_nodes = n_nodes
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.diagonal = np.asarray(diagonal, dtype=np.float64)
+
+        self.rows = np.repeat(np.arange(n_nodes, dtype=np.int32), np.diff(self.indptr))
+        self.n_edges = len(self.indices)
+
+        # O(1) поиск ячейки CSR по паре вершин
+        keys = self.rows.astype(np.int64) * n_nodes + self.indices
+        self._slot_by_key = dict(zip(keys.tolist(), range(self.n_edges)))
+
+        # Номера неориентированных рёбер: (min, max) -> id
+        lo = np.minimum(self.rows, self.indices).astype(np.int64)
+        hi = np.maximum(self.rows, self.indices).astype(np.int64)
+        pair_keys, self.slot_edge_id = np.unique(lo * n_nodes + hi, return_inverse=True)
+        self.edge_u = (pair_keys // max(n_nodes, 1)).astype(np.int32)
+        self.edge_v = (pair_keys % max(n_nodes, 1)).astype(np.int32)
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Строит граф по плотной матрице смежности (inf - нет ребра)"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        n = len(matrix)
+        mask = np.isfinite(matrix)
+        np.fill_diagonal(mask, False)
+        rows, cols = np.nonzero(mask)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(n, indptr, cols, matrix[rows, cols], np.diagonal(matrix).copy())
+
+    @classmethod
+    def from_store(cls, store, k):
+        """Строит граф по CSR-массивам бинарного хранилища без плотной матрицы"""
+        n = store.n_nodes(k)
+        indptr, indices, weights = store.csr(k)
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        off_diag = rows != indices
+
+        diagonal = np.full(n, np.inf)
+        diagonal[rows[~off_diag]] = weights[~off_diag]
+
+        new_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[off_diag], minlength=n), out=new_indptr[1:])
+        return cls(n, new_indptr, indices[off_diag], weights[off_diag], diagonal)
+
+    @property
+    def n_undirected_edges(self):
+        return len(self.edge_u)
+
+    def slot(self, u, v):
+        """Номер ячейки CSR для ребра u -> v или -1"""
+        return self._slot_by_key.get(u * self.n_nodes + v, -1)
+
+    def has_edge(self, u, v):
+        return u * self.n_nodes + v in self._slot_by_key
+
+    def weight(self, u, v):
+        """Элемент исходной матрицы смежности (inf - нет ребра)"""
+        if u == v:
+            return float(self.diagonal[u])
+        slot = self._slot_by_key.get(u * self.n_nodes + v)
+        return float(self.weights[slot]) if slot is not None else float('inf')
+
+    def edge_id(self, u, v):
+        """Номер неориентированного ребра {u, v} или -1"""
+        slot = self.slot(u, v)
+        if slot < 0:
+            slot = self.slot(v, u)
+        return int(self.slot_edge_id[slot]) if slot >= 0 else -1
+
+    def neighbors(self, u):
+        """Соседи вершины u и веса рёбер (представления над CSR-массивами)"""
+        start, end = self.indptr[u], self.indptr[u + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def neighbor_list(self, u):
+        """Соседи вершины u как список (v, weight) по возрастанию v"""
+        indices, weights = self.neighbors(u)
+        return list(zip(indices.tolist(), weights.tolist()))
+
+    def upper_edges(self):
+        """Ячейки u < v в порядке обхода верхнего треугольника: (u, v, weight)"""
+        mask = self.rows < self.indices
+        return self.rows[mask], self.indices[mask], self.weights[mask]
@@ -0,0 +1,86 @@
+import csv
+import re
+import sys
+import numpy as np
+
+
+# Общий парсер колонок graph_matrix / routes_start_end из data.csv.
+# Строка матрицы токенизируется сразу в массив NumPy: скобки заменяются
+# пробелами, числа разбираются np.fromstring, который понимает inf
+# без подмены на math.inf / None и без eval / ast.literal_eval.
+# Висячие запятые перед закрывающей скобкой ([0, 1,]) допускаются, как и в eval.
+
+# Обозначения отсутствующего ребра, встречающиеся в выгрузках
+_INF_ALIASES = ("math.inf", "np.inf", "None", "null")
+
+_TRAILING_COMMA_RE = re.compile(r',\s*(?=[\])])')
+
+
+def _strip_quotes(text):
+    text = text.strip()
+    if text.startswith('"') and text.endswith('"'):
+        text = text[1:-1]
+    return text
+
+
+def _tokenize(text):
+    """Убирает скобки, оставляя только числа через запятую"""
+    for alias in _INF_ALIASES:
+        if alias in text:
+            text = text.replace(alias, "inf")
+    text = _TRAILING_COMMA_RE.sub(" ", text)
+    return text.replace("[", " ").replace("]", " ").replace("(", " ").replace(")", " ")
+
+
+def parse_matrix(text):
+    """Парсит матрицу смежности вида [[0.0, inf, ...], ...] в массив n*n float64"""
+    text = _strip_quotes(text)
+    n = text.count("[") - 1
+    if n <= 0:
+        raise ValueError("Матрица должна быть списком строк [[...], ...]")
+
+    values = np.fromstring(_tokenize(text), dtype=np.float64, sep=",")
+    if values.size != n * n:
+        raise ValueError(f"Ожидалось {n * n} элементов матрицы {n}x{n}, получено {values.size}")
+    return values.reshape(n, n)
+
+
+def parse_routes(text):
+    """Парсит маршруты вида [[start, end], ...] в массив (m, 2) int32"""
+    text = _strip_quotes(text)
+    body = _tokenize(text)
+    if not body.strip().strip(","):
+        return np.empty((0, 2), dtype=np.int32)
+
+    # Номера вершин могут быть записаны как 3.0 - допускаются целые значения с плавающей точкой
+    values = np.fromstring(body, dtype=np.float64, sep=",")
+    if values.size % 2:
+        raise ValueError(f"Нечётное количество чисел в маршрутах: {values.size}")
+    if not np.all(np.isfinite(values) & (values == np.round(values))):
+        raise ValueError("Номера вершин маршрутов должны быть целыми")
+    return values.astype(np.int32).reshape(-1, 2)
+
+
+def iter_data_rows(input_csv):
+    """
+    Построчно читает data.csv и отдаёт (номер строки, graph_index, матрица, маршруты).
+    Файл не загружается целиком; строки с ошибками пропускаются с сообщением.
+    """
+    # Строка матрицы 100x100 длиннее стандартного лимита поля csv
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+    with open(input_csv, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+
+        for row_num, row in enumerate(reader, 1):
+            if len(row) < 3:
+                continue
+            try:
+                graph_index = int(row[0].strip())
+                matrix = parse_matrix(row[1])
+                routes = parse_routes(row[2])
+            except Exception as e:
+                print(f"Ошибка при обработке строки {row_num}: {e}")
+                continue
+            yield row_num, graph_index, matrix, routes
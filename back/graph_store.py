@@ -0,0 +1,238 @@
+import os
+import struct
+import numpy as np
+
+
+# Бинарное хранилище графов одной загрузки (замена G_set.txt / routes.txt).
+#
+# Раскладка файла:
+#   [заголовок 64 байта] [блоки данных графов, выровненные по 64 байта] [индекс]
+# Заголовок: magic, версия, количество графов, смещение индекса.
+# Индекс - массив записей INDEX_DTYPE, по одной на граф: смещения весов,
+# CSR-массивов и маршрутов внутри файла.
+#
+# Плотный граф хранится как n*n float64 (inf - нет ребра).
+# Разреженный - как CSR: indptr (n+1, int64), indices (nnz, int32),
+# weights (nnz, float64); в CSR попадают все конечные элементы матрицы,
+# включая нулевую диагональ, поэтому восстановление матрицы точное.
+# Маршруты - массив (m, 2) int32.
+
+GRAPH_STORE_FILE = "graph_store.bin"
+
+STORE_MAGIC = b"QGSTORE1"
+STORE_VERSION = 1
+HEADER_FORMAT = "<8sIIQ"
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+LAYOUT_DENSE = 0
+LAYOUT_CSR = 1
+
+# Доля конечных элементов, ниже которой граф хранится в CSR
+SPARSE_DENSITY_THRESHOLD = 0.25
+
+INDEX_DTYPE = np.dtype([
+    ("graph_index", "<i8"),
+    ("n_nodes", "<i8"),
+    ("layout", "<i8"),
+    ("nnz", "<i8"),
+    ("weights_offset", "<i8"),
+    ("indptr_offset", "<i8"),
+    ("indices_offset", "<i8"),
+    ("routes_offset", "<i8"),
+    ("n_routes", "<i8"),
+])
+
+
+def is_graph_store(filename):
+    """Проверяет, что файл является бинарным хранилищем графов"""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(STORE_MAGIC)) == STORE_MAGIC
+    except OSError:
+        return False
+
+
+class GraphStoreWriter:
+    """Потоковая запись графов в бинарное хранилище (граф за графом)"""
+
+    def __init__(self, filename, layout="auto"):
+        self.filename = filename
+        self.layout = layout
+        self._tmp_filename = f"{filename}.tmp"
+        self._f = open(self._tmp_filename, 'wb')
+        self._f.write(b"\0" * HEADER_SIZE)
+        self._index = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _write_blob(self, array):
+        """Пишет массив с выравниванием и возвращает его смещение"""
+        pos = self._f.tell()
+        pad = (-pos) % ALIGNMENT
+        if pad:
+            self._f.write(b"\0" * pad)
+            pos += pad
+        self._f.write(np.ascontiguousarray(array).tobytes())
+        return pos
+
+    def _choose_layout(self, finite_mask):
+        if self.layout == "dense":
+            return LAYOUT_DENSE
+        if self.layout == "csr":
+            return LAYOUT_CSR
+        n = finite_mask.shape[0]
+        density = finite_mask.sum() / float(n * n) if n else 1.0
+        return LAYOUT_CSR if density < SPARSE_DENSITY_THRESHOLD else LAYOUT_DENSE
+
+    def add(self, graph_index, matrix, routes):
+        """Добавляет граф (матрица смежности с inf) и его маршруты"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        n = matrix.shape[0] if matrix.ndim == 2 else 0
+        if matrix.ndim != 2 or matrix.shape[1] != n:
+            raise ValueError(f"Матрица графа {graph_index} не квадратная: {matrix.shape}")
+
+        routes = np.asarray(routes, dtype=np.int32).reshape(-1, 2)
+
+        finite_mask = np.isfinite(matrix)
+        layout = self._choose_layout(finite_mask)
+
+        entry = np.zeros((), dtype=INDEX_DTYPE)
+        entry["graph_index"] = int(graph_index)
+        entry["n_nodes"] = n
+        entry["layout"] = layout
+        entry["indptr_offset"] = -1
+        entry["indices_offset"] = -1
+
+        if layout == LAYOUT_DENSE:
+            entry["nnz"] = int(finite_mask.sum())
+            entry["weights_offset"] = self._write_blob(matrix)
+        else:
+            rows, cols = np.nonzero(finite_mask)
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+            entry["nnz"] = len(cols)
+            entry["weights_offset"] = self._write_blob(matrix[rows, cols])
+            entry["indptr_offset"] = self._write_blob(indptr)
+            entry["indices_offset"] = self._write_blob(cols.astype(np.int32))
+
+        entry["routes_offset"] = self._write_blob(routes)
+        entry["n_routes"] = len(routes)
+        self._index.append(entry)
+
+    def close(self):
+        """Дописывает индекс, заголовок и атомарно публикует файл"""
+        index = np.array(self._index, dtype=INDEX_DTYPE)
+        index_offset = self._write_blob(index)
+        self._f.seek(0)
+        self._f.write(struct.pack(HEADER_FORMAT, STORE_MAGIC, STORE_VERSION, len(index), index_offset))
+        self._f.close()
+        os.replace(self._tmp_filename, self.filename)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self._tmp_filename):
+            os.remove(self._tmp_filename)
+
+
+class GraphStore:
+    """
+    Чтение бинарного хранилища графов через memory-map.
+    Плотные матрицы, CSR-массивы и маршруты возвращаются как read-only
+    представления над отображённым файлом, без копирования и парсинга.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._buf = np.memmap(filename, dtype=np.uint8, mode='r')
+        if len(self._buf) < HEADER_SIZE:
+            raise ValueError(f"{filename}: файл слишком мал для хранилища графов")
+
+        magic, version, n_graphs, index_offset = struct.unpack_from(HEADER_FORMAT, self._buf, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{filename}: не является хранилищем графов")
+        if version != STORE_VERSION:
+            raise ValueError(f"{filename}: неподдерживаемая версия хранилища {version}")
+
+        self.index = np.frombuffer(self._buf, dtype=INDEX_DTYPE, count=n_graphs, offset=index_offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _view(self, dtype, count, offset):
+        return np.frombuffer(self._buf, dtype=dtype, count=count, offset=offset)
+
+    @property
+    def graph_labels(self):
+        """Номера графов (graph_index из data.csv) в порядке записи"""
+        return self.index["graph_index"].tolist()
+
+    def n_nodes(self, k):
+        return int(self.index[k]["n_nodes"])
+
+    def n_routes(self, k):
+        return int(self.index[k]["n_routes"])
+
+    def is_sparse(self, k):
+        return int(self.index[k]["layout"]) == LAYOUT_CSR
+
+    def matrix(self, k):
+        """Матрица смежности графа k (inf - нет ребра)"""
+        entry = self.index[k]
+        n = int(entry["n_nodes"])
+
+        if int(entry["layout"]) == LAYOUT_DENSE:
+            return self._view(np.float64, n * n, int(entry["weights_offset"])).reshape(n, n)
+
+        indptr, indices, weights = self.csr(k)
+        matrix = np.full((n, n), np.inf)
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        matrix[rows, indices] = weights
+        return matrix
+
+    def csr(self, k):
+        """CSR-представление конечных элементов графа k: (indptr, indices, weights)"""
+        entry = self.index[k]
+        n = int(entry["n_nodes"])
+        nnz = int(entry["nnz"])
+
+        if int(entry["layout"]) == LAYOUT_CSR:
+            indptr = self._view(np.int64, n + 1, int(entry["indptr_offset"]))
+            indices = self._view(np.int32, nnz, int(entry["indices_offset"]))
+            weights = self._view(np.float64, nnz, int(entry["weights_offset"]))
+            return indptr, indices, weights
+
+        matrix = self.matrix(k)
+        rows, cols = np.nonzero(np.isfinite(matrix))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, cols.astype(np.int32), matrix[rows, cols]
+
+    def routes(self, k):
+        """Маршруты графа k как массив (m, 2) int32"""
+        entry = self.index[k]
+        m = int(entry["n_routes"])
+        return self._view(np.int32, 2 * m, int(entry["routes_offset"])).reshape(m, 2)
+
+    def route_list(self, k):
+        """Маршруты графа k в прежнем формате: список [start, end]"""
+        return self.routes(k).tolist()
+
+
+def write_graph_store(filename, records, layout="auto"):
+    """Записывает последовательность (graph_index, matrix, routes) в хранилище"""
+    with GraphStoreWriter(filename, layout=layout) as writer:
+        for graph_index, matrix, routes in records:
+            writer.add(graph_index, matrix, routes)
+        count = len(writer)
+    return count
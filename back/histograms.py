@@ -0,0 +1,143 @@
+import json
+import numpy as np
+
+
+# Компактные гистограммы результатов машин одного графа.
+#
+# Вместо списка словарей {битовая строка: число} на машину все гистограммы графа
+# лежат в трёх массивах:
+#   outcomes - исход как целое число (кубит 0 - младший бит, как правый бит строки)
+#   counts   - число попаданий, uint32
+#   offsets  - границы машин: исходы машины i - outcomes[offsets[i]:offsets[i + 1]]
+# Порядок исходов внутри машины - порядок строк в Result_*.json, поэтому argmax
+# берёт первый из равных максимумов, как прежний перебор словаря. Маргиналы, argmax
+# и top-k считаются сразу для всех машин графа векторно.
+
+
+class GraphHistograms:
+    """Гистограммы всех машин графа в плоских массивах NumPy"""
+
+    def __init__(self, outcomes, counts, offsets, lengths, n_qubits):
+        self.outcomes = outcomes
+        self.counts = counts
+        self.offsets = offsets
+        # Длины исходных битовых строк: строка не той ширины - ошибка данных
+        self.lengths = lengths
+        self.n_qubits = n_qubits
+
+    @classmethod
+    def from_counts(cls, counts_list, n_qubits):
+        """Из списка словарей {битовая строка: число} (порядок словаря сохраняется)"""
+        bitstrings = [bitstring for counts in counts_list for bitstring in counts]
+        values = [value for counts in counts_list for value in counts.values()]
+        sizes = [len(counts) for counts in counts_list]
+        return cls._from_flat(bitstrings, values, sizes, n_qubits)
+
+    @classmethod
+    def from_result_files(cls, result_files, n_qubits, on_error=None):
+        """
+        Читает Result_*.json в заданном порядке. Файл, который не удалось прочитать,
+        даёт пустую гистограмму; on_error(путь, исключение) сообщает об ошибке.
+        """
+        bitstrings = []
+        values = []
+        sizes = []
+        for file_path in result_files:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)['data']
+                file_bitstrings = [item['bitstring'] for item in data]
+                file_values = [item['value'] for item in data]
+                if len(set(file_bitstrings)) != len(file_bitstrings):
+                    # Повторная строка: как и в словаре, остаётся последнее значение на месте первой
+                    merged = dict(zip(file_bitstrings, file_values))
+                    file_bitstrings, file_values = list(merged), list(merged.values())
+            except Exception as e:
+                if on_error is not None:
+                    on_error(file_path, e)
+                file_bitstrings, file_values = [], []
+            bitstrings.extend(file_bitstrings)
+            values.extend(file_values)
+            sizes.append(len(file_bitstrings))
+        return cls._from_flat(bitstrings, values, sizes, n_qubits)
+
+    @classmethod
+    def _from_flat(cls, bitstrings, values, sizes, n_qubits):
+        width = max((len(bitstring) for bitstring in bitstrings), default=n_qubits)
+        dtype = np.uint16 if width <= 16 else np.uint32 if width <= 32 else np.uint64
+        outcomes = np.array([int(bitstring, 2) for bitstring in bitstrings], dtype=dtype)
+        lengths = np.array([len(bitstring) for bitstring in bitstrings], dtype=np.uint8)
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        return cls(outcomes, np.array(values, dtype=np.uint32), offsets, lengths, n_qubits)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.outcomes.nbytes + self.counts.nbytes + self.offsets.nbytes + self.lengths.nbytes
+
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def totals(self):
+        """Число запусков каждой машины"""
+        cumulative = np.concatenate(([0], np.cumsum(self.counts, dtype=np.int64)))
+        return cumulative[self.offsets[1:]] - cumulative[self.offsets[:-1]]
+
+    def marginals(self):
+        """P(x_i = 1) для всех машин: массив (машины, n_qubits)"""
+        bits = (self.outcomes[:, None].astype(np.int64) >> np.arange(self.n_qubits)) & 1
+        cumulative = np.zeros((len(self.outcomes) + 1, self.n_qubits), dtype=np.int64)
+        np.cumsum(bits * self.counts[:, None].astype(np.int64), axis=0, out=cumulative[1:])
+        ones = cumulative[self.offsets[1:]] - cumulative[self.offsets[:-1]]
+        totals = self.totals()
+        marginals = np.zeros(ones.shape, dtype=float)
+        np.divide(ones, totals[:, None], out=marginals, where=totals[:, None] > 0)
+        return marginals
+
+    def top_k(self, k=1):
+        """
+        Индексы k самых частых исходов каждой машины: массив (машины, k), -1 - нет исхода.
+        При равных числах раньше идёт исход, стоящий раньше в файле.
+        """
+        n_cars = len(self)
+        sizes = self.sizes()
+        car_ids = np.repeat(np.arange(n_cars), sizes)
+        positions = np.arange(len(self.counts))
+        order = np.lexsort((positions, -self.counts.astype(np.int64), car_ids))
+        # Ранг исхода внутри своей машины после сортировки
+        rank = positions - np.repeat(self.offsets[:-1], sizes)
+        selected = rank < k
+        result = np.full((n_cars, k), -1, dtype=np.int64)
+        result[car_ids[selected], rank[selected]] = order[selected]
+        return result
+
+    def argmax(self):
+        """Индекс самого частого исхода каждой машины (первый из равных), -1 - пустая гистограмма"""
+        return self.top_k(1)[:, 0]
+
+    def to_nodes(self, indices, n_nodes):
+        """
+        Номера вершин по индексам исходов (как BinaryQAOAPostProcessor.binary_to_node):
+        исход вне диапазона вершин берётся по модулю n_nodes; -1 остаётся -1.
+        """
+        valid = indices >= 0
+        picked = indices[valid]
+        bad = self.lengths[picked] != self.n_qubits
+        if bad.any():
+            raise ValueError(f"Длина битовой строки {int(self.lengths[picked][bad][0])} "
+                             f"не совпадает с n_qubits_per_node {self.n_qubits}")
+        nodes = np.full(indices.shape, -1, dtype=np.int64)
+        nodes[valid] = self.outcomes[picked].astype(np.int64) % n_nodes
+        return nodes
+
+    def counts_dict(self, car_idx):
+        """Гистограмма машины в прежнем виде {битовая строка: число}"""
+        start, end = self.offsets[car_idx], self.offsets[car_idx + 1]
+        return {
+            format(int(outcome), f'0{int(length)}b'): int(count)
+            for outcome, count, length in zip(self.outcomes[start:end], self.counts[start:end],
+                                              self.lengths[start:end])
+        }
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import numpy as np
+from submission_journal import rewrite_journal
+
+
+# Манифест инкрементальной загрузки data.csv.
+#
+# Для каждой строки (позиции графа) хранится отпечаток содержимого -
+# хэш матрицы и маршрутов. При повторной загрузке графы сопоставляются
+# по отпечатку, а не по номеру строки: для неизменившихся графов
+# переиспользуются уже готовые схемы, результаты и постобработка, даже если
+# строка сдвинулась (артефакты graph_<старая позиция> переезжают в
+# graph_<новая позиция>), а артефакты новых/изменённых и удалённых строк
+# удаляются, чтобы пайплайн пересобрал только их.
+# PNG привязаны к номеру графа (graph_index) и сохраняются, только если под
+# этим номером лежит тот же граф, что и в прошлой загрузке.
+# Список позиций, которые нужно пересобрать, сохраняется в поле "dirty".
+
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+# Манифест упаковки payload_packing.py: в нём имена Result_*.json, содержащие позицию графа
+PACKING_MANIFEST = "packing_manifest.jsonl"
+
+_HISTORY_KEY_RE = re.compile(r'^graph_(\d+)/')
+
+
+def fingerprint_graph(matrix, routes):
+    """Отпечаток строки data.csv: размеры, матрица и маршруты"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    routes = np.ascontiguousarray(routes, dtype=np.int32).reshape(-1, 2)
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.array(matrix.shape + routes.shape, dtype=np.int64).tobytes())
+    h.update(matrix.tobytes())
+    h.update(routes.tobytes())
+    return h.hexdigest()
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    """Загружает манифест; если его нет - возвращает None"""
+    if not os.path.exists(manifest_file):
+        return None
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+    except Exception as e:
+        print(f"Не удалось прочитать манифест {manifest_file}: {e}")
+        return None
+
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, manifest_file)
+
+
+def dirty_graphs(manifest_file=MANIFEST_FILE):
+    """Позиции графов для пересборки; None - манифеста нет, обрабатывать все"""
+    manifest = load_manifest(manifest_file)
+    if manifest is None:
+        return None
+    return manifest.get("dirty", [])
+
+
+def clean_graph_labels(manifest_file=MANIFEST_FILE):
+    """Номера графов (graph_index), артефакты которых переиспользуются"""
+    manifest = load_manifest(manifest_file)
+    if manifest is None:
+        return set()
+    dirty = set(manifest.get("dirty", []))
+    return {entry["graph_index"] for entry in manifest["graphs"] if entry["position"] not in dirty}
+
+
+def graph_artifacts(position, input_dir="input", results_dir="results", post_dir="post_processed_results",
+                    packed_input_dir="input_packed", packed_results_dir="results_packed"):
+    """Пути артефактов пайплайна, привязанных к позиции графа"""
+    return [
+        os.path.join(input_dir, f"graph_{position}"),
+        os.path.join(results_dir, f"graph_{position}"),
+        os.path.join(packed_input_dir, f"graph_{position}"),
+        os.path.join(packed_results_dir, f"graph_{position}"),
+        os.path.join(post_dir, f"post_processed_routes_graph_{position}.json"),
+    ]
+
+
+def graph_png(graph_index, vis_dir="visualised_qf"):
+    return os.path.join(vis_dir, f"graph_{graph_index}.png")
+
+
+def _has_artifacts(position, input_dir, post_dir):
+    return (os.path.exists(os.path.join(post_dir, f"post_processed_routes_graph_{position}.json")) or
+            os.path.isdir(os.path.join(input_dir, f"graph_{position}")))
+
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def match_positions(records, old_graphs, reusable):
+    """
+    Сопоставляет графы новой загрузки с прошлой по отпечатку: {новая позиция: старая позиция}.
+    Граф, оставшийся на своей позиции, не переезжает; остальные занимают свободную
+    старую позицию с тем же отпечатком. reusable - старые позиции с готовыми артефактами.
+    """
+    matches = {}
+    for position, (_, fingerprint) in enumerate(records):
+        if (position < len(old_graphs) and position in reusable and
+                old_graphs[position]["fingerprint"] == fingerprint):
+            matches[position] = position
+
+    used = set(matches.values())
+    free = {}
+    for old_position, old in enumerate(old_graphs):
+        if old_position in reusable and old_position not in used:
+            free.setdefault(old["fingerprint"], []).append(old_position)
+
+    for position, (_, fingerprint) in enumerate(records):
+        if position not in matches and free.get(fingerprint):
+            matches[position] = free[fingerprint].pop(0)
+    return matches
+
+
+def _renumber_result_name(name, old_position, new_position):
+    prefix = f"Result_graph_{old_position}_"
+    if name.startswith(prefix):
+        return f"Result_graph_{new_position}_{name[len(prefix):]}"
+    return name
+
+
+def _renumber_artifact(path, old_position, new_position):
+    """Номер графа в именах Result_*.json, манифесте упаковки и файле постобработки"""
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            new_name = _renumber_result_name(name, old_position, new_position)
+            if new_name != name:
+                os.replace(os.path.join(path, name), os.path.join(path, new_name))
+
+        manifest_path = os.path.join(path, PACKING_MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            for entry in entries:
+                entry["result"] = _renumber_result_name(entry["result"], old_position, new_position)
+                for car in entry["cars"]:
+                    car["result"] = _renumber_result_name(car["result"], old_position, new_position)
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    elif os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data["graph_index"] = new_position
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def _rename_history_key(key, position_map):
+    """Ключ "graph_k/файл" после переезда графов; None - граф пересобирается"""
+    match = _HISTORY_KEY_RE.match(key)
+    if not match:
+        return key
+    new_position = position_map.get(int(match.group(1)))
+    if new_position is None:
+        return None
+    return f"graph_{new_position}/{key[match.end():]}"
+
+
+def _update_submission_history(position_map, results_dir):
+    """
+    Переносит историю отправки (журнал и processed_files.json) на новые позиции графов;
+    записи пересобираемых и удалённых графов удаляются
+    """
+    try:
+        rewrite_journal(results_dir, lambda key: _rename_history_key(key, position_map))
+    except Exception as e:
+        print(f"Не удалось обновить журнал отправок в {results_dir}: {e}")
+
+    processed_path = os.path.join(results_dir, "processed_files.json")
+    if not os.path.exists(processed_path):
+        return
+    try:
+        with open(processed_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        files = (_rename_history_key(key, position_map) for key in data.get("files", []))
+        data["files"] = [key for key in files if key is not None]
+        with open(processed_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    except Exception as e:
+        print(f"Не удалось обновить {processed_path}: {e}")
+
+
+def apply_ingest(records, manifest_file=MANIFEST_FILE, input_dir="input", results_dir="results",
+                 post_dir="post_processed_results", vis_dir="visualised_qf",
+                 packed_input_dir="input_packed", packed_results_dir="results_packed"):
+    """
+    Сопоставляет графы новой загрузки с манифестом по отпечаткам, переносит артефакты
+    сдвинувшихся графов, удаляет устаревшие и сохраняет новый манифест.
+    records - список (graph_index, fingerprint) в порядке строк data.csv.
+    Возвращает список позиций графов, которые нужно пересобрать.
+    """
+    previous = load_manifest(manifest_file)
+    old_graphs = previous["graphs"] if previous else []
+
+    def artifacts(position):
+        return graph_artifacts(position, input_dir, results_dir, post_dir, packed_input_dir, packed_results_dir)
+
+    reusable = {position for position in range(len(old_graphs)) if _has_artifacts(position, input_dir, post_dir)}
+    matches = match_positions(records, old_graphs, reusable)
+    dirty = [position for position in range(len(records)) if position not in matches]
+    moves = {old_position: position for position, old_position in matches.items() if old_position != position}
+
+    # Переезжающие артефакты сначала убираются во временные пути: позиции могут меняться по цепочке
+    staged = []
+    for old_position, position in moves.items():
+        for src, dst in zip(artifacts(old_position), artifacts(position)):
+            if os.path.exists(src):
+                tmp_path = f"{src}.ingest_move"
+                _remove_path(tmp_path)
+                os.replace(src, tmp_path)
+                staged.append((tmp_path, dst, old_position, position))
+
+    # Всё, что осталось на позициях, кроме графов, не сменивших позицию, устарело
+    for position in range(max(len(old_graphs), len(records))):
+        if matches.get(position) != position:
+            for path in artifacts(position):
+                _remove_path(path)
+
+    for tmp_path, dst, old_position, position in staged:
+        os.replace(tmp_path, dst)
+        _renumber_artifact(dst, old_position, position)
+
+    position_map = {old_position: position for position, old_position in matches.items()}
+    _update_submission_history(position_map, results_dir)
+    _update_submission_history(position_map, packed_results_dir)
+
+    # PNG графа остаётся, только если под тем же номером лежит тот же граф
+    old_labels = {old["graph_index"]: old["fingerprint"] for old in old_graphs}
+    new_labels = {graph_index: fingerprint for graph_index, fingerprint in records}
+    for graph_index in set(old_labels) | set(new_labels):
+        if old_labels.get(graph_index) != new_labels.get(graph_index):
+            _remove_path(graph_png(graph_index, vis_dir))
+
+    save_manifest({
+        "version": MANIFEST_VERSION,
+        "graphs": [
+            {"position": position, "graph_index": graph_index, "fingerprint": fingerprint}
+            for position, (graph_index, fingerprint) in enumerate(records)
+        ],
+        "dirty": dirty,
+    }, manifest_file)
+
+    print(f"Инкрементальная загрузка: без изменений {len(matches)} (из них сдвинулось {len(moves)}), "
+          f"новых/изменённых {len(dirty)}, удалённых {len(old_graphs) - len(matches)}")
+    return dirty
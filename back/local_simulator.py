@@ -0,0 +1,408 @@
+import glob
+import json
+import os
+import re
+import numpy as np
+from gate_fusion import rotation_matrices, u3_matrices
+from payload_io import is_payload_file, iter_angle_types, read_payload
+
+
+# Локальный симулятор схем (statevector на NumPy) вместо удалённого API.
+#
+# Читает api_payload_car_*.json(.gz) любого формата payload_io (или схему
+# в формате UnifiedCircuitConverter.convert_circuit), моделирует её,
+# разыгрывает launch измерений мультиномиальным распределением и пишет
+# results/graph_k/Result_graph_k_car_j.json в том же формате, что app.js:
+# {"data": [{"bitstring": "0101", "value": 17}, ...]}.
+# Кубит 0 - крайний правый символ битовой строки (как в qiskit и p_quntun).
+# Угол гейта берётся из числового input-number его параметра.
+#
+# Схемы одной формы (все машины графа) моделируются пакетом: состояние -
+# тензор (машины, 2^q), каждый гейт применяется сразу ко всем машинам
+# со своими углами. Ось машин режется на куски, чтобы пакет занимал не больше
+# max_amplitudes комплексных амплитуд.
+
+# 2^22 амплитуд complex128 - 64 МБ на пакет состояний
+DEFAULT_MAX_AMPLITUDES = 1 << 22
+
+_SQRT_HALF = np.sqrt(0.5)
+
+FIXED_GATES = {
+    'I': np.eye(2, dtype=np.complex128),
+    'H': np.array([[1, 1], [1, -1]], dtype=np.complex128) * _SQRT_HALF,
+    'X': np.array([[0, 1], [1, 0]], dtype=np.complex128),
+    'Y': np.array([[0, -1j], [1j, 0]], dtype=np.complex128),
+    'Z': np.array([[1, 0], [0, -1]], dtype=np.complex128),
+    'S': np.array([[1, 0], [0, 1j]], dtype=np.complex128),
+    'S_REVERSE': np.array([[1, 0], [0, -1j]], dtype=np.complex128),
+    'T': np.array([[1, 0], [0, np.exp(0.25j * np.pi)]], dtype=np.complex128),
+    'T_REVERSE': np.array([[1, 0], [0, np.exp(-0.25j * np.pi)]], dtype=np.complex128),
+    'SQUARE_ROOT_X': np.array([[1 + 1j, 1 - 1j], [1 - 1j, 1 + 1j]], dtype=np.complex128) / 2,
+}
+
+_SKIPPED_GATES = ('BARRIER', 'MEASUREMENT', 'CONTROL', 'SWAP')
+
+
+def gate_matrices(title, angles):
+    """
+    Матрицы однокубитного гейта API для пакета схем: angles - (машины, число углов).
+    Возвращает (машины, 2, 2) или одну матрицу (2, 2) для гейтов без параметров.
+    """
+    if title in FIXED_GATES:
+        return FIXED_GATES[title]
+    if title in ('RX', 'RY', 'RZ', 'U1'):
+        return rotation_matrices(title, angles[:, 0])
+    if title == 'U2':
+        return u3_matrices(np.full(len(angles), np.pi / 2), angles[:, 0], angles[:, 1])
+    if title == 'U3':
+        return u3_matrices(angles[:, 0], angles[:, 1], angles[:, 2])
+    raise ValueError(f"Гейт {title} не поддерживается локальным симулятором")
+
+
+def _element_angles(element):
+    params = element.get("params")
+    if not params:
+        return []
+    return [float(type_item["data"]) for type_item in iter_angle_types(params)]
+
+
+def _angle_paths(params):
+    """Индексы (param, value, types) слотов углов - по ним углы достаются без обхода params"""
+    return [(i, j, k)
+            for i, param in enumerate(params)
+            for j, value in enumerate(param.get("value") or [])
+            for k, type_item in enumerate(value.get("types") or [])
+            if type_item.get("key") == "input-number" and type_item.get("input") == "input"]
+
+
+def circuit_schedule(data):
+    """
+    Схема по столбцам: (число кубитов, [[(кубит, гейт, углы), ...] по столбцам], измеряемые кубиты).
+    Принимает payload API или результат convert_circuit.
+    """
+    if "actualHistoryMap" in data:
+        history = data["actualHistoryMap"]
+        elements = data["elementsObject"]
+        n_qubits = len(history)
+        n_columns = max((len(line) for line in history), default=0)
+        columns = [[] for _ in range(n_columns)]
+        for qubit, line in enumerate(history):
+            for column, gate_id in enumerate(line):
+                element = elements.get(gate_id)
+                if element is not None:
+                    columns[column].append((qubit, element["title"], _element_angles(element)))
+    else:
+        n_qubits = data["qubit"]
+        columns = [[] for _ in range(data["column"])]
+        for gate in data["data"]:
+            if gate.get("qubit") is None:
+                continue
+            params = gate.get("params") or []
+            angles = [float(type_item["data"]) for type_item in iter_angle_types(params)]
+            columns[gate["column"]].append((gate["qubit"], gate["title"], angles))
+
+    measured = sorted({qubit for column in columns for qubit, title, _ in column if title == 'MEASUREMENT'})
+    return n_qubits, columns, measured
+
+
+def apply_single_qubit(state, matrix, qubit):
+    """Однокубитный гейт на векторы состояний (..., 2^n); matrix - (2, 2) или (..., 2, 2)"""
+    shape = state.shape
+    # Кубит qubit - средняя ось размера 2; старшие и младшие биты индекса не меняются
+    psi = state.reshape(shape[:-1] + (shape[-1] // (2 << qubit), 2, 1 << qubit))
+    low = psi[..., 0, :]
+    high = psi[..., 1, :]
+
+    # Для пакета матриц элементы растягиваются на оси (старшие биты, младшие биты)
+    tail = (None, None) if matrix.ndim > 2 else ()
+
+    def m(i, j):
+        return matrix[(Ellipsis, i, j) + tail]
+
+    result = np.empty_like(psi)
+    result[..., 0, :] = m(0, 0) * low + m(0, 1) * high
+    result[..., 1, :] = m(1, 0) * low + m(1, 1) * high
+    return result.reshape(shape)
+
+
+def _control_mask(n_qubits, controls):
+    indices = np.arange(1 << n_qubits)
+    mask = np.ones(1 << n_qubits, dtype=bool)
+    for qubit in controls:
+        mask &= ((indices >> qubit) & 1).astype(bool)
+    return mask
+
+
+def _apply_swap(state, qubit_a, qubit_b, n_qubits):
+    indices = np.arange(1 << n_qubits)
+    bit_a = (indices >> qubit_a) & 1
+    bit_b = (indices >> qubit_b) & 1
+    swapped = indices ^ ((bit_a ^ bit_b) << qubit_a) ^ ((bit_a ^ bit_b) << qubit_b)
+    return state[..., swapped]
+
+
+def schedule_signature(schedule):
+    """Форма схемы без углов: схемы с одинаковой формой моделируются одним пакетом"""
+    n_qubits, columns, measured = schedule
+    return (n_qubits,
+            tuple(tuple((qubit, title, len(angles)) for qubit, title, angles in column) for column in columns),
+            tuple(measured))
+
+
+def simulate_statevectors(signature, gate_angles, batch):
+    """
+    Пакетное моделирование batch схем одной формы.
+    gate_angles - по массиву (машины, число углов) на каждый гейт в порядке signature.
+    Возвращает состояния (машины, 2^n) до измерения.
+    """
+    n_qubits, columns, _ = signature
+    state = np.zeros((batch, 1 << n_qubits), dtype=np.complex128)
+    state[:, 0] = 1
+
+    gate_idx = 0
+    for column in columns:
+        controls = [qubit for qubit, title, _ in column if title == 'CONTROL']
+        swaps = [qubit for qubit, title, _ in column if title == 'SWAP']
+
+        for qubit, title, _ in column:
+            angles = gate_angles[gate_idx]
+            gate_idx += 1
+            if title in _SKIPPED_GATES:
+                continue
+            updated = apply_single_qubit(state, gate_matrices(title, angles), qubit)
+            if controls:
+                # Гейт в одном столбце с CONTROL применяется только при всех единичных управляющих
+                updated = np.where(_control_mask(n_qubits, controls), updated, state)
+            state = updated
+
+        if len(swaps) == 2:
+            state = _apply_swap(state, swaps[0], swaps[1], n_qubits)
+
+    return state
+
+
+def _schedule_angles(schedule):
+    """Углы гейтов схемы в порядке schedule_signature"""
+    return [angles for column in schedule[1] for _, _, angles in column]
+
+
+def _compile_payload(data, plans):
+    """
+    Форма схемы и углы её гейтов. Для payload'ов API разбор формы кэшируется в plans
+    по actualHistoryMap и названиям гейтов: у машин одного графа форма общая,
+    и для каждой машины остаётся только достать углы по заранее найденным индексам.
+    """
+    if "actualHistoryMap" not in data:
+        schedule = circuit_schedule(data)
+        return schedule_signature(schedule), _schedule_angles(schedule)
+
+    history = data["actualHistoryMap"]
+    elements = data["elementsObject"]
+    key = tuple(tuple(line) for line in history)
+    titles = tuple(elements[gate_id]["title"] if gate_id in elements else None
+                   for line in key for gate_id in line)
+
+    plan = plans.get((key, titles))
+    if plan is None:
+        schedule = circuit_schedule(data)
+        gate_ids = [[] for _ in schedule[1]]
+        for qubit, line in enumerate(history):
+            for column, gate_id in enumerate(line):
+                if gate_id in elements:
+                    gate_ids[column].append(gate_id)
+        gate_paths = [(gate_id, _angle_paths(elements[gate_id].get("params") or []))
+                      for column in gate_ids for gate_id in column]
+        plan = (schedule_signature(schedule), gate_paths)
+        plans[(key, titles)] = plan
+
+    signature, gate_paths = plan
+    angles = []
+    for gate_id, paths in gate_paths:
+        params = elements[gate_id].get("params")
+        angles.append([float(params[i]["value"][j]["types"][k]["data"]) for i, j, k in paths])
+    return signature, angles
+
+
+def _gate_angles(angle_lists):
+    """Углы гейтов пакета схем одной формы: по массиву (машины, число углов) на гейт"""
+    return [np.array(angles, dtype=np.float64).reshape(len(angle_lists), -1) for angles in zip(*angle_lists)]
+
+
+def simulate_statevector(data):
+    """Вектор состояния схемы после всех гейтов (до измерения) и измеряемые кубиты"""
+    schedule = circuit_schedule(data)
+    n_qubits, _, measured = schedule
+    state = simulate_statevectors(schedule_signature(schedule), _gate_angles([_schedule_angles(schedule)]), 1)[0]
+    return state, n_qubits, measured
+
+
+def measurement_probabilities(state, n_qubits, measured):
+    """
+    Вероятности исходов по измеряемым кубитам: индекс исхода i, бит k = кубит measured[k].
+    state - вектор (2^n) или пакет (машины, 2^n).
+    """
+    probabilities = np.abs(state) ** 2
+    if list(measured) == list(range(n_qubits)):
+        return probabilities
+
+    indices = np.arange(1 << n_qubits)
+    outcomes = np.zeros_like(indices)
+    for k, qubit in enumerate(measured):
+        outcomes |= ((indices >> qubit) & 1) << k
+    # Маргинализация по неизмеряемым кубитам - умножение на матрицу индикаторов исходов
+    indicator = np.zeros((1 << n_qubits, 1 << len(measured)))
+    indicator[indices, outcomes] = 1
+    return probabilities @ indicator
+
+
+def _bitstrings(n_bits):
+    return [format(outcome, f'0{n_bits}b') for outcome in range(1 << n_bits)]
+
+
+def sample_counts(probabilities, shots, n_bits, rng):
+    """Мультиномиальная выборка shots измерений -> {битовая строка: количество}"""
+    return sample_counts_batch(probabilities[None, :], [shots], n_bits, rng)[0]
+
+
+def sample_counts_batch(probabilities, shots, n_bits, rng):
+    """Пакетная мультиномиальная выборка: probabilities (машины, 2^m), shots - по машине"""
+    probabilities = np.clip(probabilities, 0, None)
+    probabilities = probabilities / probabilities.sum(axis=1, keepdims=True)
+    counts = rng.multinomial(np.asarray(shots, dtype=np.int64), probabilities)
+
+    labels = _bitstrings(n_bits)
+    histograms = []
+    for row in counts:
+        outcomes = np.flatnonzero(row)
+        histograms.append(dict(zip([labels[outcome] for outcome in outcomes], row[outcomes].tolist())))
+    return histograms
+
+
+def simulate_payload(data, shots=None, rng=None):
+    """Гистограмма измерений для payload: {битовая строка: количество}"""
+    return simulate_payloads([data], None if shots is None else [shots], rng)[0]
+
+
+def simulate_payloads(payloads, shots=None, rng=None, max_amplitudes=DEFAULT_MAX_AMPLITUDES):
+    """
+    Гистограммы измерений для списка payload'ов (в том же порядке).
+    Схемы группируются по форме, каждая группа моделируется пакетами
+    не больше max_amplitudes амплитуд. shots - по payload'у (по умолчанию launch).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if shots is None:
+        shots = [int(data.get("launch", 1024)) for data in payloads]
+
+    groups = {}
+    plans = {}
+    payload_angles = []
+    for idx, data in enumerate(payloads):
+        signature, angles = _compile_payload(data, plans)
+        payload_angles.append(angles)
+        groups.setdefault(signature, []).append(idx)
+
+    histograms = [None] * len(payloads)
+    for signature, indices in groups.items():
+        n_qubits, _, measured = signature
+        measured = list(measured) or list(range(n_qubits))
+        chunk_size = max(1, max_amplitudes >> n_qubits)
+
+        for chunk_start in range(0, len(indices), chunk_size):
+            chunk = indices[chunk_start:chunk_start + chunk_size]
+            states = simulate_statevectors(signature, _gate_angles([payload_angles[idx] for idx in chunk]), len(chunk))
+            probabilities = measurement_probabilities(states, n_qubits, measured)
+            chunk_counts = sample_counts_batch(probabilities, [shots[idx] for idx in chunk], len(measured), rng)
+            for idx, counts in zip(chunk, chunk_counts):
+                histograms[idx] = counts
+
+    return histograms
+
+
+def counts_to_result(counts):
+    """Формат Result_*.json, как его сохраняет app.js"""
+    return {"data": [{"bitstring": bitstring, "value": value} for bitstring, value in sorted(counts.items())]}
+
+
+def result_filename(graph_folder, payload_file):
+    """Result_graph_k_car_j.json - то же имя, что даёт app.js generateResultFilename"""
+    graph_match = re.match(r'graph_(\d+)', graph_folder)
+    car_match = re.search(r'_car_(\d+)\.json(\.gz)?$', payload_file)
+    stem = re.sub(r'\.json(\.gz)?$', '', payload_file)
+    if not graph_match:
+        return f"Result_{stem}.json"
+    if car_match:
+        return f"Result_graph_{graph_match.group(1)}_car_{car_match.group(1)}.json"
+    return f"Result_graph_{graph_match.group(1)}_{stem}.json"
+
+
+def write_result(path, counts):
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(counts_to_result(counts), f, indent=2)
+    os.replace(tmp_file, path)
+
+
+def _graph_number(folder):
+    match = re.match(r'graph_(\d+)$', os.path.basename(folder))
+    return int(match.group(1)) if match else -1
+
+
+def run_local_simulation(input_dir="input", results_dir="results", seed=None, overwrite=False, graphs=None,
+                         max_amplitudes=DEFAULT_MAX_AMPLITUDES):
+    """
+    Моделирует все payload'ы из input/graph_k и пишет результаты в results/graph_k.
+    Уже существующие результаты не пересчитываются (overwrite=True - пересчитать).
+    graphs - номера папок graph_k для обработки (по умолчанию все).
+    max_amplitudes - ограничение размера пакета состояний (машины x 2^q).
+    Возвращает количество смоделированных схем.
+    """
+    rng = np.random.default_rng(seed)
+    graph_folders = sorted(
+        (folder for folder in glob.glob(os.path.join(input_dir, "graph_*")) if os.path.isdir(folder)),
+        key=_graph_number
+    )
+    if graphs is not None:
+        graphs = set(graphs)
+        graph_folders = [folder for folder in graph_folders if _graph_number(folder) in graphs]
+
+    simulated = 0
+    for folder in graph_folders:
+        graph_folder = os.path.basename(folder)
+        graph_results_dir = os.path.join(results_dir, graph_folder)
+        os.makedirs(graph_results_dir, exist_ok=True)
+
+        payload_files = sorted(name for name in os.listdir(folder) if is_payload_file(name))
+        pending = []
+        payloads = []
+        for payload_file in payload_files:
+            output_path = os.path.join(graph_results_dir, result_filename(graph_folder, payload_file))
+            if not overwrite and os.path.exists(output_path):
+                continue
+            try:
+                payloads.append(read_payload(os.path.join(folder, payload_file)))
+                pending.append(output_path)
+            except Exception as e:
+                print(f"✗ [{graph_folder}] Ошибка чтения {payload_file}: {e}")
+
+        if not payloads:
+            continue
+
+        # Все машины графа моделируются одним пакетным проходом
+        try:
+            histograms = simulate_payloads(payloads, rng=rng, max_amplitudes=max_amplitudes)
+        except Exception as e:
+            print(f"✗ [{graph_folder}] Ошибка моделирования: {e}")
+            continue
+
+        for output_path, counts in zip(pending, histograms):
+            write_result(output_path, counts)
+
+        print(f"✓ [{graph_folder}] Смоделировано схем: {len(histograms)}")
+        simulated += len(histograms)
+
+    print(f"Локальное моделирование завершено: {simulated} схем")
+    return simulated
+
+
+if __name__ == "__main__":
+    run_local_simulation()
@@ -1,15 +1,22 @@
 import json
 import numpy as np
 import math
-from collections import defaultdict
 import os
 import glob
 import time
 import traceback
+from conflict_index import ConflictIndex
+from graph_core import TrafficGraph
+from graph_store import GraphStore, GRAPH_STORE_FILE
+from histograms import GraphHistograms
+from result_watcher import ResultWatcher
+from scheduler import POSTPROCESS_WORKERS, lpt_order, postprocess_cost, run_lpt_pool
 
 
 CHECK_INTERVAL = 5  # СЕКУНД
 FORCE_REPROCESS = False
+# Сколько самых частых исходов машины пробуется на шаге до обхода соседей (1 - только лучший)
+DECODE_CANDIDATES = int(os.environ.get("QUANT_DECODE_CANDIDATES", "1"))
 
 
 class BinaryQAOAPostProcessor:
@@ -20,6 +27,7 @@ class BinaryQAOAPostProcessor:
         self.n_nodes = n_nodes
         self.n_qubits_per_node = n_qubits_per_node
         self.total_qubits = n_qubits_per_node
+        self.graph = TrafficGraph.from_matrix(graph_matrix)
         
     def binary_to_node(self, bitstring):
         """Преобразует бинарную строку в номер вершины"""
@@ -33,42 +41,26 @@ class BinaryQAOAPostProcessor:
             
         return node_id
     
-    def compute_marginals_from_counts(self, counts, n_qubits):
-        """Вычисляет маргинальные вероятности P(x_i=1) из гистограммы"""
-        total = sum(counts.values())
-        marginals = np.zeros(n_qubits, dtype=float)
-        
-        if total == 0:
-            return marginals
-            
-        for bitstring, cnt in counts.items():
-            bits = [int(bit) for bit in bitstring[::-1]]
-            
-            for i in range(min(len(bits), n_qubits)):
-                marginals[i] += cnt * bits[i]
-                
-        return marginals / float(total)
-    
-    def find_best_path_binary(self, counts, start_node, end_node, current_traffic):
+    def decode_candidates(self, histograms, n_candidates=DECODE_CANDIDATES):
+        """
+        Вершины-кандидаты каждой машины по убыванию частоты исхода (первый из равных - раньше),
+        без повторов. Гистограммы между шагами не меняются, поэтому декодирование делается один раз.
+        """
+        nodes = histograms.to_nodes(histograms.top_k(n_candidates), self.n_nodes)
+        candidates = []
+        for row in nodes.tolist():
+            ranked = []
+            for node in row:
+                if node >= 0 and node not in ranked:
+                    ranked.append(node)
+            candidates.append(ranked)
+        return candidates
+    
+    def find_best_path_binary(self, selected_node, start_node, end_node, current_traffic):
         """Находит лучший путь на основе бинарного кодирования"""
-        if not counts:
-            return start_node, 0.0
-            
-        marginals = self.compute_marginals_from_counts(counts, self.total_qubits)
-        
-        best_bitstring = None
-        max_count = -1
-        
-        for bitstring, count in counts.items():
-            if count > max_count:
-                max_count = count
-                best_bitstring = bitstring
-        
-        if best_bitstring is None:
+        if selected_node < 0:
             return start_node, 0.0
             
-        selected_node = self.binary_to_node(best_bitstring)
-        
         if start_node < self.n_nodes and selected_node < self.n_nodes:
             if self.J[start_node, selected_node] != np.inf:
                 cost = abs(self.J[start_node, selected_node])
@@ -81,14 +73,18 @@ class BinaryQAOAPostProcessor:
             
         return selected_node, total_cost
     
-    def greedy_path_construction(self, counts_list, routes, traffic_matrix, max_path_length=10):
+    def greedy_path_construction(self, histograms, routes, traffic_matrix, max_path_length=10,
+                                 n_candidates=DECODE_CANDIDATES):
         """Строит пути жадным алгоритмом на основе квантовых результатов"""
         paths = []
         total_costs = []
         current_traffic = traffic_matrix.copy()
+        car_candidates = self.decode_candidates(histograms, n_candidates)
+        # Списки соседей вершин, уже понадобившихся при обходе
+        adjacency = {}
         
         for car_idx, (start, end) in enumerate(routes):
-            if car_idx >= len(counts_list):
+            if car_idx >= len(car_candidates):
                 path = [start, end]
                 paths.append(path)
                 total_costs.append(0.0)
@@ -96,20 +92,26 @@ class BinaryQAOAPostProcessor:
                 
             current_node = start
             path = [start]
+            visited = {start}
             path_cost = 0.0
             
             for step in range(max_path_length):
                 if current_node == end:
                     break
-                    
-                counts = counts_list[car_idx]
-                next_node, step_cost = self.find_best_path_binary(counts, current_node, end, current_traffic)
                 
-                if (next_node not in path and 
-                    current_node < self.n_nodes and next_node < self.n_nodes and
-                    self.J[current_node, next_node] != np.inf):
+                next_node = None
+                for candidate in car_candidates[car_idx]:
+                    if (candidate not in visited and
+                        current_node < self.n_nodes and candidate < self.n_nodes and
+                        self.graph.has_edge(current_node, candidate)):
+                        next_node = candidate
+                        break
+                
+                if next_node is not None:
+                    _, step_cost = self.find_best_path_binary(next_node, current_node, end, current_traffic)
                     
                     path.append(next_node)
+                    visited.add(next_node)
                     path_cost += step_cost
                     
                     current_traffic[current_node, next_node] += 1
@@ -118,13 +120,16 @@ class BinaryQAOAPostProcessor:
                     current_node = next_node
                 else:
                     found_alternative = False
-                    for node in range(self.n_nodes):
-                        if (node not in path and 
-                            current_node < self.n_nodes and node < self.n_nodes and
-                            self.J[current_node, node] != np.inf):
+                    if current_node < self.n_nodes and current_node not in adjacency:
+                        adjacency[current_node] = self.graph.neighbor_list(current_node)
+                    neighbors = adjacency.get(current_node, [])
+                    # Соседи из CSR идут по возрастанию номера, как в прежнем обходе всех вершин
+                    for node, weight in neighbors:
+                        if node not in visited:
                             
                             path.append(node)
-                            cost = abs(self.J[current_node, node])
+                            visited.add(node)
+                            cost = abs(weight)
                             path_cost += cost
                             current_traffic[current_node, node] += 1
                             current_traffic[node, current_node] += 1
@@ -143,10 +148,13 @@ class BinaryQAOAPostProcessor:
             
         return paths, total_costs, current_traffic
     
-    def conflict_repair(self, paths, traffic_matrix, capacity_matrix, lam_conflict=3.0):
-        """Устраняет конфликты в путях"""
+    def conflict_repair(self, paths, traffic_matrix, capacity_matrix, lam_conflict=3.0, n_alternatives=3):
+        """
+        Устраняет конфликты в путях. Альтернатива пути - удаление одной промежуточной вершины;
+        оценивается по изменённым рёбрам и счётчику конфликтов, без пересчёта всего пути.
+        """
         repaired_paths = paths.copy()
-        conf_adj = self.build_conflict_adjacency(paths, capacity_matrix)
+        conflict_index = self.build_conflict_index(paths, capacity_matrix)
         
         improved = True
         iterations = 0
@@ -155,51 +163,50 @@ class BinaryQAOAPostProcessor:
             improved = False
             iterations += 1
             
-            conflict_pairs = self.find_conflict_pairs(conf_adj, repaired_paths)
+            conflict_pair = conflict_index.first_pair()
             
-            if not conflict_pairs:
+            if conflict_pair is None:
                 break
                 
-            ti, tj = conflict_pairs[0]
+            ti, tj = conflict_pair
+            # (улучшение, номер пути, позиция удаляемой вершины; None - путь без изменений)
             best_improvement = (float('inf'), None, None)
             
-            for alt_path in self.generate_alternative_paths(repaired_paths[ti], capacity_matrix):
-                improvement = self.evaluate_path_change(repaired_paths, ti, alt_path, conf_adj, lam_conflict)
-                if improvement < best_improvement[0]:
-                    best_improvement = (improvement, ti, alt_path)
-            
-            for alt_path in self.generate_alternative_paths(repaired_paths[tj], capacity_matrix):
-                improvement = self.evaluate_path_change(repaired_paths, tj, alt_path, conf_adj, lam_conflict)
-                if improvement < best_improvement[0]:
-                    best_improvement = (improvement, tj, alt_path)
+            for idx in (ti, tj):
+                path = repaired_paths[idx]
+                old_conflicts = conflict_index.conflicts(idx, path)
+                
+                # Путь без изменений: стоимость и конфликты те же
+                if 0.0 < best_improvement[0]:
+                    best_improvement = (0.0, idx, None)
+                
+                for pos in self.generate_alternative_paths(path, capacity_matrix, n_alternatives):
+                    improvement = self.evaluate_path_change(path, pos, old_conflicts, lam_conflict)
+                    if improvement < best_improvement[0]:
+                        best_improvement = (improvement, idx, pos)
             
             if best_improvement[1] is not None:
-                repaired_paths[best_improvement[1]] = best_improvement[2]
+                if best_improvement[2] is None:
+                    # Лучше оставить путь как есть: состояние не изменилось, и следующие
+                    # итерации выбрали бы ту же пару с тем же итогом
+                    break
+                idx, pos = best_improvement[1], best_improvement[2]
+                new_path = repaired_paths[idx][:pos] + repaired_paths[idx][pos + 1:]
+                repaired_paths[idx] = new_path
+                conflict_index.replace(idx, new_path)
                 improved = True
                 
         return repaired_paths
     
-    def build_conflict_adjacency(self, paths, capacity_matrix):
-        """Строит граф конфликтов между путями"""
-        conf_adj = defaultdict(set)
+    def build_conflict_index(self, paths, capacity_matrix):
+        """Строит индекс конфликтов между путями (общие рёбра с пропускной способностью <= 1)"""
+        def conflict_edges(path):
+            return {
+                (u, v) for u, v in self.get_path_edges(path)
+                if u < capacity_matrix.shape[0] and v < capacity_matrix.shape[1] and capacity_matrix[u, v] <= 1
+            }
         
-        for i, path_i in enumerate(paths):
-            edges_i = self.get_path_edges(path_i)
-            for j, path_j in enumerate(paths):
-                if i == j:
-                    continue
-                    
-                edges_j = self.get_path_edges(path_j)
-                common_edges = edges_i.intersection(edges_j)
-                
-                for edge in common_edges:
-                    u, v = edge
-                    if (u < capacity_matrix.shape[0] and v < capacity_matrix.shape[1] and
-                        capacity_matrix[u, v] <= 1):
-                        conf_adj[(i, tuple(path_i))].add((j, tuple(path_j)))
-                        conf_adj[(j, tuple(path_j))].add((i, tuple(path_i)))
-                        
-        return conf_adj
+        return ConflictIndex(paths, conflict_edges)
     
     def get_path_edges(self, path):
         """Возвращает множество ребер пути"""
@@ -209,77 +216,68 @@ class BinaryQAOAPostProcessor:
             edges.add((min(u, v), max(u, v)))
         return edges
     
-    def find_conflict_pairs(self, conf_adj, paths):
-        """Находит пары конфликтующих путей"""
-        conflicts = []
-        path_tuples = [tuple(path) for path in paths]
-        
-        for i, path_i in enumerate(path_tuples):
-            for j, path_j in enumerate(path_tuples):
-                if i < j and (j, path_j) in conf_adj.get((i, path_i), set()):
-                    conflicts.append((i, j))
-                    
-        return conflicts
-    
     def generate_alternative_paths(self, path, capacity_matrix, n_alternatives=3):
-        """Генерирует альтернативные пути"""
-        alternatives = [path]
+        """
+        Альтернативы пути: позиции промежуточных вершин, без которых путь остаётся валидным
+        (сам путь считается первой альтернативой, всего не больше n_alternatives).
+        Валидность проверяется по трём затронутым рёбрам и числу невалидных рёбер пути.
+        """
+        positions = []
         
         if len(path) <= 2:
-            return alternatives
+            return positions
+        
+        invalid_edges = sum(not self.is_valid_edge(path[i], path[i + 1], capacity_matrix)
+                            for i in range(len(path) - 1))
             
         for i in range(1, len(path) - 1):
-            new_path = path[:i] + path[i+1:]
-            if self.is_valid_path(new_path, capacity_matrix):
-                alternatives.append(new_path)
+            prev_node, node, next_node = path[i - 1], path[i], path[i + 1]
+            remaining_invalid = (invalid_edges
+                                 - (not self.is_valid_edge(prev_node, node, capacity_matrix))
+                                 - (not self.is_valid_edge(node, next_node, capacity_matrix))
+                                 + (not self.is_valid_edge(prev_node, next_node, capacity_matrix)))
+            if remaining_invalid == 0:
+                positions.append(i)
                 
-            if len(alternatives) >= n_alternatives:
+            if len(positions) + 1 >= n_alternatives:
                 break
                 
-        return alternatives
+        return positions
+    
+    def is_valid_edge(self, u, v, capacity_matrix):
+        return u < capacity_matrix.shape[0] and v < capacity_matrix.shape[1] and capacity_matrix[u, v] != 0
     
     def is_valid_path(self, path, capacity_matrix):
         """Проверяет валидность пути"""
         for i in range(len(path) - 1):
-            u, v = path[i], path[i + 1]
-            if (u >= capacity_matrix.shape[0] or v >= capacity_matrix.shape[1] or
-                capacity_matrix[u, v] == 0):
+            if not self.is_valid_edge(path[i], path[i + 1], capacity_matrix):
                 return False
         return True
     
-    def evaluate_path_change(self, paths, changed_idx, new_path, conf_adj, lam_conflict):
-        """Оценивает улучшение при изменении пути"""
-        old_conflicts = 0
-        new_conflicts = 0
-        
-        for j, path_j in enumerate(paths):
-            if j == changed_idx:
-                continue
-            if (j, tuple(paths[j])) in conf_adj.get((changed_idx, tuple(paths[changed_idx])), set()):
-                old_conflicts += 1
-        
-        for j, path_j in enumerate(paths):
-            if j == changed_idx:
-                continue
-            if (j, tuple(paths[j])) in conf_adj.get((changed_idx, tuple(new_path)), set()):
-                new_conflicts += 1
-                
-        old_cost = self.calculate_path_cost(paths[changed_idx])
-        new_cost = self.calculate_path_cost(new_path)
-        
-        cost_change = new_cost - old_cost
-        conflict_change = new_conflicts - old_conflicts
+    def evaluate_path_change(self, path, pos, old_conflicts, lam_conflict):
+        """
+        Оценивает улучшение при удалении вершины path[pos] по затронутым рёбрам:
+        (u, w) и (w, v) заменяются на (u, v). Конфликты считаются по исходным путям,
+        поэтому у изменённого пути их нет, а old_conflicts - счётчик из ConflictIndex.
+        """
+        cost_change = (self.edge_cost(path[pos - 1], path[pos + 1])
+                       - self.edge_cost(path[pos - 1], path[pos])
+                       - self.edge_cost(path[pos], path[pos + 1]))
+        conflict_change = 0 - old_conflicts
         
         return cost_change + lam_conflict * conflict_change
     
+    def edge_cost(self, u, v):
+        """Стоимость перехода u -> v (0 для отсутствующего ребра, как в calculate_path_cost)"""
+        if u < self.J.shape[0] and v < self.J.shape[1] and self.J[u, v] != np.inf:
+            return abs(self.J[u, v])
+        return 0.0
+    
     def calculate_path_cost(self, path):
         """Вычисляет стоимость пути"""
         cost = 0.0
         for i in range(len(path) - 1):
-            u, v = path[i], path[i + 1]
-            if (u < self.J.shape[0] and v < self.J.shape[1] and 
-                self.J[u, v] != np.inf):
-                cost += abs(self.J[u, v])
+            cost += self.edge_cost(path[i], path[i + 1])
         return cost
 
     def calculate_total_time(self, paths):
@@ -290,41 +288,31 @@ class BinaryQAOAPostProcessor:
         return total_time
 
 
-def load_quantum_results_for_graph(graph_idx, results_folder="results"):
-    """Загружает результаты только для одного графа"""
+def load_quantum_results_for_graph(graph_idx, results_folder="results", n_qubits=0):
+    """Загружает результаты только для одного графа (GraphHistograms, None - результатов нет)"""
     
     graph_folder = os.path.join(results_folder, f"graph_{graph_idx}")
     
     if not os.path.exists(graph_folder):
         print(f"  ПРЕДУПРЕЖДЕНИЕ: Папка {graph_folder} не найдена")
-        return []
+        return None
     
     # ИСПРАВЛЕНО: Используем тот же паттерн что и в оригинале
     result_files = glob.glob(os.path.join(graph_folder, "Result_*.json"))
     
     if not result_files:
         print(f"  ПРЕДУПРЕЖДЕНИЕ: Файлы для графа {graph_idx} не найдены")
-        return []
+        return None
     
     # ИСПРАВЛЕНО: Точно такая же сортировка как в оригинале
     result_files.sort(key=lambda x: int(os.path.basename(x).split("_car_")[1].split(".")[0]))
     
     print(f"  ✓ Найдено {len(result_files)} файлов результатов для графа {graph_idx}")
     
-    graph_results = []
-    for file_path in result_files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            counts = {}
-            for item in data['data']:
-                counts[item['bitstring']] = item['value']
-            graph_results.append(counts)
-        except Exception as e:
-            print(f"  ✗ Ошибка загрузки {os.path.basename(file_path)}: {e}")
-            graph_results.append({})
-    
-    return graph_results
+    def report_error(file_path, e):
+        print(f"  ✗ Ошибка загрузки {os.path.basename(file_path)}: {e}")
+    
+    return GraphHistograms.from_result_files(result_files, n_qubits, on_error=report_error)
 
 
 def print_detailed_paths(graph_idx, routes, initial_paths, repaired_paths, costs, total_time, graph):
@@ -364,15 +352,15 @@ def post_process_single_graph(graph_idx, graph, routes, results_folder="results"
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    quantum_counts = load_quantum_results_for_graph(graph_idx, results_folder)
+    n_nodes = len(graph)
+    n_qubits_per_node = math.ceil(math.log2(n_nodes)) if n_nodes > 0 else 0
+    
+    quantum_counts = load_quantum_results_for_graph(graph_idx, results_folder, n_qubits_per_node)
     
     if not quantum_counts:
         print(f"  ✗ Нет квантовых результатов для графа {graph_idx}")
         return None
     
-    n_nodes = len(graph)
-    n_qubits_per_node = math.ceil(math.log2(n_nodes)) if n_nodes > 0 else 0
-    
     print(f"\n{'#'*80}")
     print(f"ОБРАБОТКА ГРАФА {graph_idx}")
     print(f"Количество вершин: {n_nodes}, Кубитов на вершину: {n_qubits_per_node}")
@@ -437,130 +425,111 @@ def load_routes_from_file(filename):
         return routes
 
 
-def check_graph_has_all_results(graph_idx, routes, results_folder):
-    """Проверяет, что для графа есть результаты для всех машин"""
-    graph_folder = os.path.join(results_folder, f"graph_{graph_idx}")
-    
-    if not os.path.exists(graph_folder):
-        return False
-    
-    result_files = glob.glob(os.path.join(graph_folder, "Result_*.json"))
-    
-    expected_count = len(routes)
-    actual_count = len(result_files)
-    
-    if actual_count < expected_count:
-        return False
-    
-    return True
-
-
-def background_postprocessor(graph_file, routes_file, results_folder, output_dir, force_reprocess=False):
+def background_postprocessor(store_file, results_folder, output_dir, force_reprocess=False,
+                             workers=POSTPROCESS_WORKERS):
     """
     Фоновый цикл с обработкой ошибок, ждущий появления новых данных и выполняющий постобработку.
+    О пришедших результатах сообщает ResultWatcher (inotify или опрос): граф запускается,
+    как только записан результат его последней машины.
+    Готовые графы обрабатываются от самых дорогих к дешёвым (LPT) в пуле из workers процессов.
     """
     
     print("="*80)
     print("ЗАПУСК ФОНОВОГО ПОСТПРОЦЕССОРА")
     print("="*80)
-    print(f"Файл графов: {graph_file}")
-    print(f"Файл маршрутов: {routes_file}")
+    print(f"Хранилище графов: {store_file}")
     print(f"Папка с результатами: {results_folder}")
     print(f"Папка для сохранения: {output_dir}")
     print(f"Интервал проверки: {CHECK_INTERVAL} сек")
     print(f"Переобработка: {'ДА' if force_reprocess else 'НЕТ'}")
+    print(f"Процессов постобработки: {workers}")
     print("="*80)
     
     try:
-        print("\nЗагрузка графов...")
-        graphs = load_graphs_from_file(graph_file)
-        print(f"✓ Загружено графов: {len(graphs)}")
+        print("\nОткрытие хранилища графов...")
+        store = GraphStore(store_file)
+        # Маршруты нужны сразу для подсчёта ожидаемых результатов,
+        # матрицы читаются из хранилища только при постобработке графа
+        all_routes = [store.route_list(k) for k in range(len(store))]
+        print(f"✓ Графов в хранилище: {len(store)}")
     except Exception as e:
-        print(f"✗ КРИТИЧЕСКАЯ ОШИБКА при загрузке графов: {e}")
+        print(f"✗ КРИТИЧЕСКАЯ ОШИБКА при открытии хранилища графов: {e}")
         traceback.print_exc()
         return
     
     try:
-        print("Загрузка маршрутов...")
-        all_routes = load_routes_from_file(routes_file)
-        print(f"✓ Загружено наборов маршрутов: {len(all_routes)}")
+        watcher = ResultWatcher(results_folder,
+                                {k: len(routes) for k, routes in enumerate(all_routes)},
+                                poll_interval=CHECK_INTERVAL)
+        print(f"✓ Отслеживание результатов: {watcher.backend}")
     except Exception as e:
-        print(f"✗ КРИТИЧЕСКАЯ ОШИБКА при загрузке маршрутов: {e}")
+        print(f"✗ КРИТИЧЕСКАЯ ОШИБКА при запуске отслеживания результатов: {e}")
         traceback.print_exc()
         return
     
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    # Уже обработанные графы читаются с диска один раз, дальше учитываются в памяти
+    processed_graphs = set()
+    if not force_reprocess:
+        for pf in glob.glob(os.path.join(output_dir, "post_processed_routes_graph_*.json")):
+            try:
+                processed_graphs.add(int(os.path.basename(pf).split("_")[-1].split(".")[0]))
+            except Exception:
+                continue
+    # Графы, постобработка которых не удалась, повторяются не чаще раза в CHECK_INTERVAL
+    failed_graphs = set()
+    
     print("\nВхожу в цикл мониторинга...\n")
     
     while True:
         try:
-            existing_graphs = set()
-            
-            if os.path.exists(results_folder):
-                graph_folders = glob.glob(os.path.join(results_folder, "graph_*"))
-                
-                for graph_folder in graph_folders:
-                    try:
-                        graph_name = os.path.basename(graph_folder)
-                        graph_index = int(graph_name.split("_")[1])
-                        
-                        if graph_index < len(all_routes):
-                            if check_graph_has_all_results(graph_index, all_routes[graph_index], results_folder):
-                                existing_graphs.add(graph_index)
-                    except Exception:
-                        continue
-            
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
+            ready_graphs = watcher.wait(CHECK_INTERVAL)
             if force_reprocess:
-                processed_graphs = set()
-            else:
-                processed_files = glob.glob(os.path.join(output_dir, "post_processed_routes_graph_*.json"))
-                processed_graphs = set()
-                for pf in processed_files:
-                    try:
-                        idx = int(os.path.basename(pf).split("_")[-1].split(".")[0])
-                        processed_graphs.add(idx)
-                    except Exception:
-                        continue
+                # Переобработка: каждый готовый граф пересчитывается при каждом изменении его результатов
+                processed_graphs -= ready_graphs
             
-            new_graphs = existing_graphs - processed_graphs
+            new_graphs = (ready_graphs | failed_graphs) - processed_graphs
             
             if new_graphs:
                 print(f"\n{'='*80}")
                 print(f"✓ {'Переобработка' if force_reprocess else 'Найдены новые'} графы: {sorted(new_graphs)}")
                 print(f"{'='*80}")
                 
-                for idx in sorted(new_graphs):
-                    try:
-                        if idx >= len(graphs) or idx >= len(all_routes):
-                            continue
-                        
-                        print(f"\n>>> Запускаю постобработку графа {idx}")
-                        
-                        result = post_process_single_graph(
-                            idx, 
-                            graphs[idx], 
-                            all_routes[idx],
-                            results_folder=results_folder, 
-                            output_dir=output_dir
-                        )
-                        
-                        if result:
-                            print(f"✓ Граф {idx} успешно обработан")
-                        else:
-                            print(f"✗ Граф {idx} - обработка вернула None")
-                            
-                    except Exception as exc:
-                        print(f"✗ ОШИБКА при обработке графа {idx}: {exc}")
-                        traceback.print_exc()
+                tasks = {}
+                costs = {}
+                for idx in new_graphs:
+                    if idx >= len(store):
+                        continue
+                    matrix = store.matrix(idx)
+                    tasks[idx] = (idx, matrix, all_routes[idx], results_folder, output_dir)
+                    costs[idx] = postprocess_cost(len(all_routes[idx]), len(matrix))
+                
+                print(f">>> Порядок постобработки (LPT): {lpt_order(costs)}")
+                results = run_lpt_pool(tasks, costs, post_process_single_graph, workers)
+                
+                failed_graphs = set()
+                for idx in lpt_order(costs):
+                    result = results.get(idx)
+                    if isinstance(result, Exception):
+                        print(f"✗ ОШИБКА при обработке графа {idx}: {result}")
+                        failed_graphs.add(idx)
+                    elif result:
+                        print(f"✓ Граф {idx} успешно обработан")
+                        processed_graphs.add(idx)
+                    else:
+                        print(f"✗ Граф {idx} - обработка вернула None")
+                        failed_graphs.add(idx)
+                if failed_graphs:
+                    # Повтор - после паузы, а не сразу на следующей итерации
+                    time.sleep(CHECK_INTERVAL)
             else:
                 print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Нет новых данных. Ожидание...")
             
-            time.sleep(CHECK_INTERVAL)
-            
         except KeyboardInterrupt:
             print("\n\n✓ Получен сигнал прерывания. Завершение работы...")
+            watcher.close()
             break
             
         except Exception as main_exc:
@@ -570,9 +539,8 @@ def background_postprocessor(graph_file, routes_file, results_folder, output_dir
 
 
 if __name__ == "__main__":
-    graph_file = r"G_set1.txt"
-    routes_file = r"routes1.txt"
+    store_file = GRAPH_STORE_FILE
     results_folder = "results"
     output_dir = "post_processed_results"
     
-    background_postprocessor(graph_file, routes_file, results_folder, output_dir, force_reprocess=FORCE_REPROCESS)
+    background_postprocessor(store_file, results_folder, output_dir, force_reprocess=FORCE_REPROCESS)
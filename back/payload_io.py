@@ -0,0 +1,288 @@
+import copy
+import gzip
+import json
+import os
+import re
+import zlib
+
+
+# Сериализация api_payload_car_*.json.
+#
+# Форматы:
+#   pretty  - json.dump с indent=2 (исходный формат, ~170 КБ на машину);
+#   compact - тот же JSON без отступов и пробелов;
+#   shared  - компактный JSON, в котором структуры params вынесены в общие
+#             шаблоны "paramTemplates", а у гейта остаются ссылка на шаблон
+#             и числовые углы: {"template": "t0", "angles": [0.42]}.
+# Любой формат можно сжать gzip (файл .json.gz). read_payload и app.js
+# восстанавливают из shared исходный payload, который уходит в API.
+# Поле "contentHash" (см. result_cache) пишется первым, чтобы его можно было
+# прочитать по началу файла; в API оно не отправляется.
+
+PAYLOAD_FORMATS = ("pretty", "compact", "shared")
+SHARED_FORMAT_MARKER = "shared-params/1"
+API_FIELDS = ("elementsObject", "actualHistoryMap", "launch")
+
+_COMPACT_SEPARATORS = (',', ':')
+_GZIP_MAGIC = b'\x1f\x8b'
+_CONTENT_HASH_RE = re.compile(rb'"contentHash"\s*:\s*"([0-9a-f]+)"')
+
+
+def payload_filename(graph_dir, car_idx, compress=False):
+    """Путь к payload машины car_idx"""
+    suffix = ".json.gz" if compress else ".json"
+    return os.path.join(graph_dir, f"api_payload_car_{car_idx}{suffix}")
+
+
+def is_payload_file(filename):
+    return filename.endswith(".json") or filename.endswith(".json.gz")
+
+
+def iter_angle_types(params):
+    """Все элементы types с key == input-number (в них лежат числовые углы)"""
+    for param in params:
+        for value in param.get("value") or []:
+            for type_item in value.get("types") or []:
+                if type_item.get("key") == "input-number" and type_item.get("input") == "input":
+                    yield type_item
+
+
+class _ParamTemplates:
+    """Общие шаблоны params: одинаковые с точностью до углов структуры хранятся один раз"""
+
+    def __init__(self):
+        self.templates = {}
+        self._names = {}
+
+    def reference(self, params):
+        slots = list(iter_angle_types(params))
+        angles = [type_item["data"] for type_item in slots]
+
+        # Ключ шаблона - params с обнулёнными углами; углы временно подменяются на месте,
+        # чтобы не копировать структуру каждого гейта
+        for type_item in slots:
+            type_item["data"] = 0
+        try:
+            key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+            name = self._names.get(key)
+            if name is None:
+                name = f"t{len(self._names)}"
+                self._names[key] = name
+                self.templates[name] = copy.deepcopy(params)
+        finally:
+            for type_item, angle in zip(slots, angles):
+                type_item["data"] = angle
+        return {"template": name, "angles": angles}
+
+
+def iter_payload_chunks(payload, fmt="compact"):
+    """
+    Потоково сериализует payload по фрагментам (элемент за элементом),
+    не собирая ни итоговую строку, ни преобразованный словарь целиком.
+    """
+    if fmt not in PAYLOAD_FORMATS:
+        raise ValueError(f"Неизвестный формат payload: {fmt}")
+
+    content_hash = payload.get("contentHash")
+
+    if fmt == "pretty":
+        if content_hash is not None:
+            payload = {"contentHash": content_hash, **{key: payload[key] for key in API_FIELDS}}
+        yield from json.JSONEncoder(indent=2, ensure_ascii=False).iterencode(payload)
+        return
+
+    def dumps(obj):
+        return json.dumps(obj, separators=_COMPACT_SEPARATORS, ensure_ascii=False)
+
+    templates = _ParamTemplates() if fmt == "shared" else None
+
+    yield '{'
+    if content_hash is not None:
+        yield f'"contentHash":{dumps(content_hash)},'
+    if templates is not None:
+        yield f'"format":{dumps(SHARED_FORMAT_MARKER)},'
+
+    yield '"elementsObject":{'
+    for i, (gate_id, element) in enumerate(payload["elementsObject"].items()):
+        if templates is not None and element.get("params"):
+            element = {**element, "params": templates.reference(element["params"])}
+        yield f'{"," if i else ""}{dumps(gate_id)}:{dumps(element)}'
+    yield '},'
+
+    yield f'"actualHistoryMap":{dumps(payload["actualHistoryMap"])},'
+    yield f'"launch":{dumps(payload["launch"])}'
+
+    # Шаблоны известны только после обхода элементов, поэтому идут последним полем
+    if templates is not None:
+        yield f',"paramTemplates":{dumps(templates.templates)}'
+    yield '}'
+
+
+def write_payload(filename, payload, fmt="pretty", compress=None):
+    """
+    Записывает payload в файл. compress=None - сжимать, если имя оканчивается на .gz.
+    Запись идёт во временный файл, поэтому читатели не видят недописанный payload.
+    """
+    if compress is None:
+        compress = filename.endswith(".gz")
+
+    tmp_file = f"{filename}.tmp"
+    if compress:
+        # Уровень 6 - разумный баланс скорости и размера для повторяющихся шаблонов
+        f = gzip.open(tmp_file, 'wt', encoding='utf-8', compresslevel=6)
+    else:
+        f = open(tmp_file, 'w', encoding='utf-8')
+
+    with f:
+        for chunk in iter_payload_chunks(payload, fmt):
+            f.write(chunk)
+    os.replace(tmp_file, filename)
+
+
+def expand_payload(data):
+    """Восстанавливает исходный payload для API (из shared - с развёрнутыми params)"""
+    if data.get("format") != SHARED_FORMAT_MARKER:
+        return {key: data[key] for key in API_FIELDS}
+
+    templates = data.get("paramTemplates", {})
+    elements_object = {}
+    for gate_id, element in data["elementsObject"].items():
+        params = element.get("params")
+        if isinstance(params, dict) and "template" in params:
+            expanded = copy.deepcopy(templates[params["template"]])
+            for type_item, angle in zip(iter_angle_types(expanded), params["angles"]):
+                type_item["data"] = angle
+            element = {**element, "params": expanded}
+        elements_object[gate_id] = element
+
+    return {
+        "elementsObject": elements_object,
+        "actualHistoryMap": data["actualHistoryMap"],
+        "launch": data["launch"]
+    }
+
+
+def _read_bytes(filename):
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    if raw[:2] == _GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return raw
+
+
+def read_payload(filename):
+    """Читает payload любого формата (с gzip или без) в исходном виде для API"""
+    return expand_payload(json.loads(_read_bytes(filename).decode('utf-8')))
+
+
+def read_payload_with_hash(filename):
+    """Payload для API и его contentHash (None, если файл записан без хэша)"""
+    data = json.loads(_read_bytes(filename).decode('utf-8'))
+    return expand_payload(data), data.get("contentHash")
+
+
+def _read_head(filename, head_size=256):
+    """Начало файла payload (распакованное) и признак gzip; None - файла нет или он повреждён"""
+    try:
+        with open(filename, 'rb') as f:
+            head = f.read(2)
+            if head == _GZIP_MAGIC:
+                f.seek(0)
+                with gzip.GzipFile(fileobj=f) as gz:
+                    return gz.read(head_size), True
+            return head + f.read(head_size), False
+    except (OSError, EOFError):
+        return None
+
+
+def _head_format(head):
+    """Формат payload по началу файла (см. iter_payload_chunks)"""
+    if head.startswith(b'{\n'):
+        return "pretty"
+    if f'"format":"{SHARED_FORMAT_MARKER}"'.encode('ascii') in head:
+        return "shared"
+    return "compact"
+
+
+def read_content_hash(filename, head_size=256):
+    """contentHash по началу файла, без чтения и разбора всего payload"""
+    result = _read_head(filename, head_size)
+    if result is None:
+        return None
+    match = _CONTENT_HASH_RE.search(result[0])
+    return match.group(1).decode('ascii') if match else None
+
+
+def payload_is_current(filename, content_hash, fmt="pretty", compress=None):
+    """
+    Лежит ли в filename payload с тем же contentHash, записанный в формате fmt и с тем же
+    сжатием: contentHash покрывает только содержимое, а не представление на диске.
+    """
+    if compress is None:
+        compress = filename.endswith(".gz")
+    result = _read_head(filename)
+    if result is None:
+        return False
+    head, compressed = result
+    match = _CONTENT_HASH_RE.search(head)
+    return (match is not None and match.group(1).decode('ascii') == content_hash and
+            compressed == compress and _head_format(head) == fmt)
+
+
+def remove_other_variant(filename):
+    """
+    Удаляет тот же payload с другим расширением (.json <-> .json.gz), оставшийся после
+    смены сжатия: иначе обе копии попали бы в отправку.
+    """
+    other = filename[:-len(".gz")] if filename.endswith(".gz") else f"{filename}.gz"
+    if os.path.exists(other):
+        os.remove(other)
+        return True
+    return False
+
+
+def iter_wire_chunks(filename, compress=True, chunk_size=64 * 1024, launch=None):
+    """
+    Тело запроса к API: развёрнутый payload в компактном JSON, по кускам байт.
+    При compress=True куски сразу сжимаются gzip (заголовок Content-Encoding: gzip).
+    Сам payload читается и разворачивается целиком (read_payload), а сериализованное
+    и сжатое тело отдаётся кусками по мере готовности и целиком в памяти не собирается,
+    если получатель не склеивает куски (submitter.py отдаёт их aiohttp потоком).
+    launch - заменить число запусков (для адаптивных партий, см. adaptive_shots).
+    """
+    payload = read_payload(filename)
+    if launch is not None:
+        payload["launch"] = launch
+    compressor = _GzipStream() if compress else None
+    buffer = []
+    size = 0
+
+    for chunk in iter_payload_chunks(payload, "compact"):
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            block = compressor.compress(block) if compressor else block
+            if block:
+                yield block
+
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+class _GzipStream:
+    """Потоковый gzip-компрессор (zlib с заголовком gzip)"""
+
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
@@ -0,0 +1,277 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from local_simulator import result_filename, write_result
+from payload_io import is_payload_file, payload_is_current, read_payload, write_payload
+from result_cache import payload_content_hash
+
+
+# Упаковка схем нескольких машин в один запрос к API.
+#
+# Схема машины занимает ~7 кубитов, а payload допускает и более широкие схемы.
+# Схемы K машин графа кладутся на непересекающиеся регистры одного payload
+# (кубиты машины i идут после кубитов машин 0..i-1), пока суммарная ширина не
+# превысит бюджет кубитов. Регистры не связаны гейтами, поэтому совместное
+# распределение - произведение распределений машин, и маргинал по регистру машины
+# совпадает с результатом её отдельного запуска. Запросов становится в K раз меньше.
+#
+# input/graph_k/api_payload_car_j.json(.gz)  -> input_packed/graph_k/api_payload_pack_i_<хэш>.json(.gz)
+#                                               + packing_manifest.jsonl (какие машины где лежат)
+# app.js (QUANT_INPUT_DIR=input_packed, QUANT_RESULTS_DIR=results_packed)
+# results_packed/graph_k/Result_graph_k_api_payload_pack_i_<хэш>.json -> results/graph_k/Result_graph_k_car_j.json
+# В имени упаковки - начало её contentHash: изменившаяся упаковка получает новое имя,
+# поэтому журнал отправок не считает её уже отправленной, а старый результат
+# не может быть разложен по машинам новой упаковки.
+
+# Этап при запуске скриптом: all - упаковка и раскладка результатов, pack - только упаковка,
+# unpack - только раскладка (start_all.py упаковывает до запуска отправки)
+PACK_STAGE = os.environ.get("QUANT_PACK_STAGE", "all")
+
+PACKED_INPUT_DIR = "input_packed"
+PACKED_RESULTS_DIR = "results_packed"
+PACKING_MANIFEST = "packing_manifest.jsonl"
+DEFAULT_QUBIT_BUDGET = int(os.environ.get("QUANT_PACK_QUBITS", "21"))
+
+_CAR_RE = re.compile(r'_car_(\d+)\.json(\.gz)?$')
+_PACK_FILE_RE = re.compile(r'^api_payload_pack_\d+(_[0-9a-f]+)?\.json(\.gz)?$')
+_PACK_RESULT_RE = re.compile(r'^Result_graph_\d+_api_payload_pack_\d+(_[0-9a-f]+)?\.json$')
+PACK_HASH_LENGTH = 16
+
+
+def packed_gate_id(slot, gate_id):
+    """id гейта машины slot в упакованной схеме: id машин одного шаблона совпадают"""
+    key = f"pack:{slot}:{gate_id}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=10).hexdigest()
+
+
+def pack_payloads(payloads):
+    """
+    Кладёт схемы машин на непересекающиеся регистры одного payload.
+    Возвращает (payload, раскладка [(первый кубит, число кубитов), ...]).
+    """
+    launches = {payload["launch"] for payload in payloads}
+    if len(launches) != 1:
+        raise ValueError(f"В одну схему упаковываются только payload'ы с одинаковым launch: {sorted(launches)}")
+
+    n_columns = max((len(line) for payload in payloads for line in payload["actualHistoryMap"]), default=0)
+    elements_object = {}
+    actual_history_map = []
+    layout = []
+
+    for slot, payload in enumerate(payloads):
+        ids = {}
+        for gate_id, element in payload["elementsObject"].items():
+            new_id = packed_gate_id(slot, gate_id)
+            ids[gate_id] = new_id
+            elements_object[new_id] = {**element, "id": new_id}
+
+        layout.append((len(actual_history_map), len(payload["actualHistoryMap"])))
+        for line in payload["actualHistoryMap"]:
+            row = [ids.get(cell, cell) for cell in line]
+            # Короткие строки дополняются так же, как create_api_payload: после MEASUREMENT - 'block'
+            measured = any(elements_object.get(cell, {}).get("title") == 'MEASUREMENT' for cell in row)
+            row.extend(['block' if measured else 'none'] * (n_columns - len(row)))
+            actual_history_map.append(row)
+
+    packed = {
+        "elementsObject": elements_object,
+        "actualHistoryMap": actual_history_map,
+        "launch": launches.pop()
+    }
+    packed["contentHash"] = payload_content_hash(packed)
+    return packed, layout
+
+
+def demultiplex_counts(data, layout, n_qubits):
+    """
+    Маргинальные гистограммы машин из совместной гистограммы упакованной схемы.
+    data - список {"bitstring", "value"} из ответа API; кубит 0 - правый бит.
+    """
+    histograms = [{} for _ in layout]
+    for item in data:
+        bitstring = item["bitstring"]
+        if len(bitstring) != n_qubits:
+            raise ValueError(f"Длина битовой строки {len(bitstring)} не совпадает с числом кубитов {n_qubits}")
+        for counts, (offset, width) in zip(histograms, layout):
+            key = bitstring[n_qubits - offset - width:n_qubits - offset]
+            counts[key] = counts.get(key, 0) + item["value"]
+    return histograms
+
+
+def pack_filename(packed_dir, pack_idx, content_hash, compress=False):
+    suffix = ".json.gz" if compress else ".json"
+    return os.path.join(packed_dir, f"api_payload_pack_{pack_idx}_{content_hash[:PACK_HASH_LENGTH]}{suffix}")
+
+
+def _car_files(graph_dir):
+    """Payload'ы машин папки графа в порядке номеров машин"""
+    files = []
+    for name in os.listdir(graph_dir):
+        match = _CAR_RE.search(name)
+        if match and is_payload_file(name):
+            files.append((int(match.group(1)), name))
+    return sorted(files)
+
+
+def _iter_packs(graph_dir, qubit_budget):
+    """Жадно набирает подряд идущие машины в схемы не шире qubit_budget кубитов"""
+    batch = []
+    width = 0
+    for car_idx, name in _car_files(graph_dir):
+        payload = read_payload(os.path.join(graph_dir, name))
+        car_width = len(payload["actualHistoryMap"])
+        if batch and (width + car_width > qubit_budget or payload["launch"] != batch[0][2]["launch"]):
+            yield batch
+            batch, width = [], 0
+        batch.append((car_idx, name, payload))
+        width += car_width
+    if batch:
+        yield batch
+
+
+def pack_graph(graph_dir, packed_dir, qubit_budget=DEFAULT_QUBIT_BUDGET, payload_format="shared", compress=True,
+               packed_results_dir=None):
+    """
+    Упаковывает payload'ы машин одной папки графа в packed_dir и пишет манифест.
+    Неизменившиеся упакованные payload'ы не перезаписываются (имя содержит contentHash);
+    упаковки и их результаты в packed_results_dir, которых нет в новом манифесте, удаляются.
+    Возвращает (число упакованных схем, число машин).
+    """
+    graph_folder = os.path.basename(os.path.normpath(graph_dir))
+    os.makedirs(packed_dir, exist_ok=True)
+
+    manifest = []
+    n_cars = 0
+    for pack_idx, batch in enumerate(_iter_packs(graph_dir, qubit_budget)):
+        packed, layout = pack_payloads([payload for _, _, payload in batch])
+        filename = pack_filename(packed_dir, pack_idx, packed["contentHash"], compress)
+        packed_result = result_filename(graph_folder, os.path.basename(filename))
+        if not payload_is_current(filename, packed["contentHash"], payload_format, compress):
+            write_payload(filename, packed, payload_format, compress)
+
+        manifest.append({
+            "file": os.path.basename(filename),
+            "result": packed_result,
+            "qubits": len(packed["actualHistoryMap"]),
+            "cars": [
+                {"car": car_idx, "result": result_filename(graph_folder, name), "offset": offset, "n_qubits": width}
+                for (car_idx, name, _), (offset, width) in zip(batch, layout)
+            ]
+        })
+        n_cars += len(batch)
+
+    # Упаковки прошлого запуска, которых нет в манифесте (изменились или их стало меньше), и их результаты
+    current_files = {entry["file"] for entry in manifest}
+    for name in os.listdir(packed_dir):
+        if _PACK_FILE_RE.match(name) and name not in current_files:
+            os.remove(os.path.join(packed_dir, name))
+    if packed_results_dir is not None and os.path.isdir(packed_results_dir):
+        current_results = {entry["result"] for entry in manifest}
+        for name in os.listdir(packed_results_dir):
+            if _PACK_RESULT_RE.match(name) and name not in current_results:
+                os.remove(os.path.join(packed_results_dir, name))
+
+    tmp_file = os.path.join(packed_dir, f"{PACKING_MANIFEST}.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        for entry in manifest:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp_file, os.path.join(packed_dir, PACKING_MANIFEST))
+
+    return len(manifest), n_cars
+
+
+def _graph_folders(base_dir):
+    folders = [folder for folder in glob.glob(os.path.join(base_dir, "graph_*")) if os.path.isdir(folder)]
+    return sorted(folders, key=lambda folder: int(re.search(r'graph_(\d+)', folder).group(1)))
+
+
+def pack_input(input_dir="input", packed_input_dir=PACKED_INPUT_DIR, packed_results_dir=PACKED_RESULTS_DIR,
+               qubit_budget=DEFAULT_QUBIT_BUDGET, payload_format="shared", compress=True):
+    """Упаковывает все папки graph_k из input_dir; возвращает число упакованных схем"""
+    total_packs = 0
+    for graph_dir in _graph_folders(input_dir):
+        graph_folder = os.path.basename(graph_dir)
+        try:
+            n_packs, n_cars = pack_graph(graph_dir, os.path.join(packed_input_dir, graph_folder),
+                                         qubit_budget, payload_format, compress,
+                                         os.path.join(packed_results_dir, graph_folder))
+        except Exception as e:
+            print(f"✗ [{graph_folder}] Ошибка упаковки: {e}")
+            continue
+        print(f"✓ [{graph_folder}] {n_cars} машин упаковано в {n_packs} схем (бюджет {qubit_budget} кубитов)")
+        total_packs += n_packs
+    return total_packs
+
+
+def read_manifest(packed_dir):
+    """Записи манифеста упаковки папки графа (пустой список, если упаковки нет)"""
+    path = os.path.join(packed_dir, PACKING_MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def unpack_results(packed_input_dir=PACKED_INPUT_DIR, packed_results_dir=PACKED_RESULTS_DIR, results_dir="results"):
+    """
+    Раскладывает пришедшие результаты упакованных схем по Result_graph_k_car_j.json.
+    Результат машины переписывается, только если результат упаковки новее него.
+    Возвращает (число записанных результатов машин, число упаковок без результата).
+    """
+    written = 0
+    pending = 0
+    for packed_dir in _graph_folders(packed_input_dir):
+        graph_folder = os.path.basename(packed_dir)
+        graph_results_dir = os.path.join(results_dir, graph_folder)
+
+        for entry in read_manifest(packed_dir):
+            packed_result = os.path.join(packed_results_dir, graph_folder, entry["result"])
+            if not os.path.exists(packed_result):
+                pending += 1
+                continue
+
+            packed_mtime = os.path.getmtime(packed_result)
+            outputs = [os.path.join(graph_results_dir, car["result"]) for car in entry["cars"]]
+            if all(os.path.exists(path) and os.path.getmtime(path) >= packed_mtime for path in outputs):
+                continue
+
+            try:
+                with open(packed_result, 'r', encoding='utf-8') as f:
+                    data = json.load(f)["data"]
+                layout = [(car["offset"], car["n_qubits"]) for car in entry["cars"]]
+                histograms = demultiplex_counts(data, layout, entry["qubits"])
+            except Exception as e:
+                print(f"✗ [{graph_folder}] Ошибка разбора {entry['result']}: {e}")
+                continue
+
+            os.makedirs(graph_results_dir, exist_ok=True)
+            for path, counts in zip(outputs, histograms):
+                write_result(path, counts)
+            written += len(outputs)
+
+    return written, pending
+
+
+def watch_packed_results(packed_input_dir=PACKED_INPUT_DIR, packed_results_dir=PACKED_RESULTS_DIR,
+                         results_dir="results", check_interval=5):
+    """Раскладывает результаты упаковок по мере их появления, пока не придут все"""
+    total = 0
+    while True:
+        written, pending = unpack_results(packed_input_dir, packed_results_dir, results_dir)
+        total += written
+        if written:
+            print(f"✓ Разложено результатов машин: {written} (всего {total})")
+        if not pending:
+            print(f"Все упакованные схемы обработаны: {total} результатов машин")
+            return total
+        time.sleep(check_interval)
+
+
+if __name__ == "__main__":
+    if PACK_STAGE in ("all", "pack"):
+        pack_input()
+    if PACK_STAGE in ("all", "unpack"):
+        watch_packed_results()
@@ -1,10 +1,20 @@
+import copy
+import hashlib
 import json
 import numpy as np
 import math
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from qiskit import QuantumCircuit
 from qiskit.circuit import Parameter
-import uuid
+from qiskit.circuit.library import U3Gate
+from graph_core import TrafficGraph
+from graph_store import GraphStore, GRAPH_STORE_FILE
+from ingest_manifest import dirty_graphs
+from gate_fusion import compose, fidelity, fuse_rotations, rotation_matrices, u3_angles
+from payload_io import iter_angle_types, payload_filename, payload_is_current, remove_other_variant, write_payload
+from result_cache import combine_content_hash, payload_content_hash, structure_digest
 
 class UnifiedCircuitConverter:
     """Конвертер схем в JSON формат согласно документации"""
@@ -27,6 +37,12 @@ class UnifiedCircuitConverter:
             'barrier': 'auxiliary'
         }
 
+        # Скомпилированные шаблоны payload QAOA-схемы по (кубиты, глубина, слияние)
+        self._payload_templates = {}
+
+        # Статистика слияния гейтов: схемы, гейты до/после, минимальная fidelity
+        self.fusion_stats = self._empty_fusion_stats()
+
     def _replace_parameters_with_values(self, qc):
         """Заменяет все параметры в схеме на числовые значения"""
         qc_copy = qc.copy()
@@ -208,12 +224,26 @@ class UnifiedCircuitConverter:
             }
         }
 
+        def angle_template(key, data):
+            # У каждого угла свой список types, иначе значения углов перезапишут друг друга
+            return {**base_angle_template, "key": key, "types": copy.deepcopy(base_angle_template["types"]),
+                    "data": data}
+
+        def bind_values(structure):
+            # Числовые значения всех углов - в input-number соответствующего параметра
+            for param_item, value in zip(structure, params):
+                for value_item in param_item["value"]:
+                    for type_item in value_item["types"]:
+                        if type_item.get("key") == "input-number" and type_item.get("input") == "input":
+                            type_item["data"] = float(value)
+            return structure
+
         # Для многопараметрических гейтов
         if gate_name == 'U2':
-            angle1_template = {**base_angle_template, "key": "angle1", "data": "input-number"}
-            angle2_template = {**base_angle_template, "key": "angle2", "data": "const-string-pi"}
+            angle1_template = angle_template("angle1", "input-number")
+            angle2_template = angle_template("angle2", "const-string-pi")
 
-            return [
+            return bind_values([
                 {
                     "key": "phi",
                     "title": "Угол поворота в радианах 1",
@@ -226,14 +256,17 @@ class UnifiedCircuitConverter:
                     "manipulation": None,
                     "value": [angle2_template]
                 }
-            ]
+            ])
 
         elif gate_name == 'U3':
-            angle1_template = {**base_angle_template, "key": "angle1", "data": "input-number"}
-            angle2_template = {**base_angle_template, "key": "angle2", "data": "const-string-pi"}
-            angle3_template = {**base_angle_template, "key": "angle3", "data": "const-string-e"}
-
-            return [
+            # U3 получается слиянием гейтов (fuse_single_qubit_gates) с произвольными углами:
+            # во всех трёх параметрах выбран input-number, как у RX/U1, чтобы API взял
+            # привязанные числа, а не константы pi / e
+            angle1_template = angle_template("angle1", "input-number")
+            angle2_template = angle_template("angle2", "input-number")
+            angle3_template = angle_template("angle3", "input-number")
+
+            return bind_values([
                 {
                     "key": "theta",
                     "title": "Угол поворота в радианах 1",
@@ -252,7 +285,7 @@ class UnifiedCircuitConverter:
                     "manipulation": None,
                     "value": [angle3_template]
                 }
-            ]
+            ])
 
         # Для однопараметрических гейтов
         config = param_configs.get(gate_name)
@@ -265,8 +298,13 @@ class UnifiedCircuitConverter:
 
         return [config] if config else []
 
-    def create_api_payload(self, qc, shots=1024):
-        """Создает полный payload для API согласно первому документу"""
+    def create_api_payload(self, qc, shots=1024, fuse=False):
+        """
+        Создает полный payload для API согласно первому документу.
+        fuse - перед конвертацией слить однокубитные гейты в U3 (fuse_single_qubit_gates).
+        """
+        if fuse:
+            qc = self.fuse_single_qubit_gates(qc)
         circuit_json = self.convert_circuit(qc)
 
         # Генерируем elementsObject и actualHistoryMap
@@ -278,8 +316,9 @@ class UnifiedCircuitConverter:
             actual_history_map.append(["none"] * circuit_json["column"])
 
         # Заполняем elementsObject и actualHistoryMap
-        for gate in circuit_json["data"]:
-            gate_id = str(uuid.uuid4().hex)[:20]
+        for gate_idx, gate in enumerate(circuit_json["data"]):
+            gate_id = self.derived_gate_id(circuit_json["qubit"], circuit_json["column"], gate_idx,
+                                           gate.get("qubit"), gate["column"])
 
             # Создаем элемент для elementsObject
             element = {
@@ -314,9 +353,288 @@ class UnifiedCircuitConverter:
             "actualHistoryMap": actual_history_map,
             "launch": shots
         }
+        payload["contentHash"] = payload_content_hash(payload)
 
         return payload
 
+    @staticmethod
+    def _empty_fusion_stats():
+        return {"circuits": 0, "gates_before": 0, "gates_after": 0, "min_fidelity": 1.0}
+
+    def _record_fusion(self, gates_before, gates_after, fidelities):
+        stats = self.fusion_stats
+        stats["circuits"] += 1
+        stats["gates_before"] += gates_before
+        stats["gates_after"] += gates_after
+        if len(fidelities):
+            stats["min_fidelity"] = min(stats["min_fidelity"], float(np.min(fidelities)))
+
+    def fusion_report(self, reset=True):
+        """Сводка слияния гейтов; по умолчанию счётчики после неё обнуляются"""
+        stats = self.fusion_stats
+        if reset:
+            self.fusion_stats = self._empty_fusion_stats()
+        if not stats["circuits"]:
+            return "Слияние гейтов: схем не было"
+        ratio = stats["gates_before"] / max(stats["gates_after"], 1)
+        return (f"Слияние гейтов: {stats['circuits']} схем, {stats['gates_before']} → {stats['gates_after']} "
+                f"гейтов ({ratio:.1f}x), минимальная fidelity {stats['min_fidelity']:.15f}")
+
+    def fuse_single_qubit_gates(self, qc):
+        """
+        Сливает подряд идущие однокубитные гейты на каждом кубите в один U3.
+        Цепочка прерывается измерением, барьером или многокубитным гейтом.
+        Эквивалентность проверяется fidelity каждого U3 против произведения исходных гейтов.
+        Слияние выключено по умолчанию: схема эквивалентна исходной, только если API
+        применяет U3 с углами из input-number (так их читают local_simulator и app.js);
+        перед включением это нужно сверить с ответами реального API.
+        """
+        rotation_names = {'rx': 'RX', 'ry': 'RY', 'rz': 'RZ', 'p': 'U1', 'u1': 'U1'}
+        fused_qc = QuantumCircuit(*qc.qregs, *qc.cregs)
+        pending = {}
+        fidelities = []
+        gates_before = 0
+        gates_after = 0
+
+        def flush(qubit):
+            nonlocal gates_after
+            matrix = pending.pop(qubit, None)
+            if matrix is None:
+                return
+            theta, phi, lam = u3_angles(matrix)
+            fidelities.append(fidelity(matrix, theta, phi, lam)[0])
+            fused_qc.append(U3Gate(float(theta[0]), float(phi[0]), float(lam[0])), [qubit])
+            gates_after += 1
+
+        for instruction in qc.data:
+            op = instruction.operation
+            gate_name = op.name.lower()
+
+            if len(instruction.qubits) == 1 and not instruction.clbits and gate_name not in ('measure', 'barrier'):
+                qubit = instruction.qubits[0]
+                if gate_name in rotation_names:
+                    matrix = rotation_matrices(rotation_names[gate_name], [float(op.params[0])])
+                else:
+                    matrix = np.asarray(op.to_matrix(), dtype=np.complex128)[None]
+                previous = pending.get(qubit)
+                pending[qubit] = matrix if previous is None else compose(matrix, previous)
+                gates_before += 1
+                continue
+
+            for qubit in instruction.qubits:
+                flush(qubit)
+            fused_qc.append(op, instruction.qubits, instruction.clbits)
+
+        for qubit in list(pending):
+            flush(qubit)
+
+        self._record_fusion(gates_before, gates_after, fidelities)
+        return fused_qc
+
+    @staticmethod
+    def derived_gate_id(n_qubits, n_columns, gate_idx, qubit, column):
+        """Стабильный id гейта по его положению в схеме (вместо случайного uuid)"""
+        key = f"{n_qubits}:{n_columns}:{gate_idx}:{qubit}:{column}"
+        return hashlib.blake2b(key.encode('ascii'), digest_size=10).hexdigest()
+
+    # Значение, выбранное в параметре угла, для однопараметрических гейтов QAOA-схемы
+    _angle_selection = {'RX': 'input-number', 'RY': 'const-string-pi', 'RZ': 'const-string-e'}
+
+    def _angle_params(self, gate_name, angle):
+        """То же, что _create_params_structure для RX/RY/RZ, без копирования шаблонов"""
+        return [{
+            "key": "lambda" if gate_name == 'RZ' else "theta",
+            "title": "Угол поворота в радианах",
+            "manipulation": None,
+            "value": [{
+                "title": "Угол поворота",
+                "key": "angle1",
+                "types": [
+                    {
+                        "input": "input",
+                        "type": "number",
+                        "key": "input-number",
+                        "title": "Угол поворота в радианах",
+                        "data": angle,
+                        "step": 0.01,
+                        "decimalDigits": 6
+                    },
+                    {
+                        "input": "const",
+                        "type": "string",
+                        "key": "const-string-pi",
+                        "title": "Число Пи (π)",
+                        "data": "pi"
+                    },
+                    {
+                        "input": "const",
+                        "type": "string",
+                        "key": "const-string-e",
+                        "title": "Число е",
+                        "data": "e"
+                    }
+                ],
+                "data": self._angle_selection[gate_name]
+            }]
+        }]
+
+    @staticmethod
+    def qaoa_layout(n_qubits, p, fused=False):
+        """
+        Раскладка гейтов QAOA-схемы create_enhanced_circuit в порядке qc.data:
+        список (кубит, столбец, гейт, тип).
+        Столбец 0 - инициализация RY, в слое l: RZ/RY/RZ в столбцах 1+4l..3+4l,
+        mixer RX (чётный слой) или RY (нечётный) в столбце 4+4l, последний - MEASUREMENT.
+        fused - схема после fuse_single_qubit_gates: на каждом кубите U3 и MEASUREMENT.
+        """
+        if fused:
+            layout = []
+            for qubit in range(n_qubits):
+                layout.append((qubit, 0, 'U3', 'params'))
+                layout.append((qubit, 1, 'MEASUREMENT', 'auxiliary'))
+            return layout
+
+        layout = [(qubit, 0, 'RY', 'params') for qubit in range(n_qubits)]
+        for layer in range(p):
+            base = 1 + 4 * layer
+            for qubit in range(n_qubits):
+                layout.append((qubit, base, 'RZ', 'params'))
+                layout.append((qubit, base + 1, 'RY', 'params'))
+                layout.append((qubit, base + 2, 'RZ', 'params'))
+            mixer = 'RX' if layer % 2 == 0 else 'RY'
+            layout.extend((qubit, base + 3, mixer, 'params') for qubit in range(n_qubits))
+        layout.extend((qubit, 4 * p + 1, 'MEASUREMENT', 'auxiliary') for qubit in range(n_qubits))
+        return layout
+
+    def payload_template(self, n_qubits, p, fused=False):
+        """Шаблон payload QAOA-схемы, компилируется один раз на (кубиты, глубина, слияние)"""
+        key = (n_qubits, p, fused)
+        template = self._payload_templates.get(key)
+        if template is None:
+            template = PayloadTemplate(self, n_qubits, p, fused)
+            self._payload_templates[key] = template
+        return template
+
+    @staticmethod
+    def qaoa_gate_angles(init_angles, layer_angles, mixer_angles):
+        """Углы гейтов схемы в порядке qaoa_layout (без измерений)"""
+        layer_angles = np.asarray(layer_angles, dtype=np.float64)
+        n_qubits = layer_angles.shape[1]
+        # Каждый угол cost layer раскладывается на rz(a*0.5), ry(a*0.3), rz(a*0.5)
+        rotations = layer_angles[:, :, None] * np.array([0.5, 0.3, 0.5])
+        per_layer = np.concatenate([
+            rotations.reshape(len(layer_angles), -1),
+            np.repeat(np.asarray(mixer_angles, dtype=np.float64)[:, None], n_qubits, axis=1)
+        ], axis=1)
+        return list(init_angles) + per_layer.ravel().tolist()
+
+    @staticmethod
+    def qaoa_fused_angles(init_angles, layer_angles, mixer_angles):
+        """
+        Углы U3 (theta, phi, lambda по кубитам) схемы после слияния гейтов
+        и fidelity каждого U3 против произведения исходных поворотов
+        """
+        layer_angles = np.asarray(layer_angles, dtype=np.float64)
+        gates = [('RY', np.asarray(init_angles, dtype=np.float64))]
+        for layer, angles in enumerate(layer_angles):
+            gates.append(('RZ', angles * 0.5))
+            gates.append(('RY', angles * 0.3))
+            gates.append(('RZ', angles * 0.5))
+            gates.append(('RX' if layer % 2 == 0 else 'RY', np.full(len(angles), mixer_angles[layer])))
+
+        theta, phi, lam, fidelities = fuse_rotations(gates, len(init_angles))
+        return np.stack([theta, phi, lam], axis=1).ravel().tolist(), fidelities
+
+    def create_api_payload_from_angles(self, init_angles, layer_angles, mixer_angles, shots=1024, fuse=False):
+        """
+        Payload API для QAOA-схемы прямо по массивам углов, без QuantumCircuit.
+        Совпадает с create_api_payload(create_enhanced_circuit(...), fuse=fuse),
+        включая id гейтов и contentHash.
+        Возвращается структура шаблона (см. PayloadTemplate.bind) - она действительна
+        до следующего вызова для той же формы схемы.
+        """
+        n_qubits, p = len(init_angles), len(layer_angles)
+        template = self.payload_template(n_qubits, p, fuse)
+        if fuse:
+            angles, fidelities = self.qaoa_fused_angles(init_angles, layer_angles, mixer_angles)
+            self._record_fusion(n_qubits * (4 * p + 1), n_qubits, fidelities)
+        else:
+            angles = self.qaoa_gate_angles(init_angles, layer_angles, mixer_angles)
+        return template.bind(angles, shots)
+
+class PayloadTemplate:
+    """
+    Скомпилированный payload QAOA-схемы фиксированной формы (кубиты, глубина).
+
+    id гейтов (выводятся из положения гейта, как в create_api_payload), actualHistoryMap (с маркерами 'block') и структуры параметров
+    строятся один раз; для каждой машины в заранее найденные слоты
+    input-number подставляются только числовые углы. bind возвращает одну и ту же
+    структуру, поэтому её нужно сериализовать (или скопировать) до следующего bind.
+    """
+
+    def __init__(self, converter, n_qubits, p, fused=False):
+        self.n_qubits = n_qubits
+        self.p = p
+        self.fused = fused
+        n_columns = 2 if fused else 4 * p + 2
+
+        elements_object = {}
+        actual_history_map = [["none"] * n_columns for _ in range(n_qubits)]
+        self._angle_slots = []
+
+        for gate_idx, (qubit, column, title, gate_type) in enumerate(converter.qaoa_layout(n_qubits, p, fused)):
+            gate_id = converter.derived_gate_id(n_qubits, n_columns, gate_idx, qubit, column)
+            params = None
+            if title == 'U3':
+                params = converter._create_params_structure('U3', [0, 0, 0])
+            elif gate_type == 'params':
+                params = converter._angle_params(title, 0)
+            if params:
+                # Ссылки на input-number, куда пишутся углы гейта
+                self._angle_slots.extend(iter_angle_types(params))
+
+            elements_object[gate_id] = {
+                "id": gate_id,
+                "title": title,
+                "type": gate_type,
+                "params": params,
+                "error": None,
+                "body": None,
+                "idGate": None
+            }
+            actual_history_map[qubit][column] = gate_id
+
+        # Заменяем оставшиеся 'none' на 'block' после MEASUREMENT
+        for qubit_line in actual_history_map:
+            measurement_found = False
+            for i in range(len(qubit_line)):
+                if measurement_found and qubit_line[i] == 'none':
+                    qubit_line[i] = 'block'
+                elif qubit_line[i] != 'none' and elements_object[qubit_line[i]]['title'] == 'MEASUREMENT':
+                    measurement_found = True
+
+        self.payload = {
+            "elementsObject": elements_object,
+            "actualHistoryMap": actual_history_map,
+            "launch": 1024
+        }
+        # Отпечаток структуры считается один раз; на машину хэшируются только углы
+        self._structure_digest, _ = structure_digest(self.payload)
+
+    @property
+    def n_angles(self):
+        return len(self._angle_slots)
+
+    def bind(self, angles, shots=1024):
+        """Подставляет углы гейтов (порядок qaoa_layout) и возвращает payload шаблона"""
+        if len(angles) != len(self._angle_slots):
+            raise ValueError(f"Шаблону нужно {len(self._angle_slots)} углов, передано {len(angles)}")
+        for slot, angle in zip(self._angle_slots, angles):
+            slot["data"] = angle
+        self.payload["launch"] = shots
+        self.payload["contentHash"] = combine_content_hash(self._structure_digest, angles, shots)
+        return self.payload
+
 class ImprovedQuantumTrafficOptimizer:
     def __init__(self, graph_matrix, traffic_penalty=0.3):
         self.J = graph_matrix
@@ -340,20 +658,40 @@ class ImprovedQuantumTrafficOptimizer:
         else:
             self.J_normalized = np.ones_like(self.J) * 0.5
 
-    def create_enhanced_circuit(self, start, end, current_traffic, p=3):
-        """Улучшенная схема с умной инициализацией и усиленными cost layers"""
+        # Рёбра i < j с ненулевым весом в порядке обхода верхнего треугольника
+        self.graph = TrafficGraph.from_matrix(self.J)
+        edge_i, edge_j, edge_w = self.graph.upper_edges()
+        cost_mask = edge_w != 0
+        self.cost_edge_i = edge_i[cost_mask]
+        self.cost_edge_j = edge_j[cost_mask]
+        self.cost_edge_weight = np.abs(self.J_normalized[self.cost_edge_i, self.cost_edge_j])
+
+        # Маски битов i ^ j для каждого ребра: (ребро, кубит)
+        qubit_bits = np.arange(self.n_qubits_per_node)
+        edge_diff = (self.cost_edge_i ^ self.cost_edge_j).astype(np.int64)
+        self.cost_edge_bits = ((edge_diff[:, None] >> qubit_bits) & 1).astype(bool)
+
+    def create_enhanced_circuit(self, start, end, current_traffic, p=3, layer_angles=None):
+        """
+        Улучшенная схема с умной инициализацией и усиленными cost layers.
+        layer_angles - готовые углы cost layers (p, total_qubits), например из
+        IncrementalTrafficAngles; по умолчанию считаются по current_traffic.
+        """
         qc = QuantumCircuit(self.total_qubits, self.total_qubits)
 
         # 1. Умная инициализация с учетом стартовой вершины
         self.smart_initialization(qc, start)
 
+        # Углы всех cost layers считаются одним пакетом
+        if layer_angles is None:
+            layer_angles = self.compute_layer_angles(current_traffic, end, p)
+
         # 2. Детерминированные но разнообразные параметры для лучшей сходимости
         for layer in range(p):
-            gamma = 0.5 + 0.2 * layer  # Детерминированные, но разные по слоям
             beta = 0.3 + 0.15 * layer
 
             # 3. Усиленный cost layer
-            self.enhanced_cost_layer(qc, gamma, current_traffic, start, end, layer)
+            self._apply_cost_rotations(qc, layer_angles[layer])
 
             # 4. Чередующиеся mixer layers для лучшего перемешивания
             if layer % 2 == 0:
@@ -366,6 +704,23 @@ class ImprovedQuantumTrafficOptimizer:
         qc.measure(range(self.total_qubits), range(self.total_qubits))
         return qc
 
+    def circuit_angles(self, start, end, current_traffic, p=3, layer_angles=None):
+        """
+        Углы схемы create_enhanced_circuit без построения QuantumCircuit:
+        (углы инициализации RY, углы cost layers (p, total_qubits), углы mixer по слоям)
+        """
+        init_angles = [(0.2 + 0.6 * ((int(start) >> qubit) & 1)) * np.pi/2 for qubit in range(self.total_qubits)]
+        if layer_angles is None:
+            layer_angles = self.compute_layer_angles(current_traffic, end, p)
+        mixer_angles = [2 * (0.3 + 0.15 * layer) for layer in range(p)]
+        return init_angles, layer_angles, mixer_angles
+
+    def create_enhanced_payload(self, converter, start, end, current_traffic, p=3, layer_angles=None,
+                                shots=1024, fuse=False):
+        """Payload API схемы create_enhanced_circuit напрямую из углов (без qiskit)"""
+        init_angles, layer_angles, mixer_angles = self.circuit_angles(start, end, current_traffic, p, layer_angles)
+        return converter.create_api_payload_from_angles(init_angles, layer_angles, mixer_angles, shots, fuse)
+
     def smart_initialization(self, qc, start):
         """Умная инициализация, учитывающая стартовую вершину в бинарном кодировании"""
         if self.n_qubits_per_node == 0:
@@ -385,40 +740,58 @@ class ImprovedQuantumTrafficOptimizer:
                 # Для дополнительных кубитов - обычная суперпозиция
                 qc.h(qubit)
 
-    def enhanced_cost_layer(self, qc, gamma, traffic, start, end, layer):
-        """Усиленный cost layer с приоритетом целевой вершины"""
-        angles = [0.0] * self.total_qubits
-
-        # Усиленные веса ребер с учетом трафика
-        for i in range(self.n_nodes):
-            for j in range(i + 1, self.n_nodes):
-                if self.J[i, j] != np.inf and self.J[i, j] != 0:
-                    base_weight = abs(self.J_normalized[i, j])
-                    traffic_cost = traffic[i, j] * self.traffic_penalty
-
-                    # Усиленные коэффициенты для лучшей сходимости
-                    effective_strength = (base_weight * 2.0 + traffic_cost * 1.5) * gamma * 0.3
-
-                    # Применяем к соответствующим битам в бинарном представлении
-                    diff = i ^ j
-                    for bit_pos in range(self.n_qubits_per_node):
-                        if (diff >> bit_pos) & 1:
-                            angles[bit_pos] += effective_strength * (layer + 1)  # Зависит от слоя
+    def compute_layer_angles(self, traffic, end, p):
+        """Углы cost layer для всех слоёв схемы: массив (p, total_qubits)"""
+        layers = np.arange(p)
+        gammas = 0.5 + 0.2 * layers  # Детерминированные, но разные по слоям
+        return self._cost_layer_angles(gammas, layers, traffic, end)
+
+    def _cost_layer_angles(self, gammas, layers, traffic, end):
+        """
+        Пакетный расчёт углов cost layer по списку рёбер.
+        Порядок операций и суммирования по рёбрам совпадает с поэлементным
+        обходом i < j, поэтому углы совпадают с ним бит в бит.
+        """
+        gammas = np.asarray(gammas, dtype=np.float64)
+        layers = np.asarray(layers)
+        angles = np.zeros((len(gammas), self.total_qubits))
+
+        # Усиленные веса ребер с учетом трафика (только существующие ребра из CSR)
+        traffic_cost = traffic[self.cost_edge_i, self.cost_edge_j] * self.traffic_penalty
+        edge_strength = self.cost_edge_weight * 2.0 + traffic_cost * 1.5
+
+        # Усиленные коэффициенты для лучшей сходимости, зависят от слоя: (слой, ребро)
+        contributions = edge_strength[None, :] * gammas[:, None] * 0.3 * (layers[:, None] + 1)
+
+        # Применяем к соответствующим битам в бинарном представлении;
+        # cumsum суммирует последовательно, в порядке рёбер
+        for bit_pos in range(self.n_qubits_per_node):
+            bit_contributions = contributions[:, self.cost_edge_bits[:, bit_pos]]
+            if bit_contributions.shape[1]:
+                angles[:, bit_pos] = np.cumsum(bit_contributions, axis=1)[:, -1]
 
         # Добавляем bias к целевой вершине для направления оптимизации
         if self.n_qubits_per_node > 0:
-            end_binary = format(end, f'0{self.n_qubits_per_node}b')
-            for qubit in range(min(self.total_qubits, len(end_binary))):
-                if end_binary[-(qubit+1)] == '1':
-                    angles[qubit] += gamma * 0.4  # Bias к битам целевой вершины
+            end_bits = ((int(end) >> np.arange(self.total_qubits)) & 1).astype(bool)
+            angles += np.where(end_bits[None, :], gammas[:, None] * 0.4, 0.0)  # Bias к битам целевой вершины
 
         # Базовый угол, увеличивающийся с глубиной
-        base_angle = gamma * (0.5 + 0.2 * layer)
-        for i in range(self.total_qubits):
-            angles[i] += base_angle
+        base_angle = gammas * (0.5 + 0.2 * layers)
+        angles += base_angle[:, None]
+        return angles
+
+    def incremental_angles(self, traffic=None):
+        """Накопители углов, обновляемые по одной машине (см. IncrementalTrafficAngles)"""
+        return IncrementalTrafficAngles(self, traffic)
+
+    def enhanced_cost_layer(self, qc, gamma, traffic, start, end, layer):
+        """Усиленный cost layer с приоритетом целевой вершины"""
+        angles = self._cost_layer_angles([gamma], [layer], traffic, end)[0]
+        self._apply_cost_rotations(qc, angles)
 
-        # Применяем rotations с улучшенной стабильностью
-        for qubit, angle in enumerate(angles):
+    def _apply_cost_rotations(self, qc, angles):
+        """Применяем rotations с улучшенной стабильностью"""
+        for qubit, angle in enumerate(angles.tolist()):
             # Последовательность rotations для лучшей сходимости
             qc.rz(angle * 0.5, qubit)
             qc.ry(angle * 0.3, qubit)
@@ -447,10 +820,90 @@ class ImprovedQuantumTrafficOptimizer:
         for qubit in range(self.total_qubits):
             qc.ry(2 * beta, qubit)
 
-def save_traffic_circuits_from_files(graph_file, routes_file, output_dir="input", process_all_graphs=False):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+class IncrementalTrafficAngles:
+    """
+    Инкрементальный расчёт углов cost layer при последовательном добавлении машин.
+
+    Вклад рёбер в угол кубита b раскладывается на постоянную часть
+    (сумма нормированных весов рёбер, у которых в i ^ j взведён бит b)
+    и трафиковую (сумма трафика по тем же рёбрам). После каждой машины
+    меняется трафик только одного ребра, поэтому обновляются лишь суммы
+    по его битам - O(кубитов) на машину вместо O(рёбер).
+    Порядок суммирования другой, поэтому углы не совпадают с
+    compute_layer_angles бит в бит: расхождение достигает ~1e-13
+    (относительное - порядка 1e-14), а вместе с углами меняется и contentHash
+    payload'а. Режим включается явно (QUANT_INCREMENTAL_ANGLES=1).
+    """
+
+    def __init__(self, optimizer, traffic=None):
+        self.optimizer = optimizer
+        bits = optimizer.cost_edge_bits.astype(np.float64)
+
+        self._edge_by_key = dict(zip(
+            (optimizer.cost_edge_i.astype(np.int64) * optimizer.n_nodes + optimizer.cost_edge_j).tolist(),
+            range(len(optimizer.cost_edge_i))
+        ))
+
+        self.weight_sums = optimizer.cost_edge_weight @ bits
+        if traffic is not None:
+            edge_traffic = traffic[optimizer.cost_edge_i, optimizer.cost_edge_j]
+            self.traffic_sums = edge_traffic @ bits
+        else:
+            self.traffic_sums = np.zeros(optimizer.total_qubits)
 
+    def add_car(self, start, end):
+        """Учитывает машину start -> end: трафик ребра {start, end} увеличивается на 1"""
+        if start == end:
+            return
+        i, j = min(start, end), max(start, end)
+        edge = self._edge_by_key.get(i * self.optimizer.n_nodes + j)
+        if edge is not None:
+            self.traffic_sums[self.optimizer.cost_edge_bits[edge]] += 1
+
+    def layer_angles(self, end, p):
+        """Углы cost layer для всех слоёв: массив (p, total_qubits)"""
+        optimizer = self.optimizer
+        layers = np.arange(p)
+        gammas = 0.5 + 0.2 * layers
+        angles = np.zeros((p, optimizer.total_qubits))
+
+        edge_sums = self.weight_sums * 2.0 + self.traffic_sums * optimizer.traffic_penalty * 1.5
+        angles += (gammas * 0.3 * (layers + 1))[:, None] * edge_sums[None, :]
+
+        if optimizer.n_qubits_per_node > 0:
+            end_bits = ((int(end) >> np.arange(optimizer.total_qubits)) & 1).astype(bool)
+            angles += np.where(end_bits[None, :], gammas[:, None] * 0.4, 0.0)
+
+        angles += (gammas * (0.5 + 0.2 * layers))[:, None]
+        return angles
+
+def save_traffic_circuits_from_store(store_file=GRAPH_STORE_FILE, output_dir="input", process_all_graphs=False,
+                                     only_graphs=None, incremental_angles=False, use_qiskit=False,
+                                     payload_format="pretty", compress=False, workers=1, chunk_size=500,
+                                     fuse_gates=False):
+    """
+    Генерация схем по бинарному хранилищу графов: графы читаются по одному через memory-map.
+    only_graphs - позиции графов для пересборки (например, из манифеста загрузки).
+    incremental_angles - углы cost layer обновляются по дельте трафика после каждой машины
+    (быстрее, но углы отличаются от точных на ~1e-13, см. IncrementalTrafficAngles).
+    use_qiskit - строить payload через QuantumCircuit (проверочный путь) вместо прямой генерации.
+    payload_format - pretty / compact / shared (см. payload_io), compress - сохранять в .json.gz.
+    workers - число процессов (1 - последовательно, 0 - по числу ядер),
+    chunk_size - сколько машин одного графа обрабатывает одна задача пула.
+    fuse_gates - сливать однокубитные гейты каждого кубита в U3 (см. fuse_single_qubit_gates);
+    по умолчанию выключено - корректность зависит от того, как API читает углы U3.
+    """
+    print("Открытие хранилища графов...")
+    source = _StoreGraphSource(store_file)
+    print(f"В хранилище {len(source)} графов")
+
+    _save_traffic_circuits(source, output_dir, process_all_graphs, only_graphs, workers, chunk_size,
+                           incremental_angles=incremental_angles, use_qiskit=use_qiskit,
+                           payload_format=payload_format, compress=compress, fuse_gates=fuse_gates)
+
+def save_traffic_circuits_from_files(graph_file, routes_file, output_dir="input", process_all_graphs=False,
+                                     use_qiskit=False, workers=1, chunk_size=500):
+    """Совместимость со старым текстовым форматом G_set.txt / routes.txt"""
     print("Загрузка графов из файла...")
     graphs = load_graphs_from_file(graph_file)
 
@@ -459,68 +912,245 @@ def save_traffic_circuits_from_files(graph_file, routes_file, output_dir="input"
 
     print(f"Загружено {len(graphs)} графов и {len(all_routes)} наборов маршрутов")
 
-    converter = UnifiedCircuitConverter()
+    _save_traffic_circuits(_ListGraphSource(graphs, all_routes), output_dir, process_all_graphs,
+                           workers=workers, chunk_size=chunk_size, use_qiskit=use_qiskit)
+
+class _StoreGraphSource:
+    """Графы из бинарного хранилища; в процессе пула хранилище открывается заново (memory-map)"""
+
+    def __init__(self, store_file):
+        self.store_file = store_file
+        self._store = None
+
+    def __getstate__(self):
+        return {"store_file": self.store_file, "_store": None}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = GraphStore(self.store_file)
+        return self._store
+
+    def __len__(self):
+        return len(self.store)
+
+    def graph(self, idx):
+        return self.store.matrix(idx)
+
+    def routes(self, idx):
+        return self.store.route_list(idx)
+
+    def n_routes(self, idx):
+        return self.store.n_routes(idx)
+
+class _ListGraphSource:
+    """Графы и маршруты, уже загруженные в память (старый текстовый формат)"""
+
+    def __init__(self, graphs, all_routes):
+        self.graphs = graphs
+        self.all_routes = all_routes
+
+    def __len__(self):
+        return len(self.graphs)
+
+    def graph(self, idx):
+        return self.graphs[idx]
+
+    def routes(self, idx):
+        return self.all_routes[idx]
+
+    def n_routes(self, idx):
+        return len(self.all_routes[idx])
+
+def _save_traffic_circuits(source, output_dir, process_all_graphs, only_graphs=None, workers=1, chunk_size=500,
+                           **options):
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size должен быть не меньше 1: {chunk_size}")
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
     if process_all_graphs:
-        graphs_to_process = range(len(graphs))
+        graphs_to_process = range(len(source))
         print("Обрабатываем ВСЕ графы...")
     else:
         graphs_to_process = [0]
         print("Обрабатываем только ПЕРВЫЙ граф...")
 
-    for graph_idx in graphs_to_process:
-        graph = graphs[graph_idx]
-        routes = all_routes[graph_idx]
+    if only_graphs is not None:
+        only_graphs = set(only_graphs)
+        graphs_to_process = [idx for idx in graphs_to_process if idx in only_graphs]
+        print(f"Пересобираются только изменившиеся графы: {graphs_to_process}")
 
-        print(f"\n=== ОБРАБОТКА ГРАФА {graph_idx + 1} ===")
-        print(f"Размер графа: {graph.shape}")
-        print(f"Количество машин в графе: {len(routes)}")
+    if workers == 0:
+        workers = os.cpu_count() or 1
 
-        graph_dir = os.path.join(output_dir, f"graph_{graph_idx}")
-        if not os.path.exists(graph_dir):
-            os.makedirs(graph_dir)
+    if workers > 1:
+        _save_traffic_circuits_parallel(source, graphs_to_process, output_dir, workers, chunk_size, options)
+    else:
+        converter = UnifiedCircuitConverter()
+
+        for graph_idx in graphs_to_process:
+            graph = source.graph(graph_idx)
+            routes = source.routes(graph_idx)
+
+            print(f"\n=== ОБРАБОТКА ГРАФА {graph_idx + 1} ===")
+            print(f"Размер графа: {graph.shape}")
+            print(f"Количество машин в графе: {len(routes)}")
+
+            graph_dir = os.path.join(output_dir, f"graph_{graph_idx}")
+            if not os.path.exists(graph_dir):
+                os.makedirs(graph_dir)
+
+            _generate_car_payloads(graph, routes, graph_dir, 0, len(routes), converter, **options)
+            if options.get("fuse_gates"):
+                print(converter.fusion_report())
 
-        optimizer = ImprovedQuantumTrafficOptimizer(graph)
-        current_traffic = np.zeros_like(graph)
+    print(f"\nВсе схемы успешно сохранены в директорию: {output_dir}")
 
+def _generate_car_payloads(graph, routes, graph_dir, car_start, car_end, converter, incremental_angles=False,
+                           use_qiskit=False, payload_format="pretty", compress=False, fuse_gates=False,
+                           verbose=True):
+    """
+    Payload'ы машин car_start..car_end-1 одного графа. Трафик от предыдущих машин
+    восстанавливается по их маршрутам, поэтому куски графа независимы друг от друга.
+    Машина учитывается в трафике, даже если её payload не удалось собрать: иначе
+    последовательный запуск и запуск кусками (workers > 1) давали бы разный трафик.
+    Возвращает количество сохранённых payload'ов.
+    """
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    current_traffic = np.zeros_like(graph)
+
+    for start, end in routes[:car_start]:
+        if start < len(current_traffic) and end < len(current_traffic):
+            current_traffic[start, end] += 1
+            current_traffic[end, start] += 1
+
+    traffic_angles = optimizer.incremental_angles(current_traffic) if incremental_angles else None
+
+    if verbose:
         print(f"Используется бинарное кодирование: {optimizer.n_qubits_per_node} кубитов на вершину")
         print(f"Общее количество кубитов: {optimizer.total_qubits}")
 
-        for car_idx, route in enumerate(routes):
-            start, end = route[0], route[1]
+    written = 0
+    for car_idx in range(car_start, car_end):
+        start, end = routes[car_idx][0], routes[car_idx][1]
+        if verbose:
             print(f"--- Машина {car_idx + 1}: {start} → {end} ---")
 
-            try:
+        try:
+            layer_angles = traffic_angles.layer_angles(end, 4) if traffic_angles else None
+
+            # Сохраняем полный payload для API
+            api_filename = payload_filename(graph_dir, car_idx, compress)
+            if use_qiskit or optimizer.total_qubits == 0:
                 # Используем улучшенную схему
                 qc_enhanced = optimizer.create_enhanced_circuit(
                     start=start,
                     end=end,
                     current_traffic=current_traffic,
-                    p=4
+                    p=4,
+                    layer_angles=layer_angles
                 )
 
                 # # Сохраняем в формате для загрузки
                 # circuit_filename = os.path.join(graph_dir, f"circuit_car_{car_idx}.json")
                 # circuit_json = converter.convert_circuit(qc_enhanced, circuit_filename)
 
-                # Сохраняем полный payload для API
-                api_filename = os.path.join(graph_dir, f"api_payload_car_{car_idx}.json")
-                api_payload = converter.create_api_payload(qc_enhanced, shots=1024)
+                api_payload = converter.create_api_payload(qc_enhanced, shots=1024, fuse=fuse_gates)
+            else:
+                # Та же схема, payload собирается прямо из углов
+                api_payload = optimizer.create_enhanced_payload(
+                    converter, start, end, current_traffic, p=4, layer_angles=layer_angles, shots=1024,
+                    fuse=fuse_gates
+                )
+
+            # Payload с тем же содержимым, форматом и сжатием уже лежит на диске - не перезаписываем
+            remove_other_variant(api_filename)
+            if payload_is_current(api_filename, api_payload["contentHash"], payload_format, compress):
+                if verbose:
+                    print(f"API payload не изменился: {api_filename}")
+            else:
+                write_payload(api_filename, api_payload, payload_format, compress)
+                if verbose:
+                    print(f"API payload сохранен: {api_filename}")
+            written += 1
+
+        except Exception as e:
+            print(f"Ошибка при обработке машины {car_idx}: {e}")
+
+        # Обновляем трафик (так же, как при восстановлении по маршрутам выше)
+        if start < len(current_traffic) and end < len(current_traffic):
+            current_traffic[start, end] += 1
+            current_traffic[end, start] += 1
+            if traffic_angles:
+                traffic_angles.add_car(start, end)
+
+    return written
+
+# Состояние процесса пула: источник графов и конвертер (шаблоны payload кэшируются на процесс)
+_worker_source = None
+_worker_converter = None
+
+def _init_circuit_worker(source):
+    global _worker_source, _worker_converter
+    _worker_source = source
+    _worker_converter = UnifiedCircuitConverter()
+
+def _circuit_worker_task(task):
+    """Задача пула: кусок машин одного графа. Payload'ы пишутся прямо из процесса пула"""
+    graph_idx, car_start, car_end, graph_dir, options = task
+    started = time.perf_counter()
+    written = _generate_car_payloads(
+        _worker_source.graph(graph_idx), _worker_source.routes(graph_idx), graph_dir,
+        car_start, car_end, _worker_converter, verbose=False, **options
+    )
+    fusion = _worker_converter.fusion_report() if options.get("fuse_gates") else None
+    return graph_idx, car_start, car_end, written, time.perf_counter() - started, fusion
+
+def _save_traffic_circuits_parallel(source, graphs_to_process, output_dir, workers, chunk_size, options):
+    """Графы (и куски машин больших графов) обрабатываются пулом процессов"""
+    tasks = []
+    for graph_idx in graphs_to_process:
+        graph_dir = os.path.join(output_dir, f"graph_{graph_idx}")
+        if not os.path.exists(graph_dir):
+            os.makedirs(graph_dir)
+
+        n_cars = source.n_routes(graph_idx)
+        for car_start in range(0, n_cars, max(1, chunk_size)):
+            tasks.append((graph_idx, car_start, min(n_cars, car_start + chunk_size), graph_dir, options))
 
-                with open(api_filename, 'w', encoding='utf-8') as f:
-                    json.dump(api_payload, f, indent=2, ensure_ascii=False)
-                print(f"API payload сохранен: {api_filename}")
+    # Крупные куски отдаём первыми, чтобы хвост из одной длинной задачи не держал весь пул
+    tasks.sort(key=lambda task: task[2] - task[1], reverse=True)
+    total_cars = sum(task[2] - task[1] for task in tasks)
 
-                # Обновляем трафик
-                if start < len(current_traffic) and end < len(current_traffic):
-                    current_traffic[start, end] += 1
-                    current_traffic[end, start] += 1
+    print(f"Параллельная генерация: {workers} процессов, {len(tasks)} задач, {total_cars} машин")
+    started = time.perf_counter()
+    done_cars = 0
+    written_total = 0
+    busy_time = 0.0
 
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_circuit_worker,
+                             initargs=(source,)) as pool:
+        futures = [pool.submit(_circuit_worker_task, task) for task in tasks]
+        for future in as_completed(futures):
+            try:
+                graph_idx, car_start, car_end, written, elapsed, fusion = future.result()
             except Exception as e:
-                print(f"Ошибка при обработке машины {car_idx}: {e}")
+                print(f"✗ Ошибка в процессе пула: {e}")
                 continue
 
-    print(f"\nВсе схемы успешно сохранены в директорию: {output_dir}")
+            done_cars += car_end - car_start
+            written_total += written
+            busy_time += elapsed
+            print(f"✓ Граф {graph_idx + 1}: машины {car_start + 1}-{car_end} "
+                  f"({written} payload, {elapsed:.1f} с) | всего {done_cars}/{total_cars}")
+            if fusion:
+                print(f"  {fusion}")
+
+    wall_time = time.perf_counter() - started
+    print(f"Сохранено payload: {written_total}/{total_cars} за {wall_time:.1f} с "
+          f"(суммарно в процессах {busy_time:.1f} с, ускорение {busy_time / max(wall_time, 1e-9):.1f}x)")
 
 # Вспомогательные функции для загрузки данных
 def load_graphs_from_file(filename):
@@ -555,6 +1185,16 @@ def test_quantum_nondeterminism():
     print("Разные запуски будут давать разные распределения (квантовая природа сохранена)")
     print("НО распределение будет более 'пикообразным' благодаря улучшениям")
 
+# Инкрементальный расчёт углов (IncrementalTrafficAngles): быстрее, но углы отличаются от точных на ~1e-13
+USE_INCREMENTAL_ANGLES = os.environ.get("QUANT_INCREMENTAL_ANGLES", "0") == "1"
+
+# Формат payload на диске (pretty / compact / shared, см. payload_io) и сжатие в .json.gz
+PAYLOAD_FORMAT = os.environ.get("QUANT_PAYLOAD_FORMAT", "pretty")
+COMPRESS_PAYLOADS = os.environ.get("QUANT_PAYLOAD_COMPRESS", "0") == "1"
+
+# Число процессов генерации схем (1 - последовательно, 0 - по числу ядер)
+CIRCUIT_WORKERS = int(os.environ.get("QUANT_CIRCUIT_WORKERS", "1"))
+
 if __name__ == "__main__":
     print("=== УЛУЧШЕННАЯ ГЕНЕРАЦИЯ СХЕМ ДЛЯ API ===")
     print("Особенности:")
@@ -565,8 +1205,12 @@ if __name__ == "__main__":
 
     test_quantum_nondeterminism()
 
-    save_traffic_circuits_from_files(
-        "G_set.txt",
-        "routes.txt",
+    save_traffic_circuits_from_store(
+        GRAPH_STORE_FILE,
         process_all_graphs=True,
+        only_graphs=dirty_graphs(),
+        incremental_angles=USE_INCREMENTAL_ANGLES,
+        payload_format=PAYLOAD_FORMAT,
+        compress=COMPRESS_PAYLOADS,
+        workers=CIRCUIT_WORKERS,
     )
\ No newline at end of file
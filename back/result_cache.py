@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import numpy as np
+from payload_io import iter_angle_types
+
+
+# Кэш результатов по содержимому схемы.
+#
+# contentHash payload'а строится из двух частей: отпечатка структуры
+# (гейты, их id и положения, params с обнулёнными углами) и числовых углов.
+# id гейтов выводятся из положения гейта в схеме, а не из uuid, поэтому
+# одинаковые схемы дают одинаковый хэш при любом перезапуске. Шаблон payload
+# считает отпечаток структуры один раз, а на машину хэширует только углы.
+#
+# Кэш хранит гистограмму измерений (ответ API в формате Result_*.json)
+# в result_cache/<первые 2 символа хэша>/<хэш>.json; тот же формат читает app.js.
+
+RESULT_CACHE_DIR = "result_cache"
+
+
+def structure_digest(payload):
+    """Отпечаток структуры payload без числовых углов"""
+    slots = [type_item
+             for element in payload["elementsObject"].values() if element.get("params")
+             for type_item in iter_angle_types(element["params"])]
+    angles = [type_item["data"] for type_item in slots]
+
+    for type_item in slots:
+        type_item["data"] = 0
+    try:
+        body = json.dumps([payload["elementsObject"], payload["actualHistoryMap"]],
+                          sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    finally:
+        for type_item, angle in zip(slots, angles):
+            type_item["data"] = angle
+
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=16).digest(), angles
+
+
+def combine_content_hash(digest, angles, launch):
+    """contentHash: отпечаток структуры + углы (float64) + число запусков"""
+    h = hashlib.blake2b(digest, digest_size=16)
+    h.update(np.asarray(angles, dtype=np.float64).tobytes())
+    h.update(np.int64(launch).tobytes())
+    return h.hexdigest()
+
+
+def payload_content_hash(payload):
+    """Детерминированный хэш содержимого payload"""
+    digest, angles = structure_digest(payload)
+    return combine_content_hash(digest, angles, payload["launch"])
+
+
+class ResultCache:
+    """Гистограммы измерений на диске по contentHash payload'а"""
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}.json")
+
+    def __contains__(self, content_hash):
+        return bool(content_hash) and os.path.exists(self._path(content_hash))
+
+    def get(self, content_hash):
+        """Сохранённый результат или None"""
+        if not content_hash:
+            return None
+        try:
+            with open(self._path(content_hash), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, content_hash, result):
+        if not content_hash:
+            return
+        path = self._path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, separators=(',', ':'))
+        os.replace(tmp_file, path)
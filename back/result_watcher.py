@@ -0,0 +1,251 @@
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import time
+
+
+# Отслеживание прихода результатов машин без периодического glob.
+#
+# Постпроцессор ждёт, пока в results/graph_k/ появятся Result_*.json для всех машин
+# графа. Вместо пересканирования всех папок каждые несколько секунд наблюдатель
+# держит в памяти множество пришедших файлов по каждому графу и узнаёт о новых
+# файлах от ядра (inotify через ctypes): граф отдаётся на постобработку сразу,
+# как только записан результат его последней машины.
+#   app.js пишет файл на месте          -> IN_CLOSE_WRITE
+#   write_result / write_result_data    -> запись во .tmp и os.replace -> IN_MOVED_TO
+# Где inotify недоступен (не Linux, исчерпан лимит watch'ей) или выключен
+# (QUANT_RESULT_WATCHER=poll), работает опрос: каждые poll_interval секунд
+# проверяется mtime папок графов, и перечитываются только изменившиеся папки.
+
+USE_INOTIFY = os.environ.get("QUANT_RESULT_WATCHER", "inotify") != "poll"
+
+_GRAPH_DIR_RE = re.compile(r'^graph_(\d+)$')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Папка results: появление папок graph_k
+_ROOT_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+# Папка графа: дописанные, переименованные и удалённые файлы
+_GRAPH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_result_file(name):
+    return name.startswith("Result_") and name.endswith(".json")
+
+
+def graph_index(name):
+    """Номер графа по имени папки graph_k (None для прочих имён)"""
+    match = _GRAPH_DIR_RE.match(name)
+    return int(match.group(1)) if match else None
+
+
+class Inotify:
+    """Минимальная обёртка над inotify(7) через ctypes"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify недоступен в libc")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self, timeout):
+        """События за время ожидания не дольше timeout: список (wd, mask, имя)"""
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        events = []
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + name_len].rstrip(b'\0')
+                offset += name_len
+                events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class ResultWatcher:
+    """
+    Счётчики пришедших результатов по графам.
+    expected_counts - {номер графа: число машин}; wait() возвращает графы, у которых
+    есть результаты всех машин и которые изменились с прошлого вызова.
+    """
+
+    def __init__(self, results_folder, expected_counts, poll_interval=5, use_inotify=USE_INOTIFY):
+        self.results_folder = results_folder
+        self.expected_counts = dict(expected_counts)
+        self.poll_interval = poll_interval
+        self.arrived = {}
+        self._dirty = set()
+        self._watches = {}
+        self._watched = set()
+        self._dir_mtimes = {}
+        self._inotify = None
+
+        os.makedirs(results_folder, exist_ok=True)
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+                self._watches[self._inotify.add_watch(results_folder, _ROOT_MASK)] = None
+            except (OSError, AttributeError) as e:
+                print(f"⚠ inotify недоступен ({e}), используется опрос папок")
+                self._close_inotify()
+        self.backend = "inotify" if self._inotify else "polling"
+
+        self._scan_root()
+        # Первый wait() отдаёт все уже готовые графы
+        self._dirty = set(self.arrived)
+
+    def count(self, graph_idx):
+        return len(self.arrived.get(graph_idx, ()))
+
+    def is_complete(self, graph_idx):
+        expected = self.expected_counts.get(graph_idx)
+        return expected is not None and self.count(graph_idx) >= expected
+
+    def wait(self, timeout):
+        """
+        Ждёт не дольше timeout секунд, пока какой-нибудь граф не станет готов.
+        Возвращает множество готовых изменившихся графов (пустое - по таймауту).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            ready = {idx for idx in self._dirty if self.is_complete(idx)}
+            self._dirty.clear()
+            remaining = deadline - time.monotonic()
+            if ready or remaining <= 0:
+                return ready
+            if self._inotify:
+                self._handle_events(self._inotify.read_events(remaining))
+            else:
+                time.sleep(min(self.poll_interval, remaining))
+                self._scan_root()
+
+    def close(self):
+        self._close_inotify()
+
+    def _close_inotify(self):
+        if self._inotify:
+            self._inotify.close()
+        self._inotify = None
+        self._watches = {}
+        self._watched = set()
+
+    def _scan_root(self):
+        """Находит папки графов; при опросе перечитывает только папки с изменившимся mtime"""
+        try:
+            entries = [entry for entry in os.scandir(self.results_folder) if entry.is_dir()]
+        except OSError:
+            return
+        for entry in entries:
+            idx = graph_index(entry.name)
+            if idx is None:
+                continue
+            if self._inotify:
+                if idx not in self._watched:
+                    self._watch_graph(idx, entry.path)
+                continue
+            try:
+                mtime = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            if self._dir_mtimes.get(idx) != mtime:
+                self._dir_mtimes[idx] = mtime
+                self._scan_graph(idx, entry.path)
+
+    def _watch_graph(self, idx, path):
+        try:
+            self._watches[self._inotify.add_watch(path, _GRAPH_MASK)] = idx
+            self._watched.add(idx)
+        except OSError as e:
+            # Например, исчерпан fs.inotify.max_user_watches - переходим на опрос
+            print(f"⚠ Не удалось подписаться на {path} ({e}), используется опрос папок")
+            self._close_inotify()
+            self.backend = "polling"
+        # Файлы, записанные до подписки, учитываются сканированием
+        self._scan_graph(idx, path)
+
+    def _scan_graph(self, idx, path):
+        try:
+            names = {name for name in os.listdir(path) if is_result_file(name)}
+        except OSError:
+            names = set()
+        if names != self.arrived.get(idx):
+            self.arrived[idx] = names
+            self._dirty.add(idx)
+
+    def _handle_events(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Очередь событий переполнена - состояние восстанавливается сканированием
+                for idx in list(self._watched):
+                    self._scan_graph(idx, os.path.join(self.results_folder, f"graph_{idx}"))
+                self._scan_root()
+                continue
+            if wd not in self._watches:
+                continue
+            idx = self._watches[wd]
+
+            if idx is None:
+                new_idx = graph_index(name)
+                if mask & IN_ISDIR and new_idx is not None and new_idx not in self._watched:
+                    self._watch_graph(new_idx, os.path.join(self.results_folder, name))
+                if not self._inotify:
+                    return
+                continue
+
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # Папка графа удалена или перемещена
+                self._watches.pop(wd, None)
+                self._watched.discard(idx)
+                self.arrived.pop(idx, None)
+                self._dirty.discard(idx)
+                continue
+            if not is_result_file(name):
+                continue
+            names = self.arrived.setdefault(idx, set())
+            if mask & (IN_MOVED_FROM | IN_DELETE):
+                names.discard(name)
+            else:
+                # Новый или перезаписанный результат - граф изменился
+                names.add(name)
+                self._dirty.add(idx)
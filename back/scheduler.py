@@ -0,0 +1,72 @@
+import math
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# Планирование работы по графам: сначала самые дорогие (LPT, longest processing time first).
+#
+# Стоимость графа оценивается по числу машин и ширине схем. Отправка схем
+# раскладывается на элементы "машина" в общей очереди: воркеры берут следующий
+# элемент, как только освободятся, поэтому ни один слот не простаивает, пока есть
+# работа, а крупные графы, поставленные первыми, не остаются хвостом в конце.
+# Постобработка графа неделима, поэтому графы раздаются пулу процессов в порядке
+# убывания стоимости - жадное LPT-расписание (не хуже 4/3 оптимального makespan).
+
+POSTPROCESS_WORKERS = int(os.environ.get("QUANT_POSTPROCESS_WORKERS", "1"))
+
+# Постоянная часть стоимости машины (сетевой запрос, разбор ответа) в единицах "кубит"
+CAR_OVERHEAD = 8
+
+
+def submission_cost(n_cars, n_qubits):
+    """Оценка стоимости отправки схем графа: машины x (накладные расходы + ширина схемы)"""
+    return n_cars * (CAR_OVERHEAD + n_qubits)
+
+
+def postprocess_cost(n_cars, n_nodes):
+    """Оценка стоимости постобработки графа: жадное построение и ремонт путей по машинам"""
+    n_qubits = max(1, math.ceil(math.log2(max(2, n_nodes))))
+    return n_cars * (CAR_OVERHEAD + n_nodes + n_qubits)
+
+
+def lpt_order(costs):
+    """Ключи словаря costs по убыванию стоимости (при равенстве - по возрастанию ключа)"""
+    return sorted(costs, key=lambda key: (-costs[key], key))
+
+
+def schedule_items(items_by_group, costs):
+    """
+    Плоская очередь элементов: группы (графы) в порядке LPT, внутри группы - исходный порядок.
+    items_by_group - {группа: [элементы]}, costs - {группа: стоимость}.
+    """
+    return [item for group in lpt_order(costs) for item in items_by_group[group]]
+
+
+def run_lpt_pool(tasks, costs, worker, workers=POSTPROCESS_WORKERS):
+    """
+    Выполняет worker(*tasks[key]) для всех ключей в порядке LPT.
+    workers <= 1 - последовательно в этом процессе; иначе - общий пул процессов,
+    в который задачи отправляются от дорогих к дешёвым. Возвращает {ключ: результат};
+    исключение задачи попадает в результат вместо значения.
+    """
+    order = lpt_order(costs)
+    results = {}
+    if workers <= 1:
+        for key in order:
+            try:
+                results[key] = worker(*tasks[key])
+            except Exception as e:
+                traceback.print_exc()
+                results[key] = e
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(worker, *tasks[key]): key for key in order}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = e
+    return results
@@ -8,6 +8,15 @@ import time
 # Константа - максимальное количество файлов
 MAX_FILES_COUNT = 1
 
+# Моделировать схемы локально (local_simulator.py) вместо отправки в удалённый API через app.js
+USE_LOCAL_SIMULATOR = os.environ.get("QUANT_LOCAL_SIMULATOR", "0") == "1"
+
+# Упаковывать схемы нескольких машин в один запрос к API (payload_packing.py); только для app.js
+USE_PAYLOAD_PACKING = os.environ.get("QUANT_PACK_CARS", "0") == "1"
+
+# Отправлять схемы асинхронным submitter.py в этом же процессе вместо app.js
+USE_ASYNC_SUBMITTER = os.environ.get("QUANT_ASYNC_SUBMIT", "0") == "1"
+
 def count_result_files():
     """
     Подсчитывает количество файлов с паттерном post_processed_routes_graph_*.json в директории results
@@ -66,9 +75,14 @@ def monitor_and_terminate(processes_to_monitor, check_interval=5):
         time.sleep(check_interval)
 
 
-def run_scripts():
+def run_scripts(use_local_simulator=USE_LOCAL_SIMULATOR, use_payload_packing=USE_PAYLOAD_PACKING,
+                use_async_submitter=USE_ASYNC_SUBMITTER):
     """
-    Функция для последовательного запуска четырёх Python скриптов и одного JS скрипта
+    Функция для последовательного запуска четырёх Python скриптов и одного JS скрипта.
+    use_local_simulator - вместо app.js схемы моделируются локально (без сети)
+    use_payload_packing - app.js отправляет упакованные схемы нескольких машин,
+    а payload_packing.py раскладывает их результаты по машинам
+    use_async_submitter - вместо app.js схемы отправляет submitter.py в этом процессе
     """
     
     # Пути к скриптам
@@ -77,6 +91,24 @@ def run_scripts():
     python_script_3 = "p_quntun.py"
     python_script_4 = "finily_csv.py"
     js_script = "app.js"
+    simulator_script = "local_simulator.py"
+    packing_script = "payload_packing.py"
+    use_payload_packing = use_payload_packing and not use_local_simulator
+    process3 = process4 = process_js = process_packing = None
+    
+    submitter = None
+    if use_async_submitter and not use_local_simulator:
+        # aiohttp и учётные данные API проверяются до запуска дочерних процессов:
+        # иначе p_quntun.py и finily_csv.py остались бы работать без отправки схем
+        try:
+            from submitter import QuantumSubmitter
+            if use_payload_packing:
+                submitter = QuantumSubmitter("input_packed", "results_packed")
+            else:
+                submitter = QuantumSubmitter("input", "results")
+        except (ImportError, ValueError) as e:
+            print(f"\n✗ Асинхронная отправка недоступна: {e}")
+            return False
     
     try:
         # Запуск первых двух Python скриптов последовательно
@@ -104,6 +136,19 @@ def run_scripts():
             print(f"Вывод: {result2.stdout}")
         print()
         
+        if use_local_simulator:
+            print(f"Запуск {simulator_script} (локальное моделирование вместо {js_script})...")
+            result_sim = subprocess.run(
+                [sys.executable, simulator_script],
+                check=True,
+                capture_output=True,
+                text=True
+            )
+            print(f"✓ {simulator_script} выполнен успешно")
+            if result_sim.stdout:
+                print(f"Вывод: {result_sim.stdout}")
+            print()
+        
         # Запуск скриптов 3, 4 и JS с мониторингом
         print(f"Запуск {python_script_3} (с мониторингом)...")
         process3 = subprocess.Popen(
@@ -121,16 +166,48 @@ def run_scripts():
             text=True
         )
         
-        print(f"Запуск {js_script} (с мониторингом)...")
-        process_js = subprocess.Popen(
-            ["node", js_script],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        js_env = None
+        if use_payload_packing:
+            # Упаковка должна закончиться до отправки: иначе отправка найдёт пустой input_packed
+            print(f"Запуск {packing_script} (упаковка схем)...")
+            result_packing = subprocess.run(
+                [sys.executable, packing_script],
+                check=True,
+                capture_output=True,
+                text=True,
+                env={**os.environ, "QUANT_PACK_STAGE": "pack"}
+            )
+            print(f"✓ {packing_script} (упаковка) выполнен успешно")
+            if result_packing.stdout:
+                print(f"Вывод: {result_packing.stdout}")
+            print()
+            
+            print(f"Запуск {packing_script} (раскладка результатов, с мониторингом)...")
+            process_packing = subprocess.Popen(
+                [sys.executable, packing_script],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                env={**os.environ, "QUANT_PACK_STAGE": "unpack"}
+            )
+            js_env = {**os.environ, "QUANT_INPUT_DIR": "input_packed", "QUANT_RESULTS_DIR": "results_packed"}
+        
+        if submitter is not None:
+            print("Асинхронная отправка схем (submitter.py)...")
+            submitter.run_sync()
+            print()
+        elif not use_local_simulator:
+            print(f"Запуск {js_script} (с мониторингом)...")
+            process_js = subprocess.Popen(
+                ["node", js_script],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                env=js_env
+            )
         
         # Список процессов для мониторинга
-        monitored_processes = [process3, process4, process_js]
+        monitored_processes = [p for p in (process3, process4, process_js, process_packing) if p is not None]
         
         print("\n📊 Запущен мониторинг количества файлов...")
         print(f"Лимит: {MAX_FILES_COUNT} файлов\n")
@@ -141,7 +218,8 @@ def run_scripts():
         # Получение результатов завершённых процессов
         stdout3, stderr3 = process3.communicate()
         stdout4, stderr4 = process4.communicate()
-        stdout_js, stderr_js = process_js.communicate()
+        stdout_js, stderr_js = process_js.communicate() if process_js else ("", "")
+        stdout_packing, stderr_packing = process_packing.communicate() if process_packing else ("", "")
         
         print("\n--- Результаты выполнения ---")
         
@@ -165,7 +243,10 @@ def run_scripts():
             print(f"Ошибки: {stderr4}")
         print()
         
-        if process_js.returncode == 0:
+        if process_js is None:
+            source = "локальным симулятором" if use_local_simulator else "submitter.py"
+            print(f"✓ {js_script} не запускался: результаты получены {source}")
+        elif process_js.returncode == 0:
             print(f"✓ {js_script} завершён успешно")
         else:
             print(f"⚠ {js_script} завершён с кодом {process_js.returncode}")
@@ -174,6 +255,17 @@ def run_scripts():
         if stderr_js:
             print(f"Ошибки: {stderr_js}")
         
+        if process_packing is not None:
+            print()
+            if process_packing.returncode == 0:
+                print(f"✓ {packing_script} завершён успешно")
+            else:
+                print(f"⚠ {packing_script} завершён с кодом {process_packing.returncode}")
+            if stdout_packing:
+                print(f"Вывод: {stdout_packing}")
+            if stderr_packing:
+                print(f"Ошибки: {stderr_packing}")
+        
         print("\n✓ Все скрипты завершены!")
         return True
         
@@ -188,12 +280,16 @@ def run_scripts():
     except KeyboardInterrupt:
         print("\n\n⚠ Получен сигнал прерывания (Ctrl+C)")
         print("Завершаем все процессы...")
-        for p in [process3, process4, process_js]:
-            if p.poll() is None:
+        for p in [process3, process4, process_js, process_packing]:
+            if p is not None and p.poll() is None:
                 p.terminate()
         return False
     except Exception as e:
         print(f"\n✗ Неожиданная ошибка: {e}")
+        print("Завершаем все процессы...")
+        for p in [process3, process4, process_js, process_packing]:
+            if p is not None and p.poll() is None:
+                p.terminate()
         return False
 
 
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import time
+
+
+# Журнал отправленных payload'ов (замена processed_files.json).
+#
+# Файл results/submission_journal.jsonl - только дозапись, по строке на отправку:
+#   {"k": "graph_0/api_payload_car_5.json.gz", "c": <contentHash payload>, "r": <хэш результата>}
+# Строки сбрасываются на диск (fsync) пачками: каждые sync_every записей или
+# sync_interval секунд. При сбое теряется не больше последней пачки - эти схемы
+# просто отправятся повторно (и, скорее всего, возьмутся из result_cache).
+# При старте журнал проигрывается за один проход; оборванная последняя строка
+# отрезается. Когда повторных записей становится много, журнал сжимается
+# (по строке на ключ) через временный файл. Тот же формат пишет app.js.
+# Payload считается отправленным, только если его Result_*.json на месте;
+# при пересборке графов (ingest_manifest.apply_ingest) их записи удаляются
+# из журнала, а записи переехавших графов переименовываются (rewrite_journal).
+
+JOURNAL_FILE = "submission_journal.jsonl"
+LEGACY_PROCESSED_FILES = "processed_files.json"
+
+
+def result_digest(text):
+    """Хэш результата - по тексту сохранённого Result_*.json"""
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    return hashlib.sha256(text).hexdigest()[:32]
+
+
+class SubmissionJournal:
+    """Отправленные payload'ы: ключ "graph_k/файл" -> (contentHash, хэш результата)"""
+
+    def __init__(self, results_dir="results", sync_every=64, sync_interval=1.0, compact_ratio=2.0,
+                 min_compact_lines=1024):
+        self.results_dir = results_dir
+        self.path = os.path.join(results_dir, JOURNAL_FILE)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_ratio = compact_ratio
+        self.min_compact_lines = min_compact_lines
+        self.entries = {}
+        self._lines = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._file = None
+
+        os.makedirs(results_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            self._replay()
+        else:
+            self._migrate_legacy()
+        if self._needs_compaction():
+            self.compact()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _replay(self):
+        """Проигрывает журнал; оборванный хвост (сбой посреди записи) отрезается"""
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["k"]] = (entry.get("c"), entry.get("r"))
+                except (ValueError, KeyError, TypeError):
+                    break
+                valid_size += len(line)
+                self._lines += 1
+
+        if valid_size < os.path.getsize(self.path):
+            print(f"⚠ Журнал {self.path}: отброшен оборванный хвост после {self._lines} записей")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def _migrate_legacy(self):
+        """Переносит историю из processed_files.json (у старых записей нет хэшей)"""
+        legacy_path = os.path.join(self.results_dir, LEGACY_PROCESSED_FILES)
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                files = json.load(f).get("files", [])
+        except (OSError, ValueError):
+            return
+        for key in files:
+            self.entries[key] = (None, None)
+        self._write_compacted()
+        print(f"✓ Журнал отправок создан из {LEGACY_PROCESSED_FILES}: {len(files)} записей")
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def is_done(self, key, content_hash=None, result_path=None):
+        """
+        Отправлен ли payload. Если известен его contentHash, а в журнале записан другой,
+        payload с тех пор изменился и должен быть отправлен заново. Если задан result_path,
+        без файла результата payload тоже отправляется заново.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if result_path is not None and not os.path.exists(result_path):
+            return False
+        return content_hash is None or entry[0] is None or entry[0] == content_hash
+
+    def record(self, key, content_hash=None, result_hash=None):
+        self.entries[key] = (content_hash, result_hash)
+        self._file.write(json.dumps({"k": key, "c": content_hash, "r": result_hash},
+                                    separators=(',', ':'), ensure_ascii=False) + "\n")
+        self._lines += 1
+        self._pending += 1
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+            # Повторные отправки копят устаревшие строки - время от времени журнал сжимается
+            if self._needs_compaction():
+                self.compact()
+
+    def sync(self):
+        """Сбрасывает накопленные записи на диск"""
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _needs_compaction(self):
+        return self._lines >= self.min_compact_lines and self._lines > self.compact_ratio * len(self.entries)
+
+    def _write_compacted(self):
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for key, (content_hash, result_hash) in self.entries.items():
+                f.write(json.dumps({"k": key, "c": content_hash, "r": result_hash},
+                                   separators=(',', ':'), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+        self._lines = len(self.entries)
+
+    def compact(self):
+        """Переписывает журнал по строке на ключ (атомарно, через временный файл)"""
+        reopen = self._file is not None
+        if reopen:
+            self.sync()
+            self._file.close()
+        self._write_compacted()
+        if reopen:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self.sync()
+        if self._needs_compaction():
+            self.compact()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def rewrite_journal(results_dir, rename_key):
+    """
+    Переписывает ключи журнала results_dir: rename_key(ключ) возвращает новый ключ
+    или None - запись удаляется. Возвращает число изменённых и удалённых записей.
+    """
+    if not os.path.exists(os.path.join(results_dir, JOURNAL_FILE)):
+        return 0
+    with SubmissionJournal(results_dir) as journal:
+        entries = {}
+        changed = 0
+        for key, value in journal.entries.items():
+            new_key = rename_key(key)
+            changed += new_key != key
+            if new_key is not None:
+                entries[new_key] = value
+        if changed:
+            journal.entries = entries
+            journal.compact()
+    return changed
+
+
+def prune_journal(results_dir, prefixes):
+    """
+    Удаляет из журнала results_dir записи, ключи которых начинаются с prefixes
+    (например, "graph_3/" для пересобираемого графа). Возвращает число удалённых записей.
+    """
+    prefixes = tuple(prefixes)
+    if not prefixes:
+        return 0
+    return rewrite_journal(results_dir, lambda key: None if key.startswith(prefixes) else key)
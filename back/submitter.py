@@ -0,0 +1,541 @@
+import asyncio
+import glob
+import math
+import json
+import os
+import random
+import re
+import time
+from collections import deque
+import aiohttp
+from adaptive_shots import ADAPTIVE_SHOTS, ShotPolicy, counts_to_result_data, merge_counts
+from local_simulator import result_filename
+from payload_io import is_payload_file, iter_wire_chunks, read_content_hash, read_payload
+from payload_packing import read_manifest
+from result_cache import RESULT_CACHE_DIR, ResultCache
+from scheduler import schedule_items, submission_cost
+from submission_journal import SubmissionJournal, result_digest
+
+
+# Асинхронная отправка схем в API (замена последовательной отправки app.js).
+#
+# Все запросы идут через одну aiohttp-сессию с пулом соединений. Вместо
+# фиксированных пауз между файлами темп задаёт token bucket: rate запросов
+# в секунду с запасом burst. Число запросов в полёте подбирается само (AIMD,
+# см. AdaptiveConcurrency), таймаут запроса - по наблюдаемым задержкам.
+# Временные ошибки (сеть, таймаут, 429, 5xx) повторяются с экспоненциальной
+# задержкой и случайным разбросом (full jitter), Retry-After сервера учитывается.
+#
+# В адаптивном режиме (adaptive_shots.py) схема запускается партиями, пока самая частая
+# битовая строка не отделится от второй, а не сразу launch раз.
+#
+# Результаты пишутся в тот же Result_graph_k_car_j.json, что и у app.js, история
+# отправленных файлов - в журнал results/submission_journal.jsonl (submission_journal.py),
+# кэш - в result_cache.
+
+API_URL = os.environ.get("QUANT_API_URL", "https://mireatom.mirea.ru/kraniki/circuit/api")
+# Учётные данные API - только из окружения
+API_USER = os.environ.get("QUANT_API_USER")
+API_PASSWORD = os.environ.get("QUANT_API_PASSWORD")
+
+DEFAULT_CONCURRENCY = int(os.environ.get("QUANT_SUBMIT_CONCURRENCY", "8"))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("QUANT_SUBMIT_MAX_CONCURRENCY", "64"))
+DEFAULT_RATE = float(os.environ.get("QUANT_SUBMIT_RATE", "5"))
+# Целевой p95 задержки ответа, секунды: выше него окно запросов уменьшается
+DEFAULT_TARGET_P95 = float(os.environ.get("QUANT_SUBMIT_TARGET_P95", "5"))
+SUBMITTER_STATS = "submitter_stats.json"
+
+_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Ограничитель темпа: rate токенов в секунду, не больше burst накопленных"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        # При rate <= 0 токены не пополняются, а при burst < 1 их никогда не хватит на запрос
+        if not self.rate > 0:
+            raise ValueError(f"Темп запросов должен быть больше нуля: {rate}")
+        if self.burst < 1:
+            raise ValueError(f"Запас токенов burst должен быть не меньше 1: {burst}")
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # Под замком ожидающие обслуживаются по очереди, без гонки за один токен
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD-окно одновременных запросов.
+    Пока окно заполнено, p95 задержки не выше target_p95 и доля ошибок не выше
+    target_error_rate, окно растёт на 1 за "оборот" окна (+1/window на успешный ответ).
+    Таймаут, 429 или 5xx, а также p95 выше цели уменьшают окно в decrease_factor раз,
+    не чаще раза за cooldown (одна волна ошибок - одно уменьшение).
+    После уменьшения накопленные задержки сбрасываются: они описывают прежнее окно,
+    и p95 оценивается заново, как только наберётся min_samples ответов.
+    Таймаут запроса - timeout_factor * p95, в пределах [min_timeout, max_timeout].
+    """
+
+    def __init__(self, initial=DEFAULT_CONCURRENCY, min_window=1, max_window=DEFAULT_MAX_CONCURRENCY,
+                 target_p95=DEFAULT_TARGET_P95, target_error_rate=0.05, decrease_factor=0.5, cooldown=None,
+                 sample_size=200, min_samples=20, initial_timeout=15.0, timeout_factor=4.0, min_timeout=5.0,
+                 max_timeout=60.0):
+        self.window = float(min(max(initial, min_window), max_window))
+        self.min_window = min_window
+        self.max_window = max_window
+        self.target_p95 = target_p95
+        self.target_error_rate = target_error_rate
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.initial_timeout = initial_timeout
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.inflight = 0
+        self.increases = 0
+        self.decreases = 0
+        self.events = deque(maxlen=50)
+        self._latencies = deque(maxlen=sample_size)
+        self._errors = deque(maxlen=sample_size)
+        self._last_decrease = -math.inf
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self):
+        return max(self.min_window, int(self.window))
+
+    def percentile(self, q):
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(math.ceil(q / 100 * len(ordered))) - 1)]
+
+    def error_rate(self):
+        return sum(self._errors) / len(self._errors) if self._errors else 0.0
+
+    def _sampled_p95(self):
+        """p95 задержки, если ответов достаточно для оценки; иначе None"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        return self.percentile(95)
+
+    def request_timeout(self):
+        """Таймаут очередного запроса; до накопления статистики - initial_timeout"""
+        p95 = self._sampled_p95()
+        if p95 is None:
+            return self.initial_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.timeout_factor * p95))
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.inflight < self.limit)
+            self.inflight += 1
+
+    async def release(self, latency=None, congestion=None):
+        """
+        latency - время ответа сервера (None, если ответа не было);
+        congestion - причина перегрузки (таймаут, 429, 5xx) или None.
+        """
+        async with self._condition:
+            window_full = self.inflight >= self.limit
+            self.inflight -= 1
+            self._errors.append(congestion is not None)
+            if latency is not None and congestion is None:
+                self._latencies.append(latency)
+
+            p95 = self._sampled_p95()
+            if congestion is not None:
+                self._decrease(congestion)
+            elif p95 is not None and p95 > self.target_p95:
+                self._decrease(f"p95 {p95:.2f} с > {self.target_p95} с")
+            elif window_full and self.error_rate() <= self.target_error_rate and self.window < self.max_window:
+                self.window = min(self.max_window, self.window + 1 / self.window)
+                self.increases += 1
+            self._condition.notify_all()
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        cooldown = self.cooldown if self.cooldown is not None else max(1.0, self.percentile(50) or 0.0)
+        if now - self._last_decrease < cooldown or self.window <= self.min_window:
+            return
+        old_window = self.window
+        self.window = max(float(self.min_window), self.window * self.decrease_factor)
+        self._last_decrease = now
+        self.decreases += 1
+        self.events.append({
+            "time": time.strftime("%H:%M:%S"),
+            "reason": reason,
+            "window": [round(old_window, 2), round(self.window, 2)],
+            "p95": self.percentile(95),
+            "error_rate": round(self.error_rate(), 3)
+        })
+        # Задержки прежнего окна не должны уменьшать новое окно повторно
+        self._latencies.clear()
+        print(f"⚠ Окно запросов {old_window:.1f} -> {self.window:.1f}: {reason}")
+
+    def snapshot(self):
+        return {
+            "window": round(self.window, 2),
+            "inflight": self.inflight,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "error_rate": round(self.error_rate(), 3),
+            "timeout": self.request_timeout(),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "events": list(self.events)
+        }
+
+
+class SubmissionError(Exception):
+    """
+    Ошибка запроса; retryable - имеет ли смысл повторить (это же признак перегрузки API),
+    latency - через сколько пришёл ответ сервера (None - ответа не было).
+    """
+
+    def __init__(self, message, retryable=False, retry_after=None, latency=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.latency = latency
+
+
+def parse_api_response(data):
+    """Ответ API -> формат Result_*.json (как в app.js processFile)"""
+    if not isinstance(data, dict):
+        raise SubmissionError("Неизвестный формат ответа от сервера")
+    if isinstance(data.get("data"), list):
+        return data
+    if data.get("status") is True and isinstance(data.get("data"), dict):
+        return {"data": [{"bitstring": bitstring, "value": value} for bitstring, value in data["data"].items()]}
+    raise SubmissionError("Неизвестный формат ответа от сервера")
+
+
+def write_result_data(path, result_data):
+    """Пишет Result_*.json (как JSON.stringify(..., null, 2) в app.js); возвращает хэш результата"""
+    text = json.dumps(result_data, indent=2)
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_file, path)
+    return result_digest(text)
+
+
+def _graph_number(folder):
+    match = re.search(r'graph_(\d+)', folder)
+    return int(match.group(1)) if match else -1
+
+
+class QuantumSubmitter:
+    """Асинхронная отправка payload'ов из input/graph_k в API с ограничением темпа"""
+
+    def __init__(self, input_dir="input", results_dir="results", concurrency=DEFAULT_CONCURRENCY,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, rate=DEFAULT_RATE, burst=None, max_retries=5,
+                 backoff_base=0.5, backoff_cap=30.0, compress_body=False, cache_dir=RESULT_CACHE_DIR,
+                 api_url=API_URL, user=API_USER, password=API_PASSWORD, report_interval=10.0,
+                 adaptive_shots=ADAPTIVE_SHOTS, **window_options):
+        """
+        concurrency - начальное окно, max_concurrency - его предел; window_options - в AdaptiveConcurrency.
+        adaptive_shots - True (ShotPolicy по умолчанию), ShotPolicy или False (сразу launch запусков).
+        """
+        self.input_dir = input_dir
+        self.results_dir = results_dir
+        self.concurrency = concurrency
+        self.max_concurrency = max(concurrency, max_concurrency)
+        self.window_options = window_options
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.compress_body = compress_body
+        self.cache = ResultCache(cache_dir)
+        self.api_url = api_url
+        if not user or not password:
+            raise ValueError("Не заданы учётные данные API: задайте переменные окружения "
+                             "QUANT_API_USER и QUANT_API_PASSWORD")
+        self.auth = aiohttp.BasicAuth(user, password)
+        self.journal = None
+        self.shot_policy = ShotPolicy() if adaptive_shots is True else (adaptive_shots or None)
+        self.stats = {"sent": 0, "cached": 0, "failed": 0, "retries": 0, "shots": 0, "shots_saved": 0}
+        self.controller = None
+        self._packing = {}
+
+    def pending_jobs(self):
+        """
+        (папка графа, файл payload) ещё не отправленных схем. Графы идут от самых дорогих
+        (машины x ширина схемы) к дешёвым, см. scheduler; воркеры разбирают машины из общей очереди.
+        Payload, изменившийся после отправки (другой contentHash) или потерявший Result_*.json,
+        отправляется заново.
+        """
+        jobs_by_graph = {}
+        costs = {}
+        graph_folders = sorted(
+            (folder for folder in glob.glob(os.path.join(self.input_dir, "graph_*")) if os.path.isdir(folder)),
+            key=_graph_number
+        )
+        for folder in graph_folders:
+            graph_folder = os.path.basename(folder)
+            jobs = []
+            for payload_file in sorted(name for name in os.listdir(folder) if is_payload_file(name)):
+                key = f"{graph_folder}/{payload_file}"
+                result_path = os.path.join(self.results_dir, graph_folder, result_filename(graph_folder, payload_file))
+                if not self.journal.is_done(key, read_content_hash(os.path.join(folder, payload_file)), result_path):
+                    jobs.append((graph_folder, payload_file))
+            if jobs:
+                # Ширина схем графа одинакова - достаточно первого payload'а
+                n_qubits = len(read_payload(os.path.join(folder, jobs[0][1]))["actualHistoryMap"])
+                # Ключ - номер графа: при равной стоимости graph_2 идёт раньше graph_10
+                jobs_by_graph[_graph_number(folder)] = jobs
+                costs[_graph_number(folder)] = submission_cost(len(jobs), n_qubits)
+        return schedule_items(jobs_by_graph, costs)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _wire_body(self, payload_path, launch=None):
+        """
+        Фабрика тела запроса: каждый вызов даёт новый асинхронный поток кусков iter_wire_chunks
+        (для повтора запроса нужен новый поток). aiohttp отправляет куски по мере готовности,
+        не собирая тело в памяти целиком.
+        """
+        async def body():
+            for chunk in iter_wire_chunks(payload_path, compress=self.compress_body, launch=launch):
+                yield chunk
+        return body
+
+    async def _post(self, session, body):
+        """Один запрос в окне контроллера; body - фабрика тела (см. _wire_body)"""
+        headers = {"Content-Type": "application/json"}
+        if self.compress_body:
+            headers["Content-Encoding"] = "gzip"
+        timeout = aiohttp.ClientTimeout(total=self.controller.request_timeout())
+
+        await self.controller.acquire()
+        start_time = time.monotonic()
+        try:
+            async with session.post(self.api_url, data=body(), headers=headers, auth=self.auth,
+                                    timeout=timeout) as response:
+                latency = time.monotonic() - start_time
+                if response.status in _RETRY_STATUSES:
+                    retry_after = response.headers.get("Retry-After")
+                    raise SubmissionError(
+                        f"HTTP статус: {response.status}", retryable=True,
+                        retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                        latency=latency
+                    )
+                if response.status >= 400:
+                    raise SubmissionError(f"HTTP статус: {response.status}, {await response.text()}",
+                                          latency=latency)
+                data = await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            await self.controller.release(congestion=f"таймаут {timeout.total:.1f} с")
+            raise SubmissionError(f"Таймаут запроса ({timeout.total:.1f} с)", retryable=True)
+        except aiohttp.ClientError as e:
+            await self.controller.release(congestion="сетевая ошибка")
+            raise SubmissionError(f"Сетевая ошибка: {e!r}", retryable=True)
+        except SubmissionError as e:
+            await self.controller.release(e.latency, congestion=str(e) if e.retryable else None)
+            raise
+        except BaseException:
+            await self.controller.release()
+            raise
+
+        await self.controller.release(latency)
+        return parse_api_response(data)
+
+    async def _submit(self, session, bucket, graph_folder, payload_file):
+        payload_path = os.path.join(self.input_dir, graph_folder, payload_file)
+        graph_results_dir = os.path.join(self.results_dir, graph_folder)
+        os.makedirs(graph_results_dir, exist_ok=True)
+        output_path = os.path.join(graph_results_dir, result_filename(graph_folder, payload_file))
+
+        # Такая же схема уже запускалась - берём гистограмму из кэша без обращения к API
+        content_hash = read_content_hash(payload_path)
+        cache_key = self.shot_policy.cache_key(content_hash) if self.shot_policy else content_hash
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._record(graph_folder, payload_file, content_hash, write_result_data(output_path, cached))
+            self.stats["cached"] += 1
+            return True
+
+        if self.shot_policy is None:
+            body = self._wire_body(payload_path)
+            result_data = await self._request(session, bucket, body, graph_folder, payload_file)
+        else:
+            result_data = await self._submit_adaptive(session, bucket, payload_path, graph_folder, payload_file)
+        if result_data is None:
+            return False
+
+        result_hash = write_result_data(output_path, result_data)
+        self.cache.put(cache_key, result_data)
+        self._record(graph_folder, payload_file, content_hash, result_hash)
+        self.stats["sent"] += 1
+        return True
+
+    def _packing_layout(self, graph_folder, payload_file):
+        """(раскладка машин, число кубитов) упакованного payload'а или None"""
+        if graph_folder not in self._packing:
+            graph_dir = os.path.join(self.input_dir, graph_folder)
+            self._packing[graph_folder] = {
+                entry["file"]: ([(car["offset"], car["n_qubits"]) for car in entry["cars"]], entry["qubits"])
+                for entry in read_manifest(graph_dir)
+            }
+        return self._packing[graph_folder].get(payload_file)
+
+    async def _submit_adaptive(self, session, bucket, payload_path, graph_folder, payload_file):
+        """Запуски партиями до разделения лидера и второго места (или до предела запусков)"""
+        policy = self.shot_policy
+        launch = read_payload(payload_path)["launch"]
+        packing = self._packing_layout(graph_folder, payload_file)
+
+        counts = {}
+        shots_done = 0
+        batch = policy.first_batch(launch)
+        while batch:
+            body = self._wire_body(payload_path, launch=batch)
+            result_data = await self._request(session, bucket, body, graph_folder, payload_file)
+            if result_data is None:
+                return None
+            merge_counts(counts, result_data)
+            shots_done += batch
+            decided = policy.is_decided(counts) if packing is None else policy.is_decided_packed(counts, *packing)
+            batch = policy.next_batch(shots_done, launch, decided)
+
+        self.stats["shots"] += shots_done
+        self.stats["shots_saved"] += max(0, launch - shots_done)
+        return counts_to_result_data(counts)
+
+    async def _request(self, session, bucket, body, graph_folder, payload_file):
+        """Запрос с повторами временных ошибок; None - запрос не удался"""
+        for attempt in range(self.max_retries + 1):
+            # Сначала токен темпа, затем место в окне: ожидание токена не занимает окно
+            await bucket.acquire()
+            try:
+                result_data = await self._post(session, body)
+            except SubmissionError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    print(f"✗ [{graph_folder}] Ошибка в файле {payload_file}: {e}")
+                    self.stats["failed"] += 1
+                    return None
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, e.retry_after))
+                continue
+            return result_data
+        return None
+
+    def _record(self, graph_folder, payload_file, content_hash, result_hash):
+        self.journal.record(f"{graph_folder}/{payload_file}", content_hash, result_hash)
+
+    async def _worker(self, queue, session, bucket):
+        while True:
+            job = await queue.get()
+            try:
+                await self._submit(session, bucket, *job)
+            except Exception as e:
+                print(f"✗ [{job[0]}] Ошибка в файле {job[1]}: {e}")
+                self.stats["failed"] += 1
+            finally:
+                queue.task_done()
+
+    def snapshot(self):
+        """Счётчики отправки и состояние окна: почему изменилась пропускная способность"""
+        return dict(self.stats, controller=self.controller.snapshot() if self.controller else None)
+
+    def _write_snapshot(self):
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = os.path.join(self.results_dir, SUBMITTER_STATS)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            state = self.controller.snapshot()
+            p95 = f"{state['p95']:.2f} с" if state["p95"] is not None else "-"
+            self.journal.sync()
+            print(f"📈 Окно {state['window']:.1f} (в полёте {state['inflight']}), p95 {p95}, "
+                  f"ошибок {state['error_rate']:.1%}, отправлено {self.stats['sent']}, повторов {self.stats['retries']}")
+            self._write_snapshot()
+
+    async def run(self):
+        """Отправляет все ожидающие схемы; возвращает сводку stats"""
+        self.journal = SubmissionJournal(self.results_dir)
+        try:
+            return await self._run()
+        finally:
+            self.journal.close()
+
+    def run_sync(self):
+        """Синхронный запуск run() (из start_all.py и run_submission)"""
+        return asyncio.run(self.run())
+
+    async def _run(self):
+        jobs = self.pending_jobs()
+        if not jobs:
+            print("Нет новых схем для отправки")
+            return dict(self.stats)
+
+        self.controller = AdaptiveConcurrency(self.concurrency, max_window=self.max_concurrency,
+                                              **self.window_options)
+        print(f"Отправка {len(jobs)} схем: окно {self.concurrency}..{self.max_concurrency} запросов, "
+              f"до {self.rate} запросов/с")
+        start_time = time.time()
+
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        bucket = TokenBucket(self.rate, self.burst)
+        # Воркеров столько, сколько допускает предел окна; в полёт их пропускает контроллер
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [asyncio.create_task(self._worker(queue, session, bucket)) for _ in range(self.max_concurrency)]
+            tasks.append(asyncio.create_task(self._reporter()))
+            try:
+                await queue.join()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self._write_snapshot()
+
+        elapsed = time.time() - start_time
+        stats = dict(self.snapshot(), elapsed=elapsed)
+        controller = stats["controller"]
+        print(f"✓ Отправлено: {stats['sent']}, из кэша: {stats['cached']}, ошибок: {stats['failed']}, "
+              f"повторов: {stats['retries']} за {elapsed:.1f} с "
+              f"({stats['sent'] / elapsed if elapsed > 0 else 0:.2f} запросов/с), "
+              f"итоговое окно {controller['window']:.1f}, уменьшений окна: {controller['decreases']}")
+        if self.shot_policy is not None:
+            print(f"✓ Адаптивные запуски: {stats['shots']} shots, сэкономлено {stats['shots_saved']}")
+        return stats
+
+
+def run_submission(input_dir="input", results_dir="results", **options):
+    """Синхронная обёртка для запуска из start_all.py и из командной строки"""
+    return QuantumSubmitter(input_dir, results_dir, **options).run_sync()
+
+
+if __name__ == "__main__":
+    run_submission(os.environ.get("QUANT_INPUT_DIR", "input"), os.environ.get("QUANT_RESULTS_DIR", "results"))
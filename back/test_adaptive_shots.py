@@ -0,0 +1,67 @@
+import numpy as np
+from adaptive_shots import ShotPolicy, counts_to_result_data, merge_counts
+
+
+def test_merge_counts_keeps_first_seen_order():
+    counts = merge_counts({}, {"data": [{"bitstring": "01", "value": 3}, {"bitstring": "10", "value": 1}]})
+    merge_counts(counts, {"data": [{"bitstring": "11", "value": 2}, {"bitstring": "01", "value": 4}]})
+    assert counts_to_result_data(counts) == {"data": [{"bitstring": "01", "value": 7},
+                                                      {"bitstring": "10", "value": 1},
+                                                      {"bitstring": "11", "value": 2}]}
+
+
+def test_is_decided():
+    policy = ShotPolicy(initial_shots=100)
+    # Выборка меньше первой партии - решение не принимается
+    assert not policy.is_decided({"00": 50})
+    assert policy.is_decided({"00": 100})
+    assert policy.is_decided({"00": 90, "01": 10})
+    assert not policy.is_decided({"00": 55, "01": 45})
+    # Та же доля разрыва отделяется на большой выборке
+    assert policy.is_decided({"00": 5500, "01": 4500})
+
+
+def test_is_decided_packed_requires_every_car():
+    policy = ShotPolicy(initial_shots=100)
+    # Машина 0 - биты 0-1 (решена), машина 1 - биты 2-3 (два равных исхода)
+    counts = {"0011": 50, "1011": 50}
+    assert not policy.is_decided_packed(counts, [(0, 2), (2, 2)], 4)
+    assert policy.is_decided_packed(counts, [(0, 2)], 4)
+
+
+def test_batches_grow_until_cap():
+    policy = ShotPolicy(initial_shots=128, growth=2.0)
+    launch = 1024
+    batches = [policy.first_batch(launch)]
+    while batches[-1]:
+        batches.append(policy.next_batch(sum(batches), launch, decided=False))
+    assert batches == [128, 128, 256, 512, 0]
+    assert policy.next_batch(128, launch, decided=True) == 0
+
+    capped = ShotPolicy(initial_shots=128, max_shots=300)
+    assert capped.first_batch(launch) == 128
+    assert capped.next_batch(256, launch, decided=False) == 44
+    assert ShotPolicy(initial_shots=128).first_batch(64) == 64
+
+
+def test_adaptive_run_saves_shots_on_sharp_peak():
+    rng = np.random.default_rng(0)
+    policy = ShotPolicy()
+    probabilities = [0.7, 0.2, 0.1]
+    counts = {}
+    shots_done = 0
+    batch = policy.first_batch(1024)
+    while batch:
+        for bitstring, value in zip(["00", "01", "10"], rng.multinomial(batch, probabilities)):
+            counts[bitstring] = counts.get(bitstring, 0) + int(value)
+        shots_done += batch
+        batch = policy.next_batch(shots_done, 1024, policy.is_decided(counts))
+    assert shots_done < 1024
+    assert max(counts, key=counts.get) == "00"
+
+
+def test_cache_key_depends_on_policy():
+    assert ShotPolicy().cache_key(None) is None
+    assert ShotPolicy().cache_key("ab") == ShotPolicy().cache_key("ab")
+    assert ShotPolicy().cache_key("ab") != ShotPolicy(initial_shots=64).cache_key("ab")
+    assert ShotPolicy().cache_key("ab") != "ab"
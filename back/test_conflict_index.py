@@ -0,0 +1,138 @@
+import random
+from collections import defaultdict
+import numpy as np
+import pytest
+from conflict_index import ConflictIndex
+from p_quntun import BinaryQAOAPostProcessor
+
+
+# Эталон - прежний граф конфликтов conflict_repair: попарное пересечение рёбер всех путей,
+# узлы графа - (номер пути, путь), конфликт пары ищется перебором всех пар.
+
+def _path_edges(path):
+    return {(min(u, v), max(u, v)) for u, v in zip(path, path[1:])}
+
+
+def _build_conflict_adjacency(paths, capacity_matrix):
+    conf_adj = defaultdict(set)
+    for i, path_i in enumerate(paths):
+        for j, path_j in enumerate(paths):
+            if i == j:
+                continue
+            for u, v in _path_edges(path_i) & _path_edges(path_j):
+                if u < capacity_matrix.shape[0] and v < capacity_matrix.shape[1] and capacity_matrix[u, v] <= 1:
+                    conf_adj[(i, tuple(path_i))].add((j, tuple(path_j)))
+                    conf_adj[(j, tuple(path_j))].add((i, tuple(path_i)))
+    return conf_adj
+
+
+def _find_conflict_pairs(conf_adj, paths):
+    path_tuples = [tuple(path) for path in paths]
+    return [(i, j) for i, path_i in enumerate(path_tuples) for j, path_j in enumerate(path_tuples)
+            if i < j and (j, path_j) in conf_adj.get((i, path_i), set())]
+
+
+def _conflicts(conf_adj, paths, idx, path):
+    return sum((j, tuple(paths[j])) in conf_adj.get((idx, tuple(path)), set())
+               for j in range(len(paths)) if j != idx)
+
+
+class _BaselineRepair(BinaryQAOAPostProcessor):
+    """Прежний conflict_repair: альтернативы - копии путей, оценка - полным перебором"""
+
+    def conflict_repair(self, paths, traffic_matrix, capacity_matrix, lam_conflict=3.0):
+        repaired_paths = paths.copy()
+        conf_adj = _build_conflict_adjacency(paths, capacity_matrix)
+        for _ in range(100):
+            conflict_pairs = _find_conflict_pairs(conf_adj, repaired_paths)
+            if not conflict_pairs:
+                break
+            best_improvement = (float('inf'), None, None)
+            for idx in conflict_pairs[0]:
+                for alt_path in self._alternatives(repaired_paths[idx], capacity_matrix):
+                    improvement = (self.calculate_path_cost(alt_path) - self.calculate_path_cost(repaired_paths[idx])
+                                   + lam_conflict * (_conflicts(conf_adj, repaired_paths, idx, alt_path)
+                                                     - _conflicts(conf_adj, repaired_paths, idx, repaired_paths[idx])))
+                    if improvement < best_improvement[0]:
+                        best_improvement = (improvement, idx, alt_path)
+            if best_improvement[1] is None:
+                break
+            repaired_paths[best_improvement[1]] = best_improvement[2]
+        return repaired_paths
+
+    def _alternatives(self, path, capacity_matrix, n_alternatives=3):
+        alternatives = [path]
+        for i in range(1, len(path) - 1):
+            new_path = path[:i] + path[i + 1:]
+            if self.is_valid_path(new_path, capacity_matrix):
+                alternatives.append(new_path)
+            if len(alternatives) >= n_alternatives:
+                break
+        return alternatives
+
+
+def _random_case(seed, n=20, density=0.3, capacity=1):
+    rng = random.Random(seed)
+    matrix = np.full((n, n), np.inf)
+    np.fill_diagonal(matrix, 0.0)
+    for u in range(n):
+        for v in range(u + 1, n):
+            if rng.random() < density:
+                matrix[u, v] = matrix[v, u] = rng.uniform(0.1, 20)
+    capacity_matrix = np.where(matrix != np.inf, capacity, 0)
+
+    paths = []
+    for _ in range(rng.choice([5, 30, 60])):
+        path = [rng.randrange(n)]
+        while len(path) < rng.randint(2, 7):
+            neighbors = [v for v in range(n) if matrix[path[-1], v] != np.inf and v not in path]
+            if neighbors and rng.random() < 0.8:
+                path.append(rng.choice(neighbors))
+            else:
+                node = rng.randrange(n)
+                if node not in path:
+                    path.append(node)
+        paths.append(path)
+    return matrix, capacity_matrix, paths
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_index_matches_conflict_graph(seed):
+    matrix, capacity_matrix, paths = _random_case(seed)
+    processor = BinaryQAOAPostProcessor(matrix, matrix.shape[0], 5)
+    index = processor.build_conflict_index(paths, capacity_matrix)
+    conf_adj = _build_conflict_adjacency(paths, capacity_matrix)
+
+    current = [list(path) for path in paths]
+    rng = random.Random(seed)
+    for _ in range(len(paths) + 1):
+        pairs = _find_conflict_pairs(conf_adj, current)
+        assert index.first_pair() == (pairs[0] if pairs else None)
+        for idx, path in enumerate(current):
+            assert index.conflicts(idx, path) == _conflicts(conf_adj, current, idx, path)
+        if not pairs:
+            break
+        # Замена пути одной из конфликтующих пар: путь выходит из всех своих конфликтов
+        idx = rng.choice(pairs[0])
+        current[idx] = current[idx][:1] + current[idx][2:] if len(current[idx]) > 2 else current[idx][::-1]
+        index.replace(idx, current[idx])
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("capacity", [1, 2])
+def test_conflict_repair_matches_baseline(seed, capacity):
+    matrix, capacity_matrix, paths = _random_case(seed, capacity=capacity)
+    n_nodes = matrix.shape[0]
+    expected = _BaselineRepair(matrix, n_nodes, 5).conflict_repair(paths, None, capacity_matrix)
+    assert BinaryQAOAPostProcessor(matrix, n_nodes, 5).conflict_repair(paths, None, capacity_matrix) == expected
+
+
+def test_replace_with_original_path_keeps_conflicts():
+    index = ConflictIndex([[0, 1, 2], [1, 2, 3]], _path_edges)
+    assert index.first_pair() == (0, 1)
+    index.replace(0, [0, 1, 2])
+    assert index.first_pair() == (0, 1)
+    assert index.conflicts(1, [1, 2, 3]) == 1
+    index.replace(0, [0, 2])
+    assert index.first_pair() is None
+    assert index.conflicts(1, [1, 2, 3]) == 0
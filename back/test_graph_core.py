@@ -0,0 +1,67 @@
+import numpy as np
+from graph_core import TrafficGraph
+from graph_store import GraphStore, write_graph_store
+
+
+def _matrix():
+    inf = np.inf
+    return np.array([
+        [0.0, 2.0, inf, 5.0],
+        [2.0, 0.0, 1.5, inf],
+        [inf, 1.5, inf, 0.0],
+        [5.0, inf, 0.0, 0.0],
+    ])
+
+
+def _check_against_matrix(graph, matrix):
+    n = len(matrix)
+    assert graph.n_nodes == n
+    for u in range(n):
+        for v in range(n):
+            assert graph.weight(u, v) == matrix[u, v]
+            assert graph.has_edge(u, v) == (u != v and np.isfinite(matrix[u, v]))
+        # Соседи - конечные внедиагональные элементы строки по возрастанию номера
+        expected = [(v, matrix[u, v]) for v in range(n) if v != u and np.isfinite(matrix[u, v])]
+        assert graph.neighbor_list(u) == expected
+
+
+def test_from_matrix():
+    matrix = _matrix()
+    graph = TrafficGraph.from_matrix(matrix)
+    _check_against_matrix(graph, matrix)
+
+    rows, cols, weights = graph.upper_edges()
+    assert list(zip(rows.tolist(), cols.tolist(), weights.tolist())) == [(0, 1, 2.0), (0, 3, 5.0), (1, 2, 1.5),
+                                                                         (2, 3, 0.0)]
+
+
+def test_from_store_matches_from_matrix(tmp_path):
+    matrix = _matrix()
+    filename = str(tmp_path / "graph_store.bin")
+    write_graph_store(filename, [(0, matrix, [[0, 2]]), (1, matrix, [[0, 2]])], layout="dense")
+    write_graph_store(filename + ".csr", [(0, matrix, [[0, 2]])], layout="csr")
+
+    for store in (GraphStore(filename), GraphStore(filename + ".csr")):
+        graph = TrafficGraph.from_store(store, 0)
+        _check_against_matrix(graph, matrix)
+        np.testing.assert_array_equal(graph.indptr, TrafficGraph.from_matrix(matrix).indptr)
+
+
+def test_edge_ids_are_undirected():
+    graph = TrafficGraph.from_matrix(_matrix())
+    assert graph.n_undirected_edges == 4
+    ids = {graph.edge_id(u, v) for u, v in [(0, 1), (0, 3), (1, 2), (2, 3)]}
+    assert ids == set(range(4))
+    for u, v in [(0, 1), (0, 3), (1, 2), (2, 3)]:
+        assert graph.edge_id(u, v) == graph.edge_id(v, u)
+        edge = graph.edge_id(u, v)
+        assert (graph.edge_u[edge], graph.edge_v[edge]) == (min(u, v), max(u, v))
+    assert graph.edge_id(0, 2) == -1
+    assert graph.slot(0, 2) == -1
+
+
+def test_one_directional_edge_gets_an_id():
+    matrix = np.array([[0.0, 3.0], [np.inf, 0.0]])
+    graph = TrafficGraph.from_matrix(matrix)
+    assert graph.has_edge(0, 1) and not graph.has_edge(1, 0)
+    assert graph.edge_id(1, 0) == graph.edge_id(0, 1) == 0
@@ -0,0 +1,62 @@
+import ast
+import csv
+import math
+import numpy as np
+import pytest
+from graph_parser import iter_data_rows, parse_matrix, parse_routes
+
+
+def _eval_matrix(text):
+    """Прежний разбор prep_csv.py: eval с подменой inf на math.inf"""
+    return np.array(eval(text.replace('inf', 'math.inf'), {'math': math}), dtype=np.float64)
+
+
+@pytest.mark.parametrize("text", [
+    "[[0, 1.5], [1.5, 0]]",
+    "[[0.0, inf, 2], [inf, 0.0, 3e-2], [2, 0.03, 0]]",
+    "[[0, 1,], [1, 0,],]",
+    '"[[0, -7.25], [-7.25, 0]]"',
+    "[[ 0 ,1 ] ,\n [1, 0 ]]",
+])
+def test_matrix_matches_eval(text):
+    expected = _eval_matrix(text.strip('"'))
+    np.testing.assert_array_equal(parse_matrix(text), expected)
+
+
+def test_matrix_inf_aliases():
+    matrix = parse_matrix("[[0, math.inf], [None, 0]]")
+    assert np.isinf(matrix[0, 1]) and np.isinf(matrix[1, 0])
+
+
+@pytest.mark.parametrize("text", ["[]", "[[0, 1], [1]]", "[[0, 1, 2], [1, 0, 2]]"])
+def test_matrix_rejects_bad_shape(text):
+    with pytest.raises(ValueError):
+        parse_matrix(text)
+
+
+@pytest.mark.parametrize("text", ["[[0, 3], [2, 1]]", "[(0, 3), (2, 1)]", "[[0, 3.0], [2, 1],]", "[]"])
+def test_routes_match_literal_eval(text):
+    expected = np.array(ast.literal_eval(text), dtype=np.int32).reshape(-1, 2)
+    np.testing.assert_array_equal(parse_routes(text), expected)
+    assert parse_routes(text).dtype == np.int32
+
+
+@pytest.mark.parametrize("text", ["[[0, 3.5]]", "[[0, 1, 2]]", "[[0, inf]]"])
+def test_routes_reject_bad_values(text):
+    with pytest.raises(ValueError):
+        parse_routes(text)
+
+
+def test_iter_data_rows_skips_broken_rows(tmp_path, capsys):
+    input_csv = tmp_path / "data.csv"
+    with open(input_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["graph_index", "graph_matrix", "routes_start_end"])
+        writer.writerow(["3", "[[0, 1], [1, 0]]", "[[0, 1]]"])
+        writer.writerow(["4", "[[0, 1], [1]]", "[[0, 1]]"])
+        writer.writerow(["5", "[[0, inf], [inf, 0]]", "[]"])
+
+    rows = list(iter_data_rows(str(input_csv)))
+    assert [(row_num, graph_index) for row_num, graph_index, _, _ in rows] == [(1, 3), (3, 5)]
+    assert rows[1][3].shape == (0, 2)
+    assert "строки 2" in capsys.readouterr().out
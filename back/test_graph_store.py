@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from graph_store import GraphStore, GraphStoreWriter, is_graph_store, write_graph_store
+
+
+def _random_graph(rng, n, density):
+    """Симметричная матрица с inf вместо отсутствующих рёбер и нулевой диагональю"""
+    matrix = np.full((n, n), np.inf)
+    upper = np.triu(rng.random((n, n)) < density, k=1)
+    weights = rng.uniform(-20, 20, size=(n, n))
+    matrix[upper] = weights[upper]
+    matrix.T[upper] = weights[upper]
+    np.fill_diagonal(matrix, 0.0)
+    return matrix
+
+
+@pytest.mark.parametrize("layout", ["auto", "dense", "csr"])
+def test_round_trip(tmp_path, layout):
+    rng = np.random.default_rng(0)
+    records = [
+        (7, _random_graph(rng, 12, 0.9), [[0, 5], [3, 11]]),
+        (2, _random_graph(rng, 40, 0.05), [[1, 2], [4, 9], [10, 39]]),
+        (11, _random_graph(rng, 1, 1.0), np.zeros((0, 2), dtype=np.int32)),
+    ]
+    filename = str(tmp_path / "graph_store.bin")
+    assert write_graph_store(filename, records, layout=layout) == len(records)
+    assert is_graph_store(filename)
+
+    store = GraphStore(filename)
+    assert len(store) == len(records)
+    assert store.graph_labels == [7, 2, 11]
+    for k, (_, matrix, routes) in enumerate(records):
+        assert store.n_nodes(k) == matrix.shape[0]
+        np.testing.assert_array_equal(store.matrix(k), matrix)
+        assert store.route_list(k) == np.asarray(routes).reshape(-1, 2).tolist()
+        assert store.n_routes(k) == len(store.route_list(k))
+
+        indptr, indices, weights = store.csr(k)
+        rows, cols = np.nonzero(np.isfinite(matrix))
+        np.testing.assert_array_equal(np.repeat(np.arange(matrix.shape[0]), np.diff(indptr)), rows)
+        np.testing.assert_array_equal(indices, cols)
+        np.testing.assert_array_equal(weights, matrix[rows, cols])
+
+    if layout == "auto":
+        # Плотный граф - матрицей, разреженный - в CSR
+        assert not store.is_sparse(0)
+        assert store.is_sparse(1)
+
+
+def test_views_are_read_only(tmp_path):
+    filename = str(tmp_path / "graph_store.bin")
+    write_graph_store(filename, [(0, _random_graph(np.random.default_rng(1), 5, 1.0), [[0, 4]])], layout="dense")
+    store = GraphStore(filename)
+    with pytest.raises(ValueError):
+        store.matrix(0)[0, 1] = 1.0
+    with pytest.raises(ValueError):
+        store.routes(0)[0, 0] = 3
+
+
+def test_abort_keeps_previous_store(tmp_path):
+    filename = str(tmp_path / "graph_store.bin")
+    write_graph_store(filename, [(5, np.zeros((2, 2)), [[0, 1]])])
+
+    writer = GraphStoreWriter(filename)
+    writer.add(6, np.zeros((3, 3)), [[0, 2]])
+    writer.abort()
+
+    assert GraphStore(filename).graph_labels == [5]
+    assert [path.name for path in tmp_path.iterdir()] == ["graph_store.bin"]
+
+
+def test_rejects_non_square_matrix(tmp_path):
+    writer = GraphStoreWriter(str(tmp_path / "graph_store.bin"))
+    try:
+        with pytest.raises(ValueError):
+            writer.add(0, np.zeros((2, 3)), [])
+    finally:
+        writer.abort()
+
+
+def test_rejects_foreign_file(tmp_path):
+    filename = tmp_path / "G_set.txt"
+    filename.write_bytes(b"[[0, 1], [1, 0]]\n" * 8)
+    assert not is_graph_store(str(filename))
+    with pytest.raises(ValueError):
+        GraphStore(str(filename))
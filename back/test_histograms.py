@@ -0,0 +1,72 @@
+import json
+import numpy as np
+from histograms import GraphHistograms
+
+
+def _reference_top_k(counts, k):
+    """Прежний перебор словаря: по убыванию числа, при равенстве - порядок в файле"""
+    ranked = sorted(enumerate(counts.items()), key=lambda item: (-item[1][1], item[0]))
+    return [position for position, _ in ranked[:k]]
+
+
+def test_top_k_orders_ties_by_file_position():
+    counts_list = [
+        {"00": 5, "01": 7, "10": 7, "11": 1},
+        {},
+        {"11": 2},
+        {"10": 3, "00": 3, "01": 3},
+    ]
+    histograms = GraphHistograms.from_counts(counts_list, 2)
+
+    top = histograms.top_k(3)
+    assert top.shape == (4, 3)
+    offsets = histograms.offsets
+    for car_idx, counts in enumerate(counts_list):
+        expected = [offsets[car_idx] + position for position in _reference_top_k(counts, 3)]
+        expected += [-1] * (3 - len(expected))
+        assert top[car_idx].tolist() == expected
+
+    assert histograms.argmax().tolist() == [1, -1, 4, 5]
+
+
+def test_top_k_matches_reference_on_random_histograms():
+    rng = np.random.default_rng(0)
+    n_qubits = 4
+    counts_list = []
+    for _ in range(50):
+        outcomes = rng.permutation(1 << n_qubits)[:rng.integers(0, 10)]
+        counts_list.append({format(int(outcome), f"0{n_qubits}b"): int(rng.integers(1, 4)) for outcome in outcomes})
+    histograms = GraphHistograms.from_counts(counts_list, n_qubits)
+
+    top = histograms.top_k(4)
+    for car_idx, counts in enumerate(counts_list):
+        positions = [int(index - histograms.offsets[car_idx]) for index in top[car_idx] if index >= 0]
+        assert positions == _reference_top_k(counts, 4)
+        assert histograms.counts_dict(car_idx) == counts
+
+
+def test_marginals_and_totals():
+    histograms = GraphHistograms.from_counts([{"01": 3, "11": 1}, {}, {"10": 2}], 2)
+    assert histograms.totals().tolist() == [4, 0, 2]
+    # Кубит 0 - правый бит строки
+    np.testing.assert_allclose(histograms.marginals(), [[1.0, 0.25], [0.0, 0.0], [0.0, 1.0]])
+
+
+def test_from_result_files_keeps_order_and_reports_errors(tmp_path):
+    good = tmp_path / "Result_graph_0_car_0.json"
+    good.write_text(json.dumps({"data": [
+        {"bitstring": "10", "value": 1},
+        {"bitstring": "01", "value": 4},
+        {"bitstring": "10", "value": 6},
+    ]}))
+    broken = tmp_path / "Result_graph_0_car_1.json"
+    broken.write_text("{")
+
+    errors = []
+    histograms = GraphHistograms.from_result_files([str(good), str(broken)], 2,
+                                                   on_error=lambda path, error: errors.append(path))
+    assert errors == [str(broken)]
+    # Повторная строка: последнее значение на месте первой, как в словаре
+    assert histograms.counts_dict(0) == {"10": 6, "01": 4}
+    assert histograms.counts_dict(1) == {}
+    assert histograms.to_nodes(histograms.argmax(), 3).tolist() == [2, -1]
@@ -0,0 +1,144 @@
+import json
+import os
+import numpy as np
+import pytest
+from ingest_manifest import apply_ingest, clean_graph_labels, dirty_graphs, fingerprint_graph, load_manifest
+from submission_journal import SubmissionJournal
+
+
+def _fingerprint(seed):
+    rng = np.random.default_rng(seed)
+    return fingerprint_graph(rng.random((4, 4)), [[0, 3]])
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _ingest(records):
+    return apply_ingest(records, "ingest_manifest.json")
+
+
+def _make_artifacts(position, graph_index, tag):
+    """Артефакты графа на позиции position; tag - метка содержимого"""
+    os.makedirs(f"input/graph_{position}", exist_ok=True)
+    with open(f"input/graph_{position}/api_payload_car_0.json", 'w') as f:
+        f.write(tag)
+    os.makedirs(f"results/graph_{position}", exist_ok=True)
+    with open(f"results/graph_{position}/Result_graph_{position}_car_0.json", 'w') as f:
+        f.write(tag)
+    os.makedirs(f"input_packed/graph_{position}", exist_ok=True)
+    with open(f"input_packed/graph_{position}/packing_manifest.jsonl", 'w') as f:
+        f.write(json.dumps({"file": "api_payload_pack_0_ab.json.gz",
+                            "result": f"Result_graph_{position}_api_payload_pack_0_ab.json",
+                            "cars": [{"car": 0, "result": f"Result_graph_{position}_car_0.json"}]}) + "\n")
+    os.makedirs("post_processed_results", exist_ok=True)
+    with open(f"post_processed_results/post_processed_routes_graph_{position}.json", 'w') as f:
+        json.dump({"graph_index": position, "tag": tag}, f)
+    os.makedirs("visualised_qf", exist_ok=True)
+    with open(f"visualised_qf/graph_{graph_index}.png", 'w') as f:
+        f.write(tag)
+    with SubmissionJournal("results") as journal:
+        journal.record(f"graph_{position}/api_payload_car_0.json", tag, None)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_first_ingest_marks_everything_dirty(workdir):
+    records = [(10, _fingerprint(0)), (11, _fingerprint(1))]
+    assert _ingest(records) == [0, 1]
+    assert dirty_graphs("ingest_manifest.json") == [0, 1]
+    assert clean_graph_labels("ingest_manifest.json") == set()
+
+
+def test_unchanged_upload_reuses_everything(workdir):
+    records = [(10, _fingerprint(0)), (11, _fingerprint(1))]
+    _ingest(records)
+    for position, (graph_index, _) in enumerate(records):
+        _make_artifacts(position, graph_index, f"g{position}")
+
+    assert _ingest(records) == []
+    assert clean_graph_labels("ingest_manifest.json") == {10, 11}
+    assert _read("results/graph_1/Result_graph_1_car_0.json") == "g1"
+    assert _read("visualised_qf/graph_10.png") == "g0"
+
+
+def test_inserted_row_shifts_artifacts_instead_of_rebuilding(workdir):
+    records = [(10, _fingerprint(0)), (11, _fingerprint(1)), (12, _fingerprint(2))]
+    _ingest(records)
+    for position, (graph_index, _) in enumerate(records):
+        _make_artifacts(position, graph_index, f"g{graph_index}")
+
+    # Новая строка в начале data.csv: прежние графы сдвигаются на позицию ниже
+    assert _ingest([(9, _fingerprint(9))] + records) == [0]
+
+    assert not os.path.exists("input/graph_0")
+    assert not os.path.exists("post_processed_results/post_processed_routes_graph_0.json")
+    for position, graph_index in ((1, 10), (2, 11), (3, 12)):
+        assert _read(f"input/graph_{position}/api_payload_car_0.json") == f"g{graph_index}"
+        assert _read(f"results/graph_{position}/Result_graph_{position}_car_0.json") == f"g{graph_index}"
+        assert os.listdir(f"results/graph_{position}") == [f"Result_graph_{position}_car_0.json"]
+        with open(f"post_processed_results/post_processed_routes_graph_{position}.json") as f:
+            assert json.load(f) == {"graph_index": position, "tag": f"g{graph_index}"}
+        with open(f"input_packed/graph_{position}/packing_manifest.jsonl") as f:
+            entry = json.loads(f.readline())
+        assert entry["result"] == f"Result_graph_{position}_api_payload_pack_0_ab.json"
+        assert entry["cars"][0]["result"] == f"Result_graph_{position}_car_0.json"
+        assert _read(f"visualised_qf/graph_{graph_index}.png") == f"g{graph_index}"
+
+    with SubmissionJournal("results") as journal:
+        assert journal.entries == {
+            f"graph_{position}/api_payload_car_0.json": (f"g{graph_index}", None)
+            for position, graph_index in ((1, 10), (2, 11), (3, 12))
+        }
+    assert not any(name.endswith(".ingest_move") for name in os.listdir("input"))
+
+
+def test_swapped_rows_move_both_ways(workdir):
+    records = [(10, _fingerprint(0)), (11, _fingerprint(1))]
+    _ingest(records)
+    for position, (graph_index, _) in enumerate(records):
+        _make_artifacts(position, graph_index, f"g{graph_index}")
+
+    assert _ingest(records[::-1]) == []
+    assert _read("results/graph_0/Result_graph_0_car_0.json") == "g11"
+    assert _read("results/graph_1/Result_graph_1_car_0.json") == "g10"
+
+
+def test_changed_and_removed_rows(workdir):
+    records = [(10, _fingerprint(0)), (11, _fingerprint(1)), (12, _fingerprint(2))]
+    _ingest(records)
+    for position, (graph_index, _) in enumerate(records):
+        _make_artifacts(position, graph_index, f"g{graph_index}")
+
+    # Граф 11 изменился, граф 12 удалён
+    assert _ingest([(10, _fingerprint(0)), (11, _fingerprint(5))]) == [1]
+    assert os.path.exists("input/graph_0")
+    for position in (1, 2):
+        assert not os.path.exists(f"input/graph_{position}")
+        assert not os.path.exists(f"results/graph_{position}")
+        assert not os.path.exists(f"input_packed/graph_{position}")
+    assert not os.path.exists("visualised_qf/graph_11.png")
+    assert not os.path.exists("visualised_qf/graph_12.png")
+    with SubmissionJournal("results") as journal:
+        assert list(journal.entries) == ["graph_0/api_payload_car_0.json"]
+    assert load_manifest("ingest_manifest.json")["dirty"] == [1]
+
+
+def test_png_is_dropped_when_label_gets_another_graph(workdir):
+    graph_x, graph_y = _fingerprint(0), _fingerprint(1)
+    _ingest([(5, graph_x)])
+    _make_artifacts(0, 5, "x")
+
+    _ingest([(5, graph_y)])
+    assert not os.path.exists("visualised_qf/graph_5.png")
+    _make_artifacts(0, 5, "y")
+
+    # Граф X вернулся под тем же номером: PNG графа Y не переиспользуется
+    assert _ingest([(5, graph_x)]) == [0]
+    assert not os.path.exists("visualised_qf/graph_5.png")
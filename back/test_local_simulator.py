@@ -0,0 +1,142 @@
+import json
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Statevector
+from local_simulator import (circuit_schedule, measurement_probabilities, result_filename, run_local_simulation,
+                             schedule_signature, simulate_payloads, simulate_statevector, simulate_statevectors)
+from payload_io import payload_filename, write_payload
+from quant import ImprovedQuantumTrafficOptimizer, UnifiedCircuitConverter
+
+
+def _graph():
+    return np.array([
+        [0, 1, np.inf, 2, 4],
+        [1, 0, 1, np.inf, np.inf],
+        [np.inf, 1, 0, 3, 1],
+        [2, np.inf, 3, 0, np.inf],
+        [4, np.inf, 1, np.inf, 0]
+    ])
+
+
+def _qiskit_probabilities(qc):
+    return Statevector(qc.remove_final_measurements(inplace=False)).probabilities()
+
+
+@pytest.mark.parametrize("fuse", [False, True])
+def test_probabilities_match_qiskit(fuse):
+    graph = _graph()
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    converter = UnifiedCircuitConverter()
+    traffic = np.zeros_like(graph)
+    traffic[0, 1] = traffic[1, 0] = 3
+
+    for start, end in [(0, 2), (4, 3), (1, 1)]:
+        qc = optimizer.create_enhanced_circuit(start, end, traffic, p=4)
+        state, n_qubits, measured = simulate_statevector(converter.create_api_payload(qc, fuse=fuse))
+        assert measured == list(range(n_qubits))
+        np.testing.assert_allclose(measurement_probabilities(state, n_qubits, measured),
+                                   _qiskit_probabilities(qc), atol=1e-12)
+
+
+def test_controlled_gates_and_partial_measurement():
+    qc = QuantumCircuit(3, 2)
+    qc.h(0)
+    qc.ry(0.7, 2)
+    qc.cx(0, 1)
+    qc.measure([1, 2], [0, 1])
+
+    state, n_qubits, measured = simulate_statevector(UnifiedCircuitConverter().create_api_payload(qc))
+    assert measured == [1, 2]
+    # Исход k: бит 0 - кубит 1, бит 1 - кубит 2
+    expected = Statevector(qc.remove_final_measurements(inplace=False)).probabilities([1, 2])
+    np.testing.assert_allclose(measurement_probabilities(state, n_qubits, measured), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("graph_folder, payload_file, expected", [
+    ("graph_3", "api_payload_car_12.json", "Result_graph_3_car_12.json"),
+    ("graph_3", "api_payload_car_12.json.gz", "Result_graph_3_car_12.json"),
+    ("graph_0", "api_payload_pack_1_ab.json.gz", "Result_graph_0_api_payload_pack_1_ab.json"),
+    ("misc", "api_payload_car_2.json", "Result_api_payload_car_2.json"),
+])
+def test_result_filename(graph_folder, payload_file, expected):
+    assert result_filename(graph_folder, payload_file) == expected
+
+
+def test_run_local_simulation(tmp_path):
+    graph = _graph()
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    converter = UnifiedCircuitConverter()
+    graph_dir = tmp_path / "input" / "graph_2"
+    graph_dir.mkdir(parents=True)
+    write_payload(payload_filename(str(graph_dir), 0), optimizer.create_enhanced_payload(
+        converter, 0, 2, np.zeros_like(graph), p=4, shots=500))
+    write_payload(payload_filename(str(graph_dir), 1, compress=True), optimizer.create_enhanced_payload(
+        converter, 4, 3, np.zeros_like(graph), p=4, shots=300), "shared")
+
+    input_dir, results_dir = str(tmp_path / "input"), str(tmp_path / "results")
+    assert run_local_simulation(input_dir, results_dir, seed=1) == 2
+
+    for car, shots in ((0, 500), (1, 300)):
+        with open(tmp_path / "results" / "graph_2" / f"Result_graph_2_car_{car}.json") as f:
+            data = json.load(f)["data"]
+        assert sum(item["value"] for item in data) == shots
+        assert all(len(item["bitstring"]) == 3 for item in data)
+
+    # Готовые результаты не пересчитываются
+    assert run_local_simulation(input_dir, results_dir, seed=1) == 0
+    assert run_local_simulation(input_dir, results_dir, seed=1, overwrite=True) == 2
+
+
+def _car_payloads(shots=1024):
+    graph = _graph()
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    converter = UnifiedCircuitConverter()
+    traffic = np.zeros_like(graph)
+    payloads = []
+    for start, end in [(0, 2), (4, 3), (1, 1), (3, 0), (2, 4)]:
+        payloads.append(optimizer.create_enhanced_payload(converter, start, end, traffic, p=4, shots=shots))
+        traffic[start, end] += 1
+        traffic[end, start] += 1
+    return payloads
+
+
+def test_batched_states_match_single_simulation():
+    payloads = _car_payloads()
+    schedules = [circuit_schedule(data) for data in payloads]
+    signature = schedule_signature(schedules[0])
+    assert all(schedule_signature(schedule) == signature for schedule in schedules)
+
+    gate_angles = [np.array(angles).reshape(len(payloads), -1)
+                   for angles in zip(*[[angles for column in schedule[1] for _, _, angles in column]
+                                       for schedule in schedules])]
+    states = simulate_statevectors(signature, gate_angles, len(payloads))
+    for data, state in zip(payloads, states):
+        np.testing.assert_allclose(state, simulate_statevector(data)[0], atol=1e-14)
+
+
+def test_batch_chunks_and_mixed_shapes():
+    # Схемы разной формы группируются отдельно, результаты - в исходном порядке
+    qc = QuantumCircuit(2, 2)
+    qc.x(1)
+    qc.measure([0, 1], [0, 1])
+    deterministic = UnifiedCircuitConverter().create_api_payload(qc, shots=64)
+    payloads = _car_payloads(shots=200)
+    payloads.insert(2, deterministic)
+
+    # 8 амплитуд на пакет - по одной машине в куске
+    histograms = simulate_payloads(payloads, rng=np.random.default_rng(0), max_amplitudes=8)
+    assert histograms[2] == {"10": 64}
+    for idx, counts in enumerate(histograms):
+        if idx != 2:
+            assert sum(counts.values()) == 200
+            assert all(len(bitstring) == 3 for bitstring in counts)
+
+    # Пакетная выборка сходится к точным вероятностям каждой машины
+    data = payloads[0]
+    state, n_qubits, measured = simulate_statevector(data)
+    probabilities = measurement_probabilities(state, n_qubits, measured)
+    counts = simulate_payloads([data] * 4, shots=[50000] * 4, rng=np.random.default_rng(1))
+    for histogram in counts:
+        frequencies = [histogram.get(format(outcome, "03b"), 0) / 50000 for outcome in range(8)]
+        np.testing.assert_allclose(frequencies, probabilities, atol=0.01)
@@ -0,0 +1,87 @@
+import gzip
+import json
+import numpy as np
+import pytest
+from payload_io import (API_FIELDS, PAYLOAD_FORMATS, payload_filename, payload_is_current, read_content_hash,
+                        read_payload, read_payload_with_hash, remove_other_variant, write_payload)
+from quant import ImprovedQuantumTrafficOptimizer, UnifiedCircuitConverter
+
+
+@pytest.fixture(scope="module")
+def payload():
+    graph = np.array([
+        [0, 1, np.inf, 2],
+        [1, 0, 1, np.inf],
+        [np.inf, 1, 0, 3],
+        [2, np.inf, 3, 0]
+    ])
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    return optimizer.create_enhanced_payload(UnifiedCircuitConverter(), 0, 2, np.zeros_like(graph), p=4)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("fmt", PAYLOAD_FORMATS)
+def test_round_trip(tmp_path, payload, fmt, compress):
+    filename = payload_filename(str(tmp_path), 0, compress)
+    write_payload(filename, payload, fmt, compress)
+
+    expected = {key: payload[key] for key in API_FIELDS}
+    assert read_payload(filename) == expected
+    assert read_payload_with_hash(filename) == (expected, payload["contentHash"])
+    assert read_content_hash(filename) == payload["contentHash"]
+
+    with open(filename, 'rb') as f:
+        assert (f.read(2) == b'\x1f\x8b') == compress
+
+
+def test_pretty_matches_json_dump(tmp_path, payload):
+    filename = str(tmp_path / "api_payload_car_0.json")
+    write_payload(filename, payload, "pretty")
+    # Исходный формат json.dump(indent=2); contentHash - первым полем
+    expected = {"contentHash": payload["contentHash"], **{key: payload[key] for key in API_FIELDS}}
+    with open(filename, encoding='utf-8') as f:
+        assert f.read() == json.dumps(expected, indent=2, ensure_ascii=False)
+
+
+def test_shared_is_smaller_than_compact(tmp_path, payload):
+    sizes = {}
+    for fmt in PAYLOAD_FORMATS:
+        filename = str(tmp_path / f"{fmt}.json")
+        write_payload(filename, payload, fmt)
+        sizes[fmt] = (tmp_path / f"{fmt}.json").stat().st_size
+    assert sizes["shared"] < sizes["compact"] < sizes["pretty"]
+
+
+@pytest.mark.parametrize("fmt", PAYLOAD_FORMATS)
+def test_payload_is_current_checks_hash_format_and_compression(tmp_path, payload, fmt):
+    filename = payload_filename(str(tmp_path), 0, compress=True)
+    write_payload(filename, payload, fmt)
+
+    assert payload_is_current(filename, payload["contentHash"], fmt)
+    assert not payload_is_current(filename, "0" * 32, fmt)
+    assert not payload_is_current(filename, payload["contentHash"], fmt, compress=False)
+    for other in PAYLOAD_FORMATS:
+        if other != fmt:
+            assert not payload_is_current(filename, payload["contentHash"], other)
+    assert not payload_is_current(str(tmp_path / "missing.json"), payload["contentHash"], fmt)
+
+
+def test_payload_is_current_rejects_broken_file(tmp_path, payload):
+    filename = str(tmp_path / "api_payload_car_0.json.gz")
+    with open(filename, 'wb') as f:
+        f.write(gzip.compress(b'{"contentHash":"' + payload["contentHash"].encode() + b'"')[:12])
+    assert not payload_is_current(filename, payload["contentHash"], "compact")
+
+
+def test_remove_other_variant(tmp_path, payload):
+    plain = payload_filename(str(tmp_path), 0)
+    compressed = payload_filename(str(tmp_path), 0, compress=True)
+    write_payload(plain, payload)
+
+    assert remove_other_variant(compressed)
+    assert not (tmp_path / "api_payload_car_0.json").exists()
+    assert not remove_other_variant(compressed)
+
+    write_payload(compressed, payload)
+    assert remove_other_variant(plain)
+    assert not (tmp_path / "api_payload_car_0.json.gz").exists()
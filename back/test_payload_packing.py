@@ -0,0 +1,63 @@
+import random
+import pytest
+from payload_packing import demultiplex_counts, pack_payloads
+
+
+def test_demultiplex_splits_registers():
+    # Машина 0 - кубиты 0-1 (правые биты), машина 1 - кубиты 2-4
+    layout = [(0, 2), (2, 3)]
+    data = [
+        {"bitstring": "10101", "value": 3},
+        {"bitstring": "10110", "value": 2},
+        {"bitstring": "00001", "value": 5},
+    ]
+    car0, car1 = demultiplex_counts(data, layout, 5)
+    assert car0 == {"01": 8, "10": 2}
+    assert car1 == {"101": 5, "000": 5}
+
+
+def test_demultiplex_matches_bitwise_marginals():
+    rng = random.Random(0)
+    layout = [(0, 3), (3, 1), (4, 4)]
+    n_qubits = 8
+    joint = {}
+    for _ in range(200):
+        joint[rng.getrandbits(n_qubits)] = rng.randint(1, 50)
+    data = [{"bitstring": format(outcome, f"0{n_qubits}b"), "value": value} for outcome, value in joint.items()]
+
+    histograms = demultiplex_counts(data, layout, n_qubits)
+    for counts, (offset, width) in zip(histograms, layout):
+        expected = {}
+        for outcome, value in joint.items():
+            key = format((outcome >> offset) & ((1 << width) - 1), f"0{width}b")
+            expected[key] = expected.get(key, 0) + value
+        assert counts == expected
+        assert sum(counts.values()) == sum(joint.values())
+
+
+def test_demultiplex_rejects_wrong_width():
+    with pytest.raises(ValueError):
+        demultiplex_counts([{"bitstring": "0101", "value": 1}], [(0, 2), (2, 3)], 5)
+
+
+def _payload(n_qubits, launch=1000):
+    elements = {}
+    history = []
+    for qubit in range(n_qubits):
+        gate_id = f"h{qubit}"
+        elements[gate_id] = {"id": gate_id, "title": "H", "type": "params"}
+        history.append([gate_id])
+    return {"elementsObject": elements, "actualHistoryMap": history, "launch": launch}
+
+
+def test_pack_layout_matches_demultiplex():
+    packed, layout = pack_payloads([_payload(2), _payload(3), _payload(1)])
+    assert layout == [(0, 2), (2, 3), (5, 1)]
+    assert len(packed["actualHistoryMap"]) == 6
+    # id гейтов разных машин не пересекаются
+    assert len(packed["elementsObject"]) == 6
+
+
+def test_pack_rejects_mixed_launch():
+    with pytest.raises(ValueError):
+        pack_payloads([_payload(2, launch=1000), _payload(2, launch=500)])
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+from quant import ImprovedQuantumTrafficOptimizer, UnifiedCircuitConverter, save_traffic_circuits_from_files
+
+
+def _random_graph(rng, n, density):
+    matrix = np.full((n, n), np.inf)
+    upper = np.triu(rng.random((n, n)) < density, k=1)
+    weights = rng.uniform(-20, 20, size=(n, n))
+    matrix[upper] = weights[upper]
+    matrix.T[upper] = weights[upper]
+    np.fill_diagonal(matrix, 0.0)
+    return matrix
+
+
+def _random_traffic(rng, n):
+    traffic = np.zeros((n, n))
+    for start, end in rng.integers(0, n, size=(3 * n, 2)):
+        traffic[start, end] += 1
+        traffic[end, start] += 1
+    return traffic
+
+
+def _loop_layer_angles(optimizer, gamma, traffic, end, layer):
+    """Прежний поэлементный расчёт enhanced_cost_layer (до векторизации)"""
+    angles = [0.0] * optimizer.total_qubits
+
+    for i in range(optimizer.n_nodes):
+        for j in range(i + 1, optimizer.n_nodes):
+            if optimizer.J[i, j] != np.inf and optimizer.J[i, j] != 0:
+                base_weight = abs(optimizer.J_normalized[i, j])
+                traffic_cost = traffic[i, j] * optimizer.traffic_penalty
+                effective_strength = (base_weight * 2.0 + traffic_cost * 1.5) * gamma * 0.3
+
+                diff = i ^ j
+                for bit_pos in range(optimizer.n_qubits_per_node):
+                    if (diff >> bit_pos) & 1:
+                        angles[bit_pos] += effective_strength * (layer + 1)
+
+    if optimizer.n_qubits_per_node > 0:
+        end_binary = format(end, f'0{optimizer.n_qubits_per_node}b')
+        for qubit in range(min(optimizer.total_qubits, len(end_binary))):
+            if end_binary[-(qubit+1)] == '1':
+                angles[qubit] += gamma * 0.4
+
+    base_angle = gamma * (0.5 + 0.2 * layer)
+    for i in range(optimizer.total_qubits):
+        angles[i] += base_angle
+    return angles
+
+
+@pytest.mark.parametrize("n, density", [(2, 1.0), (5, 0.6), (13, 0.3), (32, 0.9)])
+def test_vectorized_angles_match_loop_bit_for_bit(n, density):
+    rng = np.random.default_rng(n)
+    graph = _random_graph(rng, n, density)
+    traffic = _random_traffic(rng, n)
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+
+    for end in range(n):
+        angles = optimizer.compute_layer_angles(traffic, end, 4)
+        for layer in range(4):
+            gamma = 0.5 + 0.2 * layer
+            assert angles[layer].tolist() == _loop_layer_angles(optimizer, gamma, traffic, end, layer)
+
+
+def test_incremental_angles_track_exact_angles():
+    rng = np.random.default_rng(7)
+    n = 32
+    graph = _random_graph(rng, n, 0.5)
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    traffic = np.zeros_like(graph)
+    incremental = optimizer.incremental_angles(traffic)
+
+    for start, end in rng.integers(0, n, size=(300, 2)).tolist():
+        exact = optimizer.compute_layer_angles(traffic, end, 4)
+        # Порядок суммирования другой: совпадение с точностью ~1e-13, а не бит в бит
+        np.testing.assert_allclose(incremental.layer_angles(end, 4), exact, rtol=1e-12, atol=1e-12)
+        if start != end:
+            traffic[start, end] += 1
+            traffic[end, start] += 1
+            incremental.add_car(start, end)
+
+
+@pytest.mark.parametrize("start, end", [(0, 2), (3, 1)])
+@pytest.mark.parametrize("fuse", [False, True])
+def test_direct_payload_matches_qiskit(start, end, fuse):
+    test_graph = np.array([
+        [0, 1, np.inf, 2],
+        [1, 0, 1, np.inf],
+        [np.inf, 1, 0, 3],
+        [2, np.inf, 3, 0]
+    ])
+    optimizer = ImprovedQuantumTrafficOptimizer(test_graph)
+    converter = UnifiedCircuitConverter()
+    traffic = np.zeros_like(test_graph)
+    traffic[0, 3] = traffic[3, 0] = 2
+
+    qc = optimizer.create_enhanced_circuit(start, end, traffic, p=4)
+    expected = converter.create_api_payload(qc, shots=1024, fuse=fuse)
+    direct = optimizer.create_enhanced_payload(converter, start, end, traffic, p=4, shots=1024, fuse=fuse)
+
+    # id гейтов выводятся из положения, поэтому payload'ы совпадают целиком, вместе с contentHash
+    assert direct == expected
+
+
+def _graph_files(tmp_path):
+    rng = np.random.default_rng(3)
+    graphs = [_random_graph(rng, 6, 0.7), _random_graph(rng, 9, 0.5)]
+    routes = [rng.integers(0, 6, size=(5, 2)).tolist(), rng.integers(0, 9, size=(3, 2)).tolist()]
+    graph_file = tmp_path / "G_set.txt"
+    graph_file.write_text(repr([graph.tolist() for graph in graphs]))
+    routes_file = tmp_path / "routes.txt"
+    routes_file.write_text(repr(routes))
+    return str(graph_file), str(routes_file)
+
+
+def _read_tree(directory):
+    return {path.relative_to(directory).as_posix(): path.read_bytes()
+            for path in sorted(directory.rglob("*")) if path.is_file()}
+
+
+def test_parallel_chunks_match_sequential_run(tmp_path):
+    graph_file, routes_file = _graph_files(tmp_path)
+    save_traffic_circuits_from_files(graph_file, routes_file, str(tmp_path / "sequential"), process_all_graphs=True)
+    save_traffic_circuits_from_files(graph_file, routes_file, str(tmp_path / "parallel"), process_all_graphs=True,
+                                     workers=2, chunk_size=2)
+
+    sequential = _read_tree(tmp_path / "sequential")
+    assert len(sequential) == 8
+    assert _read_tree(tmp_path / "parallel") == sequential
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_rejects_empty_chunks(tmp_path, chunk_size):
+    graph_file, routes_file = _graph_files(tmp_path)
+    with pytest.raises(ValueError):
+        save_traffic_circuits_from_files(graph_file, routes_file, str(tmp_path / "input"), process_all_graphs=True,
+                                         workers=2, chunk_size=chunk_size)
@@ -0,0 +1,88 @@
+import json
+import os
+import pytest
+from result_watcher import ResultWatcher, graph_index, is_result_file
+
+
+def _write_result(results_dir, graph, car, atomic=False):
+    graph_dir = results_dir / f"graph_{graph}"
+    graph_dir.mkdir(exist_ok=True)
+    path = graph_dir / f"Result_graph_{graph}_car_{car}.json"
+    if atomic:
+        # Как write_result: запись во .tmp и os.replace
+        tmp_path = graph_dir / f"{path.name}.tmp"
+        tmp_path.write_text(json.dumps({"data": []}))
+        os.replace(tmp_path, path)
+    else:
+        path.write_text(json.dumps({"data": []}))
+
+
+def test_names():
+    assert is_result_file("Result_graph_0_car_1.json")
+    assert not is_result_file("Result_graph_0_car_1.json.tmp")
+    assert not is_result_file("processed_files.json")
+    assert graph_index("graph_12") == 12
+    assert graph_index("graph_x") is None
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def backend(request):
+    return request.param
+
+
+def _watcher(results_dir, expected, backend):
+    watcher = ResultWatcher(str(results_dir), expected, poll_interval=0.01, use_inotify=backend == "inotify")
+    if watcher.backend != backend:
+        watcher.close()
+        pytest.skip("inotify недоступен")
+    return watcher
+
+
+def test_existing_results_are_reported_first(tmp_path, backend):
+    for car in range(2):
+        _write_result(tmp_path, 0, car)
+    _write_result(tmp_path, 1, 0)
+
+    watcher = _watcher(tmp_path, {0: 2, 1: 2}, backend)
+    try:
+        assert watcher.wait(0.2) == {0}
+        assert watcher.wait(0.05) == set()
+        assert watcher.count(1) == 1
+    finally:
+        watcher.close()
+
+
+def test_graph_is_ready_after_last_car(tmp_path, backend):
+    watcher = _watcher(tmp_path, {3: 3}, backend)
+    try:
+        assert watcher.wait(0.05) == set()
+
+        # Папка графа появляется после запуска наблюдателя
+        _write_result(tmp_path, 3, 0)
+        _write_result(tmp_path, 3, 1, atomic=True)
+        assert watcher.wait(0.1) == set()
+        assert watcher.count(3) == 2
+
+        _write_result(tmp_path, 3, 2, atomic=True)
+        assert watcher.wait(2) == {3}
+        assert watcher.is_complete(3)
+
+        # Перезаписанный результат снова отдаёт граф на постобработку; опрос видит только
+        # изменение набора файлов в папке
+        _write_result(tmp_path, 3, 0)
+        assert watcher.wait(0.2) == ({3} if backend == "inotify" else set())
+    finally:
+        watcher.close()
+
+
+def test_removed_result_makes_graph_incomplete(tmp_path, backend):
+    for car in range(2):
+        _write_result(tmp_path, 0, car)
+    watcher = _watcher(tmp_path, {0: 2}, backend)
+    try:
+        assert watcher.wait(0.2) == {0}
+        (tmp_path / "graph_0" / "Result_graph_0_car_1.json").unlink()
+        assert watcher.wait(0.1) == set()
+        assert not watcher.is_complete(0)
+    finally:
+        watcher.close()
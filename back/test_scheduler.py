@@ -0,0 +1,46 @@
+import pytest
+from scheduler import CAR_OVERHEAD, lpt_order, postprocess_cost, run_lpt_pool, schedule_items, submission_cost
+
+
+def test_costs():
+    assert submission_cost(10, 4) == 10 * (CAR_OVERHEAD + 4)
+    assert submission_cost(0, 20) == 0
+    # Ширина схемы - ceil(log2(вершин)), не меньше одного кубита
+    assert postprocess_cost(3, 16) == 3 * (CAR_OVERHEAD + 16 + 4)
+    assert postprocess_cost(3, 17) == 3 * (CAR_OVERHEAD + 17 + 5)
+    assert postprocess_cost(2, 1) == 2 * (CAR_OVERHEAD + 1 + 1)
+    assert postprocess_cost(5, 100) > postprocess_cost(5, 10) > postprocess_cost(4, 10)
+
+
+def test_lpt_order_breaks_ties_by_key():
+    assert lpt_order({2: 5, 10: 7, 1: 5, 3: 1}) == [10, 1, 2, 3]
+    assert lpt_order({}) == []
+
+
+def test_schedule_items_keeps_order_inside_group():
+    items = {0: ["a0", "a1"], 1: ["b0"], 2: ["c0", "c1", "c2"]}
+    costs = {0: 20, 1: 5, 2: 30}
+    assert schedule_items(items, costs) == ["c0", "c1", "c2", "a0", "a1", "b0"]
+
+
+def _square(value):
+    if value < 0:
+        raise ValueError("отрицательное значение")
+    return value * value
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_lpt_pool(workers):
+    tasks = {"a": (2,), "b": (-1,), "c": (5,)}
+    costs = {"a": 1, "b": 2, "c": 3}
+    results = run_lpt_pool(tasks, costs, _square, workers=workers)
+    assert set(results) == {"a", "b", "c"}
+    assert (results["a"], results["c"]) == (4, 25)
+    # Исключение задачи возвращается вместо результата
+    assert isinstance(results["b"], ValueError)
+
+
+def test_sequential_pool_runs_in_lpt_order():
+    calls = []
+    run_lpt_pool({key: (key,) for key in "xyz"}, {"x": 1, "y": 3, "z": 2}, calls.append, workers=1)
+    assert calls == ["y", "z", "x"]
@@ -0,0 +1,102 @@
+import json
+import os
+from submission_journal import JOURNAL_FILE, LEGACY_PROCESSED_FILES, SubmissionJournal, prune_journal, result_digest
+
+
+def _journal_lines(results_dir):
+    with open(os.path.join(results_dir, JOURNAL_FILE), 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_record_and_replay(tmp_path):
+    results_dir = str(tmp_path)
+    with SubmissionJournal(results_dir) as journal:
+        journal.record("graph_0/api_payload_car_0.json", "aa", result_digest("{}"))
+        journal.record("graph_0/api_payload_car_1.json", "bb", None)
+        journal.record("graph_0/api_payload_car_0.json", "cc", None)
+
+    journal = SubmissionJournal(results_dir)
+    try:
+        assert len(journal) == 2
+        assert journal.get("graph_0/api_payload_car_0.json") == ("cc", None)
+        assert journal.get("graph_0/api_payload_car_1.json") == ("bb", None)
+    finally:
+        journal.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    results_dir = str(tmp_path)
+    with SubmissionJournal(results_dir) as journal:
+        journal.record("graph_0/a.json", "aa", None)
+        journal.record("graph_0/b.json", "bb", None)
+    path = os.path.join(results_dir, JOURNAL_FILE)
+    valid_size = os.path.getsize(path)
+    # Сбой посреди записи строки
+    with open(path, 'ab') as f:
+        f.write(b'{"k":"graph_0/c.json","c":"c')
+
+    journal = SubmissionJournal(results_dir)
+    try:
+        assert sorted(journal.entries) == ["graph_0/a.json", "graph_0/b.json"]
+        assert os.path.getsize(path) == valid_size
+        # После отрезания хвоста дозапись даёт корректную строку
+        journal.record("graph_0/c.json", "cc", None)
+    finally:
+        journal.close()
+    assert [line["k"] for line in _journal_lines(results_dir)] == ["graph_0/a.json", "graph_0/b.json",
+                                                                   "graph_0/c.json"]
+
+
+def test_compaction_keeps_last_entry_per_key(tmp_path):
+    results_dir = str(tmp_path)
+    journal = SubmissionJournal(results_dir, sync_every=1, min_compact_lines=8)
+    for attempt in range(10):
+        journal.record("graph_0/a.json", f"a{attempt}", None)
+        journal.record("graph_0/b.json", f"b{attempt}", None)
+    journal.close()
+
+    lines = _journal_lines(results_dir)
+    assert len(lines) < 20
+    journal = SubmissionJournal(results_dir)
+    try:
+        assert journal.get("graph_0/a.json") == ("a9", None)
+        assert journal.get("graph_0/b.json") == ("b9", None)
+    finally:
+        journal.close()
+
+
+def test_legacy_migration(tmp_path):
+    results_dir = str(tmp_path)
+    with open(os.path.join(results_dir, LEGACY_PROCESSED_FILES), 'w', encoding='utf-8') as f:
+        json.dump({"files": ["graph_0/a.json", "graph_1/b.json"]}, f)
+
+    with SubmissionJournal(results_dir) as journal:
+        assert journal.get("graph_0/a.json") == (None, None)
+        assert len(journal) == 2
+    assert len(_journal_lines(results_dir)) == 2
+
+
+def test_is_done_checks_hash_and_result(tmp_path):
+    results_dir = str(tmp_path)
+    result_path = tmp_path / "Result_graph_0_car_0.json"
+    with SubmissionJournal(results_dir) as journal:
+        journal.record("graph_0/api_payload_car_0.json", "aa", None)
+
+        assert not journal.is_done("graph_0/api_payload_car_1.json", "aa")
+        assert journal.is_done("graph_0/api_payload_car_0.json", "aa")
+        assert not journal.is_done("graph_0/api_payload_car_0.json", "bb")
+        # Без файла результата payload отправляется заново
+        assert not journal.is_done("graph_0/api_payload_car_0.json", "aa", str(result_path))
+        result_path.write_text("{}")
+        assert journal.is_done("graph_0/api_payload_car_0.json", "aa", str(result_path))
+
+
+def test_prune_journal(tmp_path):
+    results_dir = str(tmp_path)
+    with SubmissionJournal(results_dir) as journal:
+        for key in ("graph_1/a.json", "graph_10/a.json", "graph_2/a.json", "graph_1/b.json"):
+            journal.record(key, "aa", None)
+
+    assert prune_journal(results_dir, ["graph_1/"]) == 2
+    assert [line["k"] for line in _journal_lines(results_dir)] == ["graph_10/a.json", "graph_2/a.json"]
+    assert prune_journal(str(tmp_path / "missing"), ["graph_1/"]) == 0
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import time
+import numpy as np
+import pytest
+from aiohttp import web
+from payload_io import payload_filename, read_payload, write_payload
+from quant import ImprovedQuantumTrafficOptimizer, UnifiedCircuitConverter
+from submitter import AdaptiveConcurrency, QuantumSubmitter, TokenBucket
+
+
+@pytest.mark.parametrize("rate", [0, -1, float("nan")])
+def test_token_bucket_rejects_non_positive_rate(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
+
+
+def test_token_bucket_rejects_burst_below_one():
+    with pytest.raises(ValueError):
+        TokenBucket(5, burst=0.5)
+
+
+def test_token_bucket_paces_after_burst():
+    async def take(bucket, n):
+        started = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Запас burst выдаётся сразу, дальше - по 1/rate секунды на токен
+    assert asyncio.run(take(TokenBucket(100, burst=5), 5)) < 0.02
+    assert asyncio.run(take(TokenBucket(100, burst=5), 15)) >= 0.09
+
+
+def _replies(controller, latencies, congestion=None):
+    async def run():
+        for latency in latencies:
+            # Окно заполнено: в полёте столько запросов, сколько разрешает лимит
+            for _ in range(controller.limit - controller.inflight):
+                await controller.acquire()
+            await controller.release(latency, congestion)
+    asyncio.run(run())
+
+
+def test_latency_spike_does_not_collapse_window():
+    controller = AdaptiveConcurrency(8, target_p95=1.0, cooldown=0)
+    _replies(controller, [3.0] * 3 + [0.1] * 15)
+    assert controller.decreases == 0
+    assert controller.window >= 8
+
+
+def test_sustained_high_latency_decreases_window_once_per_sample():
+    controller = AdaptiveConcurrency(8, target_p95=1.0, cooldown=0)
+    _replies(controller, [3.0] * 20)
+    assert controller.decreases == 1
+    window = controller.window
+    assert window < 8
+
+    # Задержки прежнего окна сброшены: быстрые ответы нового окна его не уменьшают
+    _replies(controller, [0.1] * 30)
+    assert controller.decreases == 1
+    assert controller.window > window
+    assert controller.snapshot()["p95"] == 0.1
+
+
+def test_congestion_decrease_respects_cooldown():
+    controller = AdaptiveConcurrency(16, cooldown=60)
+    _replies(controller, [None] * 5, congestion="HTTP статус: 503")
+    assert (controller.decreases, controller.window) == (1, 8.0)
+    assert controller.events[-1]["reason"] == "HTTP статус: 503"
+
+
+def test_window_grows_by_one_per_round_trip():
+    controller = AdaptiveConcurrency(4, max_window=5)
+    _replies(controller, [0.1] * 4)
+    assert controller.window == pytest.approx(4 + 4 * 0.25, abs=0.1)
+    _replies(controller, [0.1] * 20)
+    assert controller.window == 5
+
+
+def test_timeout_follows_p95():
+    controller = AdaptiveConcurrency(4, initial_timeout=15.0, min_samples=20)
+    _replies(controller, [2.0] * 19)
+    assert controller.request_timeout() == 15.0
+    _replies(controller, [2.0])
+    assert controller.request_timeout() == 8.0
+
+
+def test_target_p95_from_environment(monkeypatch):
+    import importlib
+    import submitter
+    monkeypatch.setenv("QUANT_SUBMIT_TARGET_P95", "2.5")
+    try:
+        assert importlib.reload(submitter).AdaptiveConcurrency().target_p95 == 2.5
+    finally:
+        monkeypatch.delenv("QUANT_SUBMIT_TARGET_P95")
+        importlib.reload(submitter)
+
+
+@pytest.fixture
+def payload_dir(tmp_path):
+    graph = np.array([
+        [0, 1, np.inf, 2],
+        [1, 0, 1, np.inf],
+        [np.inf, 1, 0, 3],
+        [2, np.inf, 3, 0]
+    ])
+    optimizer = ImprovedQuantumTrafficOptimizer(graph)
+    graph_dir = tmp_path / "input" / "graph_0"
+    graph_dir.mkdir(parents=True)
+    write_payload(payload_filename(str(graph_dir), 0, compress=True),
+                  optimizer.create_enhanced_payload(UnifiedCircuitConverter(), 0, 2, np.zeros_like(graph), p=4),
+                  "shared")
+    return tmp_path
+
+
+def _submit_to_local_server(tmp_path, handler, **options):
+    async def run():
+        app = web.Application()
+        app.router.add_post("/api", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            submitter = QuantumSubmitter(str(tmp_path / "input"), str(tmp_path / "results"),
+                                         cache_dir=str(tmp_path / "cache"), api_url=f"http://127.0.0.1:{port}/api",
+                                         user="user", password="password", adaptive_shots=False,
+                                         backoff_base=0.01, **options)
+            return await submitter.run()
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("compress_body", [False, True])
+def test_body_is_streamed_and_retried(payload_dir, compress_body):
+    received = []
+
+    async def handler(request):
+        body = await request.read()
+        received.append((request.headers.get("Transfer-Encoding"), request.headers.get("Content-Encoding"), body))
+        if len(received) == 1:
+            return web.Response(status=503)
+        return web.json_response({"status": True, "data": {"010": 1000, "001": 24}})
+
+    stats = _submit_to_local_server(payload_dir, handler, compress_body=compress_body)
+    assert (stats["sent"], stats["retries"], stats["failed"]) == (1, 1, 0)
+
+    # Повтор отправляет то же тело заново, куски идут без Content-Length
+    expected = read_payload(str(payload_dir / "input" / "graph_0" / "api_payload_car_0.json.gz"))
+    assert len(received) == 2
+    for transfer_encoding, content_encoding, body in received:
+        assert transfer_encoding == "chunked"
+        assert content_encoding == ("gzip" if compress_body else None)
+        # Сервер aiohttp сам распаковывает тело по Content-Encoding
+        assert json.loads(body) == expected
+
+    with open(payload_dir / "results" / "graph_0" / "Result_graph_0_car_0.json") as f:
+        assert json.load(f) == {"data": [{"bitstring": "010", "value": 1000}, {"bitstring": "001", "value": 24}]}
+
+
+def test_submitter_requires_credentials(tmp_path):
+    with pytest.raises(ValueError):
+        QuantumSubmitter(str(tmp_path / "input"), str(tmp_path / "results"), user=None, password=None)
@@ -8,6 +8,11 @@ import os
 import json
 from collections import defaultdict
 import heapq
+import graph_parser
+from graph_core import TrafficGraph
+from graph_store import GraphStore
+from ingest_manifest import fingerprint_graph
+from prep_csv import ensure_graph_store
 
 
 class QuantumInspiredTrafficOptimizer:
@@ -21,6 +26,7 @@ class QuantumInspiredTrafficOptimizer:
         self.routes = routes
         self.n_nodes = len(graph)
         self.n_cars = len(routes)
+        self.graph_core = TrafficGraph.from_matrix(self.graph)
 
         self._auto_tune_parameters()
         self.adjacency_list = self._build_adjacency_list()
@@ -39,18 +45,11 @@ class QuantumInspiredTrafficOptimizer:
 
     def _build_adjacency_list(self):
         """Построение списка смежности для эффективного поиска."""
-        adj_list = [[] for _ in range(self.n_nodes)]
-        for i in range(self.n_nodes):
-            for j in range(self.n_nodes):
-                if not math.isinf(self.graph[i][j]) and i != j:
-                    adj_list[i].append((j, self.graph[i][j]))
-        return adj_list
+        return [self.graph_core.neighbor_list(i) for i in range(self.n_nodes)]
 
     def _check_decomposition_needed(self):
         """Проверка необходимости декомпозиции задачи."""
-        n_edges = sum(1 for i in range(self.n_nodes)
-                      for j in range(self.n_nodes)
-                      if not math.isinf(self.graph[i][j]) and i != j)
+        n_edges = self.graph_core.n_edges
         problem_size = self.n_cars * n_edges
         self.needs_decomposition = problem_size > 300
         self.problem_size = problem_size
@@ -126,18 +125,7 @@ class QuantumInspiredTrafficOptimizer:
 def parse_matrix(matrix_str):
     """Парсинг матрицы смежности из строки"""
     try:
-        matrix_str_clean = matrix_str.strip()
-        if matrix_str_clean.startswith('"') and matrix_str_clean.endswith('"'):
-            matrix_str_clean = matrix_str_clean[1:-1]
-        matrix_str_clean = matrix_str_clean.replace('inf', 'None')
-
-        try:
-            matrix_data = ast.literal_eval(matrix_str_clean)
-        except:
-            matrix_str_clean = matrix_str_clean.replace("'", '"')
-            matrix_data = json.loads(matrix_str_clean)
-
-        return [[float('inf') if x is None else x for x in row] for row in matrix_data]
+        return graph_parser.parse_matrix(matrix_str)
     except Exception as e:
         print(f"Ошибка парсинга матрицы: {e}")
         return None
@@ -146,17 +134,7 @@ def parse_matrix(matrix_str):
 def parse_routes(routes_str):
     """Парсинг маршрутов из строки"""
     try:
-        routes_str_clean = routes_str.strip()
-        if routes_str_clean.startswith('"') and routes_str_clean.endswith('"'):
-            routes_str_clean = routes_str_clean[1:-1]
-
-        try:
-            routes_data = ast.literal_eval(routes_str_clean)
-        except:
-            routes_str_clean = routes_str_clean.replace("'", '"')
-            routes_data = json.loads(routes_str_clean)
-
-        return [tuple(route) for route in routes_data]
+        return [tuple(route) for route in graph_parser.parse_routes(routes_str).tolist()]
     except Exception as e:
         print(f"Ошибка парсинга маршрутов: {e}")
         return None
@@ -167,22 +145,59 @@ class TrafficVisualizer:
     Визуализатор графов дорожного движения с использованием QuantumInspiredTrafficOptimizer
     """
 
-    def __init__(self):
+    def __init__(self, cache_dir='inspired_cache'):
         self.colors = plt.cm.Set3(np.linspace(0, 1, 12))
         self.car_markers = ['o', 's', '^', 'D', 'v', '<', '>', 'p', '*', 'h']
+        # Результаты оптимизации по отпечатку графа: неизменившиеся графы не пересчитываются
+        self.cache_dir = cache_dir
+        # graph_index -> отпечаток графа текущей загрузки
+        self.graph_fingerprints = {}
+        # PNG -> отпечаток графа, по которому он нарисован: номер графа в новой загрузке
+        # может принадлежать другому графу, поэтому PNG переиспользуется только при совпадении
+        self.rendered_file = os.path.join(cache_dir, 'rendered_png.json')
+
+    def _load_rendered(self):
+        try:
+            with open(self.rendered_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_rendered(self, rendered):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = f'{self.rendered_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(rendered, f, indent=2)
+        os.replace(tmp_file, self.rendered_file)
+
+    def _load_cached_result(self, fingerprint):
+        cache_file = os.path.join(self.cache_dir, f'{fingerprint}.json')
+        if not os.path.exists(cache_file):
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            return cached['routes'], cached['total_time']
+        except Exception:
+            return None
+
+    def _save_cached_result(self, fingerprint, routes, total_time):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = os.path.join(self.cache_dir, f'{fingerprint}.json')
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'routes': routes, 'total_time': total_time}, f)
 
     def create_graph_from_matrix(self, matrix):
         """Создание графа из матрицы смежности"""
         G = nx.Graph()
-        n = len(matrix)
+        core = TrafficGraph.from_matrix(matrix)
 
-        for i in range(n):
-            G.add_node(i)
+        G.add_nodes_from(range(core.n_nodes))
 
-        for i in range(n):
-            for j in range(i + 1, n):
-                if not math.isinf(matrix[i][j]) and matrix[i][j] > 0:
-                    G.add_edge(i, j, weight=matrix[i][j], traffic=0)
+        edge_i, edge_j, edge_w = core.upper_edges()
+        for i, j, weight in zip(edge_i.tolist(), edge_j.tolist(), edge_w.tolist()):
+            if weight > 0:
+                G.add_edge(i, j, weight=weight, traffic=0)
 
         return G
 
@@ -297,12 +312,12 @@ class TrafficVisualizer:
                     print("Не удалось найти файл данных!")
                     return False
 
-            # Загружаем данные
+            # Загружаем данные (бинарное хранилище пересобирается только при изменении data.csv)
             print(f"Загрузка данных из: {data_file}")
-            df = pd.read_csv(data_file)
-            print(f"Успешно загружено {len(df)} графов")
+            store = GraphStore(ensure_graph_store(data_file))
+            print(f"Успешно загружено {len(store)} графов")
 
-            if len(df) == 0:
+            if len(store) == 0:
                 print("Файл данных пуст!")
                 return False
 
@@ -310,26 +325,26 @@ class TrafficVisualizer:
             total_time_data = []
             processed_graphs = 0
 
-            for idx, row in df.iterrows():
+            for idx, graph_index in enumerate(store.graph_labels):
                 try:
-                    graph_index = row['graph_index']
                     print(f"\n--- Обработка графа {graph_index} ---")
 
-                    graph_matrix = parse_matrix(row['graph_matrix'])
-                    if graph_matrix is None:
-                        print(f"  Ошибка: не удалось распарсить матрицу графа {graph_index}")
-                        continue
-
-                    routes_start_end = parse_routes(row['routes_start_end'])
-                    if routes_start_end is None:
-                        print(f"  Ошибка: не удалось распарсить маршруты графа {graph_index}")
-                        continue
+                    graph_matrix = store.matrix(idx)
+                    routes_start_end = [tuple(route) for route in store.route_list(idx)]
 
                     print(f"  Узлов: {len(graph_matrix)}, Маршрутов: {len(routes_start_end)}")
 
-                    # Оптимизация маршрутов
-                    optimizer = QuantumInspiredTrafficOptimizer(graph_matrix, routes_start_end)
-                    optimized_routes, total_time = optimizer.optimize_routes()
+                    # Оптимизация маршрутов (или результат прошлой загрузки для того же графа)
+                    fingerprint = fingerprint_graph(graph_matrix, store.routes(idx))
+                    self.graph_fingerprints[graph_index] = fingerprint
+                    cached = self._load_cached_result(fingerprint)
+                    if cached is not None:
+                        optimized_routes, total_time = cached
+                        print(f"  Граф не изменился, используется сохранённый результат")
+                    else:
+                        optimizer = QuantumInspiredTrafficOptimizer(graph_matrix, routes_start_end)
+                        optimized_routes, total_time = optimizer.optimize_routes()
+                        self._save_cached_result(fingerprint, optimized_routes, total_time)
 
                     print(f"  Оптимизировано маршрутов: {len(optimized_routes)}, Время: {total_time:.2f}")
 
@@ -356,7 +371,7 @@ class TrafficVisualizer:
             # Сохраняем результаты в файлы
             if all_submission and total_time_data:
                 print(f"\n--- СОХРАНЕНИЕ РЕЗУЛЬТАТОВ ---")
-                print(f"Обработано графов: {processed_graphs} из {len(df)}")
+                print(f"Обработано графов: {processed_graphs} из {len(store)}")
                 print(f"Всего маршрутов: {len(all_submission)}")
 
                 # Сохраняем submission_inspired.csv
@@ -400,7 +415,7 @@ class TrafficVisualizer:
                 return [], []
 
             # Загружаем результаты
-            df = pd.read_csv(data_file)
+            store = GraphStore(ensure_graph_store(data_file))
             submission_df = pd.read_csv('submission_inspired.csv')
             time_df = pd.read_csv('total_time_inspired.csv')
 
@@ -431,26 +446,17 @@ class TrafficVisualizer:
                 .to_dict()
             )
 
-            # Нормализуем тип graph_index в исходном датафрейме графов
-            df['graph_index'] = pd.to_numeric(df['graph_index'], errors='coerce')
-            df = df.dropna(subset=['graph_index']).copy()
-            df['graph_index'] = df['graph_index'].astype(int)
-
-            print(f"Загружено {len(df)} графов из {data_file}")
+            print(f"Загружено {len(store)} графов из {data_file}")
             print(f"Загружено {len(submission_df)} маршрутов из submission_inspired.csv")
             print(f"Загружено время из total_time_inspired.csv")
 
             # Визуализируем каждый граф
             static_files = []
             successful_visualizations = 0
+            rendered = self._load_rendered()
 
-            for idx, row in df.iterrows():
-                graph_index = int(row['graph_index'])
-                graph_matrix = parse_matrix(row['graph_matrix'])
-
-                if graph_matrix is None:
-                    print(f"Ошибка парсинга графа {graph_index}")
-                    continue
+            for idx, graph_index in enumerate(store.graph_labels):
+                graph_matrix = store.matrix(idx)
 
                 routes = routes_by_graph.get(graph_index, [])
                 if not routes:
@@ -462,13 +468,27 @@ class TrafficVisualizer:
                     print(f"Нет данных о времени для графа {graph_index}")
                     continue
 
+                static_file = f'visualised_qi/graph_{graph_index}_traffic.png'
+                fingerprint = self.graph_fingerprints.get(graph_index)
+                if fingerprint is None:
+                    fingerprint = fingerprint_graph(graph_matrix, store.routes(idx))
+                if rendered.get(static_file) == fingerprint and os.path.exists(static_file):
+                    print(f"Граф {graph_index} не изменился, изображение сохранено ранее: {static_file}")
+                    static_files.append(static_file)
+                    successful_visualizations += 1
+                    continue
+
                 print(f"Визуализация графа {graph_index} с {len(routes)} маршрутами...")
 
+                rendered.pop(static_file, None)
                 static_file = self.visualize_static_traffic(graph_matrix, routes, graph_index, total_time)
                 if static_file:
+                    rendered[static_file] = fingerprint
                     static_files.append(static_file)
                     successful_visualizations += 1
 
+            self._save_rendered(rendered)
+
             print(f"\n=== РЕЗУЛЬТАТЫ ВИЗУАЛИЗАЦИИ ===")
             print(f"Успешно визуализировано: {successful_visualizations} графов")
             print(f"Создано изображений: {len(static_files)}")
@@ -1,31 +1,31 @@
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy as np
 import pandas as pd
 import ast
 import os
+from graph_parser import iter_data_rows
+from ingest_manifest import clean_graph_labels
 
 
 def visualize_graphs():
     """Простая визуализация графов из готовых данных"""
 
-    # Загрузка данных
-    data = pd.read_csv('uploads/data.csv')
+    # Загрузка данных (data.csv читается построчно общим парсером)
     submission = pd.read_csv('submission.csv')
     time_data = pd.read_csv('total_time.csv')
 
     # Создаем папку для результатов
     os.makedirs('visualised_qf', exist_ok=True)
 
-    # Обработка каждого графа
-    for idx, row in data.iterrows():
-        graph_index = row['graph_index']
-
-        # Парсим матрицу смежности
-        matrix_str = row['graph_matrix'].strip().replace('inf', 'None')
-        if matrix_str.startswith('"') and matrix_str.endswith('"'):
-            matrix_str = matrix_str[1:-1]
-        graph_matrix = ast.literal_eval(matrix_str)
+    # PNG неизменившихся графов остаются с прошлой загрузки
+    reused_graphs = clean_graph_labels()
 
+    # Обработка каждого графа
+    for row_num, graph_index, graph_matrix, _ in iter_data_rows('uploads/data.csv'):
+        if graph_index in reused_graphs and os.path.exists(f'visualised_qf/graph_{graph_index}.png'):
+            print(f'Без изменений: visualised_qf/graph_{graph_index}.png')
+            continue
         # Получаем маршруты для этого графа
         routes = submission[submission['graph_index'] == graph_index]['route'].tolist()
         routes = [ast.literal_eval(route) for route in routes]
@@ -38,11 +38,10 @@ def visualize_graphs():
         n = len(graph_matrix)
 
         # Добавляем узлы и ребра
-        for i in range(n):
-            G.add_node(i)
-            for j in range(i + 1, n):
-                if graph_matrix[i][j] not in [None, float('inf')] and graph_matrix[i][j] > 0:
-                    G.add_edge(i, j, weight=graph_matrix[i][j])
+        G.add_nodes_from(range(n))
+        rows, cols = np.nonzero(np.triu(np.isfinite(graph_matrix) & (graph_matrix > 0), k=1))
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            G.add_edge(i, j, weight=graph_matrix[i, j])
 
         # Подсчитываем трафик на ребрах
         edge_traffic = {}